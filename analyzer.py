@@ -6,3 +6,202 @@ Author      : wzw
 Date Created: 2025/5/18
 Description : 数据分析，计算趋势
 """
+
+import os
+import argparse
+import numpy as np
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence
+from config_set import config
+from log_utils import init_logger
+from history_store import HistoryStore, get_history_store
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    """
+    每个位置上以该位置结尾的连续 True 长度（按行）。
+    例：[1, 1, 0, 1] -> [1, 2, 0, 1]
+    """
+    counts = np.cumsum(mask, axis=1, dtype=np.int32)
+    # 遇到 False 时记下当前累计值，之后的长度从这里重新开始
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return counts - resets
+
+
+def _factorize(values, count: int):
+    """
+    把取值序列编码为整数：返回 (排好序的唯一值列表, 每个取值对应的编号数组)。
+    用字典单遍编码，比对字符串数组做 np.unique 快得多。
+    """
+    codes = {}
+    idx = np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int64, count=count)
+    uniques = sorted(codes)
+    remap = np.empty(len(uniques), dtype=np.int64)
+    remap[[codes[u] for u in uniques]] = np.arange(len(uniques))
+    return uniques, remap[idx]
+
+
+class TrendMatrix:
+    """
+    仓库 × 日期 的矩阵视图，所有指标都用向量化计算：
+    - stars:   每日新增 star（stars_today），未上榜为 nan
+    - rank:    当天名次，未上榜为 0
+    - present: 当天是否上榜
+    同一天同一仓库出现在多个榜单时，stars 取最大值、rank 取最好名次。
+    日期轴只包含有数据的日期。
+    """
+
+    def __init__(self, repo_ids: np.ndarray, days: np.ndarray, languages: np.ndarray,
+                 repo_idx: np.ndarray, day_idx: np.ndarray, lang_idx: np.ndarray,
+                 stars_today: np.ndarray, ranks: np.ndarray):
+        self.repo_ids = repo_ids  # "owner/repo"
+        self.days = days  # "YYYY-MM-DD"
+        self.languages = languages
+
+        # 原始上榜记录（COO 形式），供按语言聚合使用
+        self.repo_idx, self.day_idx, self.lang_idx = repo_idx, day_idx, lang_idx
+        self.stars_today, self.ranks = stars_today, ranks
+
+        shape = (len(repo_ids), len(days))
+        self.stars = np.full(shape, np.nan)
+        np.fmax.at(self.stars, (repo_idx, day_idx), stars_today)
+        rank = np.full(shape, np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(rank, (repo_idx, day_idx), ranks)
+        self.present = rank != np.iinfo(np.int32).max
+        self.rank = np.where(self.present, rank, 0)
+
+    @classmethod
+    def from_entries(cls, entries: Sequence[tuple]) -> "TrendMatrix":
+        """由 (date, rank, owner, repo, language, since, stars_today) 记录构建"""
+        if not entries:
+            empty = np.array([], dtype=object)
+            zero = np.array([], dtype=np.int64)
+            return cls(empty, empty, empty, zero, zero, zero, np.array([], dtype=float), zero)
+
+        n = len(entries)
+        repo_ids, repo_idx = _factorize(((e[2], e[3]) for e in entries), n)
+        days, day_idx = _factorize((e[0] for e in entries), n)
+        langs, lang_idx = _factorize((e[4] for e in entries), n)
+        repo_ids = np.array([f"{owner}/{repo}" for owner, repo in repo_ids])
+        return cls(repo_ids, np.array(days), np.array(langs), repo_idx, day_idx, lang_idx,
+                   np.fromiter((e[6] for e in entries), dtype=float, count=n),
+                   np.fromiter((e[1] for e in entries), dtype=np.int32, count=n))
+
+    # —— 速度 / 加速度 ——
+    @property
+    def velocity(self) -> np.ndarray:
+        """star 速度：每日新增 star，未上榜为 nan"""
+        return self.stars
+
+    @property
+    def acceleration(self) -> np.ndarray:
+        """star 加速度：相邻两天速度之差（第一天为 nan）"""
+        acc = np.full(self.stars.shape, np.nan)
+        acc[:, 1:] = np.diff(self.stars, axis=1)
+        return acc
+
+    # —— 上榜时长 / 连续上榜 ——
+    def days_on_list(self) -> np.ndarray:
+        return self.present.sum(axis=1)
+
+    def streaks(self, top_n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        连续上榜天数；给出 top_n 时统计连续进入前 top_n 名的天数。
+        返回 longest（最长连续）和 current（截至最后一天的连续）。
+        """
+        mask = self.present if top_n is None else self.present & (self.rank <= top_n)
+        runs = _run_lengths(mask)
+        if runs.shape[1] == 0:
+            zeros = np.zeros(len(self.repo_ids), dtype=np.int32)
+            return {"longest": zeros, "current": zeros}
+        return {"longest": runs.max(axis=1), "current": runs[:, -1]}
+
+    # —— 新上榜 / 掉榜 ——
+    def entrants(self) -> np.ndarray:
+        """[repo, day] 为 True 表示当天新上榜（前一天不在榜），第一天无法判断记为 False"""
+        out = np.zeros_like(self.present)
+        out[:, 1:] = self.present[:, 1:] & ~self.present[:, :-1]
+        return out
+
+    def dropouts(self) -> np.ndarray:
+        """[repo, day] 为 True 表示当天掉榜（前一天在榜、当天不在）"""
+        out = np.zeros_like(self.present)
+        out[:, 1:] = ~self.present[:, 1:] & self.present[:, :-1]
+        return out
+
+    # —— 按语言聚合 ——
+    def language_aggregates(self) -> Dict[str, np.ndarray]:
+        """
+        每种语言（榜单语言）× 每天的聚合：
+        entries 上榜条数、stars 新增 star 总和、mean_stars 平均新增 star
+        """
+        n_lang, n_day = len(self.languages), len(self.days)
+        flat = self.lang_idx * n_day + self.day_idx
+        counts = np.bincount(flat, minlength=n_lang * n_day).reshape(n_lang, n_day)
+        stars = np.bincount(flat, weights=self.stars_today, minlength=n_lang * n_day).reshape(n_lang, n_day)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(counts > 0, stars / counts, 0.0)
+        return {"entries": counts, "stars": stars, "mean_stars": mean}
+
+    # —— 日期范围 ——
+    def window(self, start: Optional[str] = None, end: Optional[str] = None) -> "TrendMatrix":
+        """截取 [start, end] 日期范围，返回新的 TrendMatrix"""
+        keep = np.ones(len(self.stars_today), dtype=bool)
+        if start:
+            keep &= self.days[self.day_idx] >= start
+        if end:
+            keep &= self.days[self.day_idx] <= end
+        day_keep = np.unique(self.day_idx[keep])
+        day_map = np.full(len(self.days), -1)
+        day_map[day_keep] = np.arange(len(day_keep))
+        return TrendMatrix(self.repo_ids, self.days[day_keep], self.languages,
+                           self.repo_idx[keep], day_map[self.day_idx[keep]], self.lang_idx[keep],
+                           self.stars_today[keep], self.ranks[keep])
+
+    def summary(self, top: int = 10) -> List[Dict]:
+        """按区间内新增 star 总和排序的前 top 个仓库及其主要指标"""
+        total = np.nansum(self.stars, axis=1)
+        order = np.argsort(-total, kind="stable")[:top]
+        on_list = self.days_on_list()
+        streak = self.streaks()
+        # window() 截取后可能有整行都不在榜的仓库，nanmean 会对空行告警，这里按上榜天数自己求均值
+        present_stars = np.where(self.present, self.stars, 0).sum(axis=1)
+        mean_velocity = np.divide(present_stars, on_list, out=np.zeros(len(on_list)), where=on_list > 0)
+        return [
+            {
+                "repo": str(self.repo_ids[i]),
+                "stars": int(total[i]),
+                "days_on_list": int(on_list[i]),
+                "longest_streak": int(streak["longest"][i]),
+                "mean_velocity": round(float(mean_velocity[i]), 1),
+                "best_rank": int(self.rank[i][self.present[i]].min()) if on_list[i] else 0,
+            }
+            for i in order
+        ]
+
+
+def load_trends(store: Optional[HistoryStore] = None, start: Optional[str] = None, end: Optional[str] = None,
+                language: Optional[str] = None, since: Optional[str] = None) -> TrendMatrix:
+    """从历史存储加载 [start, end] 的上榜记录；默认使用配置中的第一个后端"""
+    # 传入的 store 由调用方关闭，这里创建的用完即关
+    with nullcontext(store) if store else get_history_store(config.history_backends[0]) as store:
+        entries = store.query_entries(start, end, language=language, since=since)
+    logger.info(f"加载 {len(entries)} 条上榜记录")
+    return TrendMatrix.from_entries(entries)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="趋势分析")
+    arg_parser.add_argument("--start")
+    arg_parser.add_argument("--end")
+    arg_parser.add_argument("--language")
+    arg_parser.add_argument("--since")
+    arg_parser.add_argument("--top", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    matrix = load_trends(start=args.start, end=args.end, language=args.language, since=args.since)
+    for row in matrix.summary(args.top):
+        print(row)
@@ -0,0 +1,1289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : benchmark.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 性能对比脚本，全部基于本地替身服务或本地数据，不访问外网
+
+用法：python benchmark.py <子命令> [参数]
+"""
+
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from models import BaseRepo
+from config_set import config
+
+
+def _fake_bases(n: int, missing: int = 0):
+    bases = [
+        BaseRepo(f"owner{i}", f"repo{i}", f"https://github.com/owner{i}/repo{i}",
+                 f"desc {i}", i, "python", "daily")
+        for i in range(n - missing)
+    ]
+    bases += [
+        BaseRepo(f"owner{i}", f"missing{i}", "", "", 0, "python", "daily")
+        for i in range(missing)
+    ]
+    return bases
+
+
+def bench_enrich(args):
+    """逐个 REST 补全 vs GraphQL 批量补全：请求数、耗时、额度消耗"""
+    import requests
+    from stand_in_server import StandInServer
+    from repo_enricher import enrich_repo_info, enrich_repos_batch
+
+    bases = _fake_bases(args.repos, args.missing)
+    # 这里只比较请求形态，不让调度器的节奏控制影响耗时
+    config.github_rate_per_sec, config.github_burst = 1000, 100
+    with StandInServer(latency=args.latency) as server:
+        config.github_api_base = server.url
+        rows = []
+
+        def _run_rest(name, use_cache):
+            start = time.perf_counter()
+            for b in bases:
+                enrich_repo_info(b, "fake-token", use_cache=use_cache)
+            rows.append((name, server.total_requests, time.perf_counter() - start, server.rate_cost))
+            server.reset_stats()
+
+        _run_rest("rest (per repo)", False)
+        # ETag 缓存：第一轮冷启动写入，第二轮全部 304 重新验证
+        _run_rest("rest + cache (cold)", True)
+        _run_rest("rest + cache (warm)", True)
+
+        start = time.perf_counter()
+        with requests.Session() as session:
+            enrich_repos_batch(bases, "fake-token", batch_size=args.batch, session=session)
+        rows.append((f"graphql (batch={args.batch})", server.total_requests,
+                     time.perf_counter() - start, server.rate_cost))
+
+    print(f"{'mode':<24}{'requests':>10}{'wall(s)':>10}{'rate cost':>11}")
+    for name, reqs, wall, cost in rows:
+        print(f"{name:<24}{reqs:>10}{wall:>10.3f}{cost:>11}")
+
+
+def bench_enrich_cache(args):
+    """补全快照缓存：每次全量 GraphQL 补全 vs 按字段新鲜期只刷新过期字段，多天运行的请求数与额度"""
+    import random
+    import logging
+    import requests
+    from enrich_cache import EnrichCache
+    from repo_enricher import enrich_repos_batch, enrich_repos_cached
+    from stand_in_server import StandInServer
+
+    logging.getLogger().setLevel(logging.WARNING)
+    config.github_rate_per_sec, config.github_burst = 1000, 100
+    rng = random.Random(25)
+    languages = [f"lang{i}" for i in range(args.languages)]
+    recent = {language: [] for language in languages}
+    stars, next_id = {}, 0
+    # 每个语言每天约 new_per_day 个新仓库；daily / weekly / monthly 三个榜单都从该语言最近上榜的仓库里抽，彼此大量重叠
+    days = []
+    for _ in range(args.days):
+        today = []
+        for language in languages:
+            fresh = [f"owner{next_id + i}/repo" for i in range(args.new_per_day)]
+            next_id += args.new_per_day
+            pool = recent[language] = (recent[language] + fresh)[-80:]
+            for since, window in (("daily", 30), ("weekly", 50), ("monthly", 80)):
+                picked = list(dict.fromkeys(fresh + rng.sample(pool[-window:], min(len(pool), window, 25))))[:25]
+                bases = []
+                for key in picked:
+                    # 趋势页上显示的总 star / fork 数，每天增长
+                    stars[key] = stars.get(key, rng.randint(100, 5000)) + rng.randint(50, 500)
+                    bases.append(BaseRepo(*key.split("/"), "", "", 0, language, since,
+                                          stars=stars[key], forks=stars[key] // 10))
+                today.append(bases)
+        days.append(today)
+
+    print(f"{args.days} 天 × {args.languages} 语言 × daily/weekly/monthly，每个榜单 25 个仓库、"
+          f"每个语言每天约 {args.new_per_day} 个新仓库")
+    print(f"TTL（小时）：{config.enrich_cache_ttl_hours}")
+    print(f"{'runs/day':<10}{'mode':<10}{'requests':>10}{'per run':>9}{'rate cost':>11}{'wall(s)':>9}")
+    with StandInServer(latency=args.latency) as server, requests.Session() as session:
+        config.github_api_base = server.url
+        for runs_per_day in args.runs_per_day:
+            runs = args.days * runs_per_day
+            cache = EnrichCache(config.base_dir / f"enrich_cache_{runs_per_day}.sqlite3")
+            for name in ("no cache", "cached"):
+                server.reset_stats()
+                start = time.perf_counter()
+                for day, today in enumerate(days):
+                    for run in range(runs_per_day):
+                        now = 1.7e9 + day * 86400 + run * 86400 / runs_per_day
+                        for bases in today:
+                            if name == "cached":
+                                enrich_repos_cached(bases, "fake-token", session=session, cache=cache, now=now)
+                            else:
+                                enrich_repos_batch(bases, "fake-token", session=session)
+                wall = time.perf_counter() - start
+                print(f"{runs_per_day:<10}{name:<10}{server.total_requests:>10}{server.total_requests / runs:>9.1f}"
+                      f"{server.rate_cost:>11}{wall:>9.2f}")
+            stats = cache.stats()
+            owner, repo = days[-1][0][-1].owner, days[-1][0][-1].repo
+            growth = cache.growth(owner, repo, days=7, now=1.7e9 + args.days * 86400)
+            print(f"{'':<10}缓存 {stats['repos']} 个仓库，star/fork 时间序列 {stats['points']} 个点；"
+                  f"{owner}/{repo} 最近 7 天 {growth}")
+            cache.close()
+
+
+def _legacy_parse(html: str, language: str, since: str):
+    """改造前的 TrendingScraper._parse（每次临时编译 XPath、解析整页），作为对照"""
+    from lxml import etree
+
+    tree = etree.HTML(html)
+    repos = []
+    for item in tree.xpath("//article[@class='Box-row']"):
+        href = item.xpath("./h2/a/@href")[0].strip()
+        _, owner, repo = href.split('/')
+        raw = item.xpath("./div[last()]/span[last()]/text()")
+        stars = int(raw[-1].split()[0].replace(',', '')) if raw else 0
+        desc = item.xpath("normalize-space(./p/text())")
+        repos.append(BaseRepo(owner, repo, f"https://github.com{href}", desc, stars, language, since))
+    return repos
+
+
+def bench_parse(args):
+    """
+    趋势页解析：旧实现 vs 预编译 XPath + 片段解析，基于 fixtures 下保存的页面。
+    目前只有一个合成页面，两者耗时在噪声范围内，结果只用于发现明显退化，不作为提速依据。
+    """
+    import logging
+    from trending_scraper import TrendingScraper
+
+    logging.getLogger().setLevel(logging.WARNING)
+    fixtures = sorted(Path(args.fixtures).glob("*.html"))
+    if not fixtures:
+        print(f"未找到 fixtures：{args.fixtures}")
+        return
+    pages = [p.read_text(encoding="utf-8") for p in fixtures]
+
+    # 先校验两种实现输出一致
+    core = ("owner", "repo", "url", "desc", "stars_today", "language", "since")
+    for path, html in zip(fixtures, pages):
+        old = [tuple(getattr(r, f) for f in core) for r in _legacy_parse(html, "python", "daily")]
+        new = [tuple(getattr(r, f) for f in core) for r in TrendingScraper._parse(html, "python", "daily")]
+        assert old == new, f"解析结果不一致：{path.name}"
+
+    print(f"{len(pages)} 个页面 × {args.rounds} 轮")
+    print(f"{'parser':<12}{'total(s)':>10}{'per page(ms)':>14}")
+    for name, fn in (("legacy", _legacy_parse), ("current", TrendingScraper._parse)):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for html in pages:
+                fn(html, "python", "daily")
+        total = time.perf_counter() - start
+        print(f"{name:<12}{total:>10.3f}{total / (args.rounds * len(pages)) * 1000:>14.3f}")
+
+
+def bench_logging(args):
+    """日志开销：解析每个仓库时逐条记 DEBUG 日志，同步写文件 vs 队列后台写入 vs 限流"""
+    import os
+    import sys
+    import logging
+    import log_utils
+    from logging.handlers import RotatingFileHandler
+    from trending_scraper import TrendingScraper
+
+    fixture = Path(args.fixtures) / "python_daily.html"
+    html = fixture.read_text(encoding="utf-8")
+    per_page = len(list(TrendingScraper._iter_parse(html, "python", "daily")))
+    cases = (
+        ("off", dict(level=logging.INFO)),
+        ("sync", dict(level=logging.DEBUG)),
+        ("sync+json", dict(level=logging.DEBUG, json_format=True)),
+        ("queue", dict(level=logging.DEBUG, use_queue=True)),
+        ("queue+json", dict(level=logging.DEBUG, use_queue=True, json_format=True)),
+        ("queue+limit", dict(level=logging.DEBUG, use_queue=True, item_rate=args.item_rate)),
+    )
+
+    # 模拟慢磁盘：每次写文件后额外阻塞 io_latency 毫秒（rotation / fsync 抖动）
+    file_flush = RotatingFileHandler.flush
+
+    def slow_flush(handler):
+        file_flush(handler)
+        time.sleep(args.io_latency / 1000)
+
+    if args.io_latency > 0:
+        RotatingFileHandler.flush = slow_flush
+
+    # 控制台输出丢到 /dev/null，只比较记录日志本身的开销
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    results = []
+    try:
+        for name, options in cases:
+            log_dir = config.base_dir / "logs" / name
+            log_utils.setup_logger(log_dir=str(log_dir), log_filename="bench.log", **options)
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                TrendingScraper._parse(html, "python", "daily")
+            caller = time.perf_counter() - start
+            log_utils.stop_logging()  # 等后台线程写完
+            drained = time.perf_counter() - start
+            lines = sum(1 for _ in (log_dir / "bench.log").open(encoding="utf-8")) \
+                if (log_dir / "bench.log").exists() else 0
+            results.append((name, caller, drained, lines))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        RotatingFileHandler.flush = file_flush
+        log_utils.setup_logger(level=logging.WARNING)
+
+    repos = per_page * args.rounds
+    baseline = results[0][1]
+    print(f"{args.rounds} 轮 × {per_page} 个仓库，模拟写盘延迟 {args.io_latency}ms")
+    print(f"{'mode':<14}{'caller(s)':>10}{'drained(s)':>12}{'overhead/repo(us)':>19}{'lines':>8}")
+    for name, caller, drained, lines in results:
+        print(f"{name:<14}{caller:>10.3f}{drained:>12.3f}{(caller - baseline) / repos * 1e6:>19.1f}{lines:>8}")
+
+
+def _fake_history(store, days: int, per_day: int = 25, pool: int = 400):
+    """按天生成模拟快照：从 pool 个仓库里轮换上榜，语言/时间范围轮流变化"""
+    import random
+    from datetime import date, timedelta
+
+    rng = random.Random(42)
+    languages, sinces = ("python", "rust", "go", "typescript"), ("daily", "weekly", "monthly")
+    day0 = date(2024, 1, 1)
+    for d in range(days):
+        date_str = (day0 + timedelta(days=d)).isoformat()
+        language, since = languages[d % len(languages)], sinces[d % len(sinces)]
+        repos = []
+        for i in rng.sample(range(pool), per_day):
+            b = BaseRepo(f"owner{i}", f"repo{i}", f"https://github.com/owner{i}/repo{i}",
+                         f"desc {i}", rng.randint(1, 3000), language, since)
+            repos.append(b.to_dict())
+        store.save_record({"date": date_str, "type": since, "repos": repos})
+
+
+def bench_history(args):
+    """时间跨度查询：逐文件扫描 JSON vs SQLite 索引"""
+    from history_store import JsonHistoryStore, SqliteHistoryStore, import_json_tree
+
+    json_store = JsonHistoryStore(config.base_dir / "json")
+    _fake_history(json_store, args.days)
+    sqlite_store = SqliteHistoryStore(config.base_dir / "history.sqlite3")
+    start = time.perf_counter()
+    import_json_tree(json_store.base_dir, sqlite_store)
+    print(f"导入 {args.days} 天 JSON 耗时 {time.perf_counter() - start:.3f}s")
+
+    queries = [
+        ("first seen owner7/repo7", lambda s: s.first_seen("owner7", "repo7")),
+        ("rust weekly in Q2", lambda s: s.query("2024-04-01", "2024-06-30", language="rust", since="weekly")),
+        ("one month, all", lambda s: s.query("2024-03-01", "2024-03-31")),
+    ]
+    print(f"{'query':<26}{'json scan(ms)':>15}{'sqlite(ms)':>12}")
+    for name, q in queries:
+        cost = []
+        for store in (json_store, sqlite_store):
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                result = q(store)
+            cost.append((time.perf_counter() - start) / args.rounds * 1000)
+        print(f"{name:<26}{cost[0]:>15.2f}{cost[1]:>12.2f}")
+    sqlite_store.close()
+
+
+def _legacy_models():
+    """重建改造前的普通 dataclass（无 __slots__、无字符串驻留），作为对照组"""
+    from dataclasses import MISSING, field, fields, make_dataclass
+    from models import RichRepo
+
+    def spec(cls):
+        out = []
+        for f in fields(cls):
+            if f.default is not MISSING:
+                out.append((f.name, f.type, field(default=f.default)))
+            elif f.default_factory is not MISSING:
+                out.append((f.name, f.type, field(default_factory=f.default_factory)))
+            else:
+                out.append((f.name, f.type))
+        return out
+
+    return make_dataclass("LegacyBaseRepo", spec(BaseRepo)), make_dataclass("LegacyRichRepo", spec(RichRepo))
+
+
+def bench_models(args):
+    """模型内存与序列化：普通 dataclass vs slots + 驻留 vs 列式 RepoBatch"""
+    import gc
+    import json
+    import random
+    import tracemalloc
+    from dataclasses import asdict
+    from models import RepoBatch, RichRepo
+
+    legacy_base, legacy_rich = _legacy_models()
+    rng = random.Random(3)
+    languages = ["python", "go", "rust", "typescript", "java", "c++", "javascript", ""]
+    rows = []
+    # 模拟多天历史：同一批仓库反复上榜
+    for _ in range(args.repos):
+        i = rng.randrange(args.pool)
+        owner, repo = f"owner{i % 1000}", f"repo{i}"
+        rows.append(BaseRepo(owner, repo, f"https://github.com/{owner}/{repo}", f"description of {repo}",
+                             rng.randint(0, 3000), rng.choice(languages), rng.choice(["daily", "weekly"]),
+                             stars=rng.randint(0, 90000), forks=rng.randint(0, 9000),
+                             built_by=[f"user{(i * 7 + k) % 999}" for k in range(3)],
+                             repo_language=rng.choice(languages)).to_dict())
+    text = json.dumps(rows)
+
+    # 内存：从 JSON 文本加载为对象后（原始 dict 已释放）仍占用的内存
+    loaders = (
+        ("dataclass", lambda data: [legacy_base(**r) for r in data]),
+        ("slots+intern", lambda data: [BaseRepo.from_dict(r) for r in data]),
+        ("RepoBatch", lambda data: RepoBatch.from_dicts(data)),
+    )
+    print(f"{args.repos} 条记录，{args.pool} 个不同仓库")
+    print(f"{'model':<14}{'memory(MB)':>12}{'bytes/repo':>12}{'load(s)':>10}")
+    for name, load in loaders:
+        data = json.loads(text)
+        start = time.perf_counter()
+        load(data)
+        elapsed = time.perf_counter() - start
+        del data
+        gc.collect()
+        tracemalloc.start()
+        objs = load(json.loads(text))
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<14}{current / 2**20:>12.1f}{current / args.repos:>12.0f}{elapsed:>10.3f}")
+        del objs
+
+    # 序列化：对象 -> dict，以及 dict -> 对象（RichRepo，字段最多）
+    legacy = [legacy_rich(**r) for r in rows]
+    slotted = [RichRepo.from_dict(r) for r in rows]
+    rich_rows = [r.to_dict() for r in slotted]
+    cases = (
+        ("asdict", lambda: [asdict(r) for r in legacy]),
+        ("to_dict", lambda: [r.to_dict() for r in slotted]),
+        ("Legacy(**d)", lambda: [legacy_rich(**r) for r in rich_rows]),
+        ("from_dict", lambda: [RichRepo.from_dict(r) for r in rich_rows]),
+    )
+    print(f"{'serialize':<14}{'total(s)':>10}{'per repo(us)':>14}")
+    for name, fn in cases:
+        # 与 timeit 一样计时期间关闭 GC，避免分代回收的时机影响对比
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        print(f"{name:<14}{elapsed:>10.3f}{elapsed / args.repos * 1e6:>14.2f}")
+
+
+def bench_digest(args):
+    """区间汇总：逐快照流式 + 有界 top-k，区间从 1 个月到 12 个月的耗时与内存峰值"""
+    import random
+    import logging
+    import tracemalloc
+    from collections import Counter
+    from datetime import date, timedelta
+    from history_store import JsonHistoryStore
+    from output_generator import OutputGenerator
+
+    logging.getLogger().setLevel(logging.WARNING)
+    store = JsonHistoryStore(config.base_dir / "digest")
+    rng = random.Random(11)
+    languages = [f"lang{i}" for i in range(args.languages)]
+    # 仓库热度呈长尾分布：少数仓库频繁上榜且新增 star 多
+    weights = [1 / (i + 1) for i in range(args.pool)]
+    day0 = date(2024, 1, 1)
+    for d in range(args.days):
+        date_str = (day0 + timedelta(days=d)).isoformat()
+        for language in languages:
+            picked = dict.fromkeys(rng.choices(range(args.pool), weights, k=60))
+            repos = [BaseRepo(f"{language}-owner{i}", f"repo{i}", f"https://github.com/{language}-owner{i}/repo{i}",
+                              f"desc {i}", int(rng.randint(50, 500) * weights[i] * 10), language, "daily").to_dict()
+                     for i in list(picked)[:25]]
+            store.save_record({"date": date_str, "type": "daily", "repos": repos})
+    capacity = args.capacity or config.digest_capacity
+    print(f"{args.days} 天 × {args.languages} 语言，每个语言 {args.pool} 个候选仓库，计数器上限 {capacity}")
+    print(f"{'range':<8}{'snapshots':>10}{'distinct':>10}{'time(s)':>9}{'peak(KB)':>10}{'top10 exact':>13}")
+
+    for months in (1, 3, 6, 12):
+        end = (day0 + timedelta(days=min(args.days, months * 30) - 1)).isoformat()
+        start = time.perf_counter()
+        OutputGenerator.build_digest(store, day0.isoformat(), end, since="daily", top=10, capacity=capacity)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        digest = OutputGenerator.build_digest(store, day0.isoformat(), end, since="daily", top=10,
+                                              capacity=capacity)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # 精确结果（全量计数）用于核对
+        exact, snapshots = Counter(), 0
+        for record in store.iter_snapshots(day0.isoformat(), end, since="daily"):
+            snapshots += 1
+            for r in record["repos"]:
+                exact[(r["owner"], r["repo"])] += r["stars_today"]
+        expected = {k for k, _ in exact.most_common(10)}
+        hits = len(expected & {(r["owner"], r["repo"]) for r in digest})
+        print(f"{months:>2} 个月{snapshots:>10}{len(exact):>10}{elapsed:>9.2f}{peak / 1024:>10.0f}{hits:>10}/10")
+
+
+def bench_analyze(args):
+    """一年多语言历史的向量化分析耗时（构建矩阵 + 全部指标）"""
+    import random
+    from datetime import date, timedelta
+    from analyzer import TrendMatrix
+
+    rng = random.Random(42)
+    languages = [f"lang{i}" for i in range(args.languages)]
+    day0 = date(2024, 1, 1)
+    entries = []
+    for d in range(args.days):
+        date_str = (day0 + timedelta(days=d)).isoformat()
+        for language in languages:
+            for since in ("daily", "weekly", "monthly"):
+                # 每个榜单从 200 个候选里抽 25 个，模拟榜单的缓慢变化
+                for rank, i in enumerate(rng.sample(range(200), 25), 1):
+                    entries.append((date_str, rank, f"{language}-owner{i}", f"repo{i}", language, since,
+                                    rng.randint(1, 3000)))
+    print(f"{len(entries)} 条上榜记录（{args.days} 天 × {args.languages} 语言 × 3 榜单）")
+
+    start = time.perf_counter()
+    matrix = TrendMatrix.from_entries(entries)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _ = matrix.acceleration
+    matrix.streaks()
+    matrix.streaks(top_n=10)
+    matrix.entrants()
+    matrix.dropouts()
+    matrix.language_aggregates()
+    matrix.window("2024-04-01", "2024-06-30").summary()
+    matrix.summary()
+    analyzed = time.perf_counter() - start
+    print(f"矩阵 {matrix.stars.shape}：构建 {built:.3f}s，全部指标 {analyzed:.3f}s")
+
+
+def bench_clash(args):
+    """随机切换 vs 测速排序切换：选中节点的实际延迟与选择耗时"""
+    import random
+    import logging
+    from stand_in_server import StandInServer
+    from switch_node import ClashManager
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(7)
+    with StandInServer() as server:
+        # 历史延迟都在阈值内，但实时延迟差异很大，部分节点已失效
+        for i in range(args.nodes):
+            live = None if rng.random() < args.dead else rng.randint(50, 900)
+            server.clash_nodes[f"node-{i:02d}"] = (rng.randint(100, 800), live)
+
+        print(f"{args.nodes} 个节点，失效比例 {args.dead:.0%}")
+        print(f"{'mode':<10}{'avg delay(ms)':>15}{'dead picks':>12}{'select(s)':>11}")
+        for mode in ("random", "best", "weighted"):
+            manager = ClashManager(clash_api_url=server.url, group_map={"GLOBAL": "GLOBAL"},
+                                   probe_timeout=1000)
+            picked, cost = [], 0.0
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                manager.change_node(mode)
+                cost += time.perf_counter() - start
+                picked.append(server.clash_nodes[server.clash_selected][1])
+            alive = [d for d in picked if d is not None]
+            avg = sum(alive) / len(alive) if alive else float("nan")
+            print(f"{mode:<10}{avg:>15.0f}{len(picked) - len(alive):>12}{cost / args.rounds:>11.3f}")
+
+
+def bench_notify(args):
+    """企业微信推送：旧实现（整份报告单次 post）vs notifier（分片 + 并发 + 限速 + outbox）"""
+    import logging
+    import requests
+    from stand_in_server import StandInServer
+    from notifier import Notifier, split_markdown
+
+    logging.getLogger().setLevel(logging.ERROR)
+    # 多语言报告：每个语言 10 行，与 OutputGenerator 的格式一致
+    sections = []
+    for lang in range(args.languages):
+        rows = [f"{i}. [owner{i}/repo{i}](https://github.com/owner{i}/repo{i})  \n - ⭐ {i * 37}\n"
+                f" - 📝 {'一个用于演示的中文项目描述，' * 4}" for i in range(1, 11)]
+        sections.append(f"## lang{lang} 今日趋势\n" + "\n".join(rows))
+    markdown = "\n\n".join(sections)
+    chunks = split_markdown(markdown)
+    print(f"报告 {len(markdown.encode('utf-8'))} 字节，分为 {len(chunks)} 片，"
+          f"最大片 {max(len(c.encode('utf-8')) for c in chunks)} 字节；{args.webhooks} 个 webhook")
+    print(f"{'mode':<22}{'delivered':>10}{'outbox':>8}{'wall(s)':>9}")
+
+    with StandInServer(latency=args.latency) as server:
+        hooks = [f"{server.url}/cgi-bin/webhook/send?key=k{i}" for i in range(args.webhooks)]
+
+        start = time.perf_counter()
+        ok = 0
+        for url in hooks:
+            resp = requests.post(url, json={"msgtype": "markdown", "markdown": {"content": markdown}})
+            ok += resp.json().get("errcode") == 0
+        print(f"{'legacy single post':<22}{ok:>10}{'-':>8}{time.perf_counter() - start:>9.2f}")
+
+        server.reset_stats()
+        notifier = Notifier(webhooks=hooks, outbox_dir=config.base_dir / "outbox", retries=0)
+        start = time.perf_counter()
+        notifier.send_markdown(markdown)
+        print(f"{'notifier':<22}{len(server.webhook_messages):>10}{notifier.pending():>8}"
+              f"{time.perf_counter() - start:>9.2f}")
+
+        # 一个 webhook 故障：其余照常送达，故障的进入 outbox；恢复后下次运行补发
+        server.reset_stats()
+        server.webhook_down.add("k0")
+        notifier = Notifier(webhooks=hooks, outbox_dir=config.base_dir / "outbox", retries=0)
+        start = time.perf_counter()
+        notifier.send_markdown(markdown)
+        print(f"{'notifier, k0 down':<22}{len(server.webhook_messages):>10}{notifier.pending():>8}"
+              f"{time.perf_counter() - start:>9.2f}")
+
+        server.webhook_down.clear()
+        server.reset_stats()
+        notifier = Notifier(webhooks=hooks, outbox_dir=config.base_dir / "outbox", retries=0)
+        start = time.perf_counter()
+        left = notifier.flush_outbox()
+        print(f"{'next run: flush outbox':<22}{len(server.webhook_messages):>10}{left:>8}"
+              f"{time.perf_counter() - start:>9.2f}")
+
+
+def _queue_worker(base_dir, queue_path, latency, lease_seconds, crash=False, ready=None):
+    """队列压测的 worker 进程：fetch 用固定页面 + 模拟网络延迟；crash 时领到任务后直接退出"""
+    import logging
+    config.base_dir = Path(base_dir)
+    from job_queue import JobQueue, Worker
+    from trending_scraper import TrendingScraper
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    html = (Path(__file__).parent / "fixtures" / "trending" / "python_daily.html").read_text(encoding="utf-8")
+
+    def fetch(language, since, spoken):
+        if crash:
+            os._exit(1)  # 模拟 worker 崩溃：租约未释放
+        time.sleep(latency)
+        repos = [r.to_dict() for r in TrendingScraper._parse(html, language, since)]
+        for r in repos:
+            r["repo"] = f"{r['repo']}-{spoken}"  # 不同 spoken_language 的结果部分不同
+        return repos
+
+    worker = Worker(JobQueue(queue_path, lease_seconds=lease_seconds), fetch=fetch)
+    worker.recorder  # 导入与初始化不计入吞吐量
+    if ready is not None:
+        ready.wait()
+    worker.run(drain=True, poll=0.05)
+
+
+def bench_archive(args):
+    """历史文件格式：缩进 JSON vs 每日 jsonl.gz vs 月度归档 —— 磁盘占用与全量 / 单榜单扫描耗时"""
+    import random
+    import logging
+    from datetime import date, timedelta
+    from history_store import JsonHistoryStore
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(42)
+    languages = ("python", "rust", "go", "typescript", "java", "")[:args.lists]
+    day0 = date(2024, 1, 1)
+    records, previous = [], {language: [] for language in languages}
+    for d in range(args.days):
+        date_str = (day0 + timedelta(days=d)).isoformat()
+        for language in languages:
+            # 榜单每天只换掉一部分仓库，其余沿用前一天
+            kept = rng.sample(previous[language], min(len(previous[language]), 25 - args.churn))
+            picks = kept + [i for i in rng.sample(range(args.pool), 25) if i not in kept][:25 - len(kept)]
+            previous[language] = picks
+            repos = []
+            for i in picks:
+                b = BaseRepo(f"owner{i}", f"repo{i}", f"https://github.com/owner{i}/repo{i}",
+                             f"description of project {i} " * 3, rng.randint(1, 3000), language, "daily",
+                             stars=1000 + i * 37 + d * 5, forks=i * 3 + d,
+                             built_by=[f"user{i}", f"user{i + 1}"], repo_language=language)
+                repos.append(b.to_dict())
+            records.append({"date": date_str, "type": "daily", "repos": repos})
+
+    def disk(store):
+        files = [p for p in store.base_dir.rglob("*") if p.is_file()]
+        return len(files), sum(p.stat().st_size for p in files) / 1024 / 1024
+
+    def scan(store, **filters):
+        start = time.perf_counter()
+        n = sum(1 for _ in store.iter_snapshots(**filters))
+        return n, time.perf_counter() - start
+
+    rows = []
+    for name, fmt in (("json (indented)", "json"), ("jsonl.gz daily", "jsonl.gz"), ("monthly archive", "jsonl.gz")):
+        store = JsonHistoryStore(config.base_dir / name.split()[0], fmt)
+        start = time.perf_counter()
+        for record in records:
+            store.save_record(record)
+        write = time.perf_counter() - start
+        if name == "monthly archive":
+            start = time.perf_counter()
+            store.compact(before="9999-12")
+            write += time.perf_counter() - start
+        files, mb = disk(store)
+        full_n, full = scan(store)
+        one_n, one = scan(store, start="2024-04-01", end="2024-06-30", language="rust", since="daily")
+        assert full_n == len(records), (name, full_n)
+        rows.append((name, files, mb, write, full, one_n, one))
+
+    print(f"{args.days} 天 × {len(languages)} 个榜单 = {len(records)} 个快照")
+    print(f"{'format':<18}{'files':>7}{'disk(MB)':>10}{'write(s)':>10}{'full scan(s)':>14}{'rust Q2 (ms)':>14}")
+    for name, files, mb, write, full, one_n, one in rows:
+        print(f"{name:<18}{files:>7}{mb:>10.2f}{write:>10.2f}{full:>14.3f}{one * 1000:>14.1f}")
+
+
+def bench_queue(args):
+    """分片抓取：worker 进程数与吞吐量；worker 崩溃后租约过期重新分配、合并只做一次"""
+    import logging
+    import multiprocessing
+    from job_queue import JobQueue
+
+    logging.getLogger().setLevel(logging.WARNING)
+    ctx = multiprocessing.get_context("spawn")
+    languages = [f"lang{i}" for i in range(args.languages)]
+    sinces, spoken = ["daily", "weekly"], ["zh", "en"]
+    groups = len(languages) * len(sinces)
+
+    def run(name, workers, lease_seconds=300, crash=0):
+        queue_path = config.base_dir / f"queue_{name}.sqlite3"
+        queue = JobQueue(queue_path, lease_seconds=lease_seconds)
+        queue.enqueue(languages, sinces, spoken, "2025-05-20")
+        ready = ctx.Barrier(workers + 1)
+        start = time.perf_counter()
+        if crash:
+            crashed = [ctx.Process(target=_queue_worker, args=(config.base_dir, queue_path, 0, lease_seconds, True))
+                       for _ in range(crash)]
+            for p in crashed:
+                p.start()
+            for p in crashed:
+                p.join()
+        procs = [ctx.Process(target=_queue_worker, args=(config.base_dir, queue_path, args.latency, lease_seconds, False, ready))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        # 单核机器上进程启动（导入 lxml 等）本身就要数百毫秒，等全部就绪后再计时
+        ready.wait()
+        if not crash:
+            start = time.perf_counter()
+        for p in procs:
+            p.join()
+        wall = time.perf_counter() - start
+        counts = queue.counts()
+        queue.close()
+        return wall, counts
+
+    jobs = groups * len(spoken)
+    print(f"{jobs} 个任务（{groups} 个榜单 × {len(spoken)} 个 spoken_language），每个任务模拟 {args.latency}s 网络耗时")
+    print(f"{'workers':<10}{'wall(s)':>9}{'jobs/s':>9}{'speedup':>9}{'done':>6}{'merged':>8}")
+    base = None
+    for n in args.workers:
+        wall, counts = run(f"w{n}", n)
+        base = base or wall
+        print(f"{n:<10}{wall:>9.2f}{jobs / wall:>9.1f}{base / wall:>8.1f}x{counts['done']:>6}{counts['merged']:>8}")
+
+    wall, counts = run("crash", 2, lease_seconds=1, crash=2)
+    print(f"崩溃恢复：2 个 worker 领到任务后退出，租约 1s 过期后由 2 个正常 worker 接手 —— "
+          f"耗时 {wall:.2f}s，完成 {counts['done']}/{jobs}，合并 {counts['merged']}/{groups}")
+    from history_store import JsonHistoryStore
+    snapshots = sum(1 for _ in JsonHistoryStore(config.base_dir).iter_snapshots())
+    print(f"历史存储中的榜单快照：{snapshots}（期望 {groups}，重复合并只会覆盖同一榜单）")
+
+
+def _percentiles(values, points=(50, 95, 99)):
+    """p50/p95/p99（样本少于 2 个时都取该值）"""
+    import statistics
+
+    if len(values) < 2:
+        return [values[0] if values else 0.0] * len(points)
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return [cuts[p - 1] for p in points]
+
+
+def bench_replay(args):
+    """端到端回放：main.main 与并发矩阵抓取全部指向本地替身服务，统计吞吐量与延迟分位数"""
+    import logging
+    import main as entry
+    from metrics import metrics
+    from stand_in_server import StandInServer
+    from trending_scraper import TrendingScraper
+
+    logging.getLogger().setLevel(logging.ERROR)
+    config.metrics_textfile = config.base_dir / "metrics" / "replay.prom"
+    config.metrics_json_file = config.base_dir / "metrics" / "replay.json"
+    config.notify_outbox_dir = config.base_dir / "outbox"
+    # 只测流水线本身，不让企业微信的 20 条/分钟限速参与
+    config.notify_rate_per_min, config.notify_burst = 100000, 1000
+    languages = [f"lang{i}" for i in range(args.languages)]
+    sinces = ["daily", "weekly", "monthly"]
+
+    with StandInServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       forbidden_rate=args.forbidden_rate) as server:
+        server.point_config(config)
+        server.webhook_rate_limit = 10 ** 6
+        server.clash_nodes = {f"node-{i}": (100 + i * 40, 100 + i * 40) for i in range(5)}
+        server.clash_selected = "node-0"
+        print(f"替身服务 {server.url}：延迟 {args.latency}±{args.jitter}s，502 比例 {args.error_rate:.0%}，"
+              f"403 比例 {args.forbidden_rate:.0%}")
+
+        # 1. 单次运行入口：抓取 → 保存 → 报告 → 推送
+        runs = []
+        for i in range(args.rounds):
+            start = time.perf_counter()
+            entry.main(languages[i % len(languages)], "daily")
+            runs.append(time.perf_counter() - start)
+        p50, p95, p99 = _percentiles(runs)
+        print(f"\nmain.main × {args.rounds}：{args.rounds / sum(runs) * 60:.1f} 次/分钟，"
+              f"p50 {p50:.3f}s  p95 {p95:.3f}s  p99 {p99:.3f}s，"
+              f"共 {server.total_requests} 个请求，webhook 收到 {len(server.webhook_messages)} 条")
+        server.reset_stats()
+        metrics.reset()
+
+        # 2. 并发矩阵抓取
+        scraper = TrendingScraper(max_workers=args.workers)
+        start = time.perf_counter()
+        results = scraper.get_repos_many(languages, sinces)
+        wall = time.perf_counter() - start
+        pages = len(languages) * len(sinces)
+        ok = sum(1 for repos in results.values() if repos)
+        page_times = [t for path, t in server.timings if path.startswith("/trending")]
+        p50, p95, p99 = _percentiles(page_times)
+        retries = sum(v for (name, _), v in metrics.counters.items() if name.endswith("fetch_retries_total"))
+        print(f"矩阵 {len(languages)} 语言 × {len(sinces)} 时间范围（{args.workers} 并发）：{pages} 页用时 {wall:.2f}s，"
+              f"{pages / wall:.1f} 页/s，成功 {ok}/{pages}，重试 {retries:.0f} 次")
+        print(f"趋势页服务端耗时 p50 {p50 * 1000:.0f}ms  p95 {p95 * 1000:.0f}ms  p99 {p99 * 1000:.0f}ms；"
+              f"注入 403 {server.requests['INJECTED 403']} 次，502 {server.requests['INJECTED 502']} 次")
+
+
+def bench_pipeline(args):
+    """分段执行（抓完 → 补全完 → 保存）vs 流水线：总耗时、首个榜单落盘时间，以及抓取失败时已保存的榜单"""
+    import logging
+    from history_recorder import HistoryRecorder
+    from pipeline import Pipeline
+    from repo_enricher import enrich_repos_batch
+    from stand_in_server import StandInServer
+    from trending_scraper import TrendingScraper
+    from concurrent.futures import ThreadPoolExecutor
+
+    # 注入故障时补全的回退日志很多，这里只看结果
+    logging.getLogger().setLevel(logging.CRITICAL)
+    config.github_rate_per_sec, config.github_burst = 1000, 100
+    config.scrape_hedge = "off"
+    # 与分段执行做同样的补全请求，补全缓存另有 enrich-cache 子命令
+    config.enrich_cache_enabled = False
+    languages = [f"lang{i}" for i in range(args.languages)]
+    sinces = ["daily", "weekly", "monthly"]
+
+    def staged(recorder, enrich_workers):
+        scraper = TrendingScraper(max_workers=args.workers)
+        t0 = time.perf_counter()
+        results = scraper.get_repos_many(languages, sinces)
+        scraped = time.perf_counter()
+        keys = [key for key, repos in results.items() if repos]
+        with ThreadPoolExecutor(max_workers=enrich_workers) as pool:
+            enriched = dict(zip(keys, pool.map(lambda key: enrich_repos_batch(results[key], "fake-token"), keys)))
+        t2 = time.perf_counter()
+        first = None
+        for repos in enriched.values():
+            recorder.save(repos)
+            first = first or time.perf_counter() - t0
+        t3 = time.perf_counter()
+        return (scraped - t0, t2 - scraped, t3 - t2), t3 - t0, first, len(enriched)
+
+    def streamed(recorder):
+        saved = []
+        t0 = time.perf_counter()
+        pipe = Pipeline(TrendingScraper(max_workers=args.workers), recorder, enrich=True,
+                        enrich_workers=args.enrich_workers, token="fake-token",
+                        on_complete=lambda key, path, repos: saved.append(time.perf_counter() - t0))
+        pipe.run(languages, sinces)
+        return time.perf_counter() - t0, saved[0] if saved else None, len(saved)
+
+    with StandInServer(latency=args.latency) as server:
+        server.point_config(config)
+        print(f"{len(languages) * len(sinces)} 个榜单，替身服务延迟 {args.latency}s，抓取 {args.workers} 并发，"
+              f"流水线补全 {args.enrich_workers} 线程")
+        print(f"{'mode':<14}{'scrape(s)':>10}{'enrich(s)':>10}{'save(s)':>9}{'sum(s)':>8}{'wall(s)':>9}"
+              f"{'first list(s)':>15}{'lists':>7}")
+        root = config.base_dir
+        # 分段执行：补全逐个榜单串行（main 直接加上补全的样子），以及与流水线相同的补全并发
+        for name, workers in (("staged", 1), (f"staged x{args.enrich_workers}", args.enrich_workers)):
+            config.base_dir = root / name.replace(" ", "_")
+            stages, wall, first, lists = staged(HistoryRecorder(), workers)
+            print(f"{name:<14}{stages[0]:>10.2f}{stages[1]:>10.2f}{stages[2]:>9.2f}{sum(stages):>8.2f}"
+                  f"{wall:>9.2f}{first:>15.2f}{lists:>7}")
+        config.base_dir = root / "pipeline"
+        wall, first, lists = streamed(HistoryRecorder())
+        print(f"{'pipeline':<14}{'':>10}{'':>10}{'':>9}{'':>8}{wall:>9.2f}{first:>15.2f}{lists:>7}")
+
+        # 部分失败：一部分趋势页返回 502，分段执行要等全部重试结束才开始保存，流水线边完成边落盘
+        server.error_rate = args.error_rate
+        config.base_dir = root / "pipeline_faulty"
+        wall, first, lists = streamed(HistoryRecorder())
+        print(f"\n趋势页 502 比例 {args.error_rate:.0%}：流水线 {wall:.2f}s 内保存 {lists} 个完整榜单，"
+              f"首个榜单 {first:.2f}s 落盘")
+
+
+def bench_hedge(args):
+    """线路对冲与熔断：单线路 + 顺序重试 vs 直连/代理同时发 vs 按 p95 延迟对冲"""
+    import logging
+    import small_utils
+    from concurrent.futures import ThreadPoolExecutor
+    from stand_in_server import StandInServer
+    from trending_scraper import TrendingScraper
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    scenarios = {
+        # 直连偶发长尾与 502，代理稳定但更慢
+        "flaky direct": (dict(latency=0.05, jitter=0.02, slow_rate=0.1, slow_latency=3.0, error_rate=0.1),
+                         dict(latency=0.15, jitter=0.05, error_rate=0.02)),
+        # 直连完全不可用
+        "direct down": (dict(error_rate=1.0), dict(latency=0.15, jitter=0.05)),
+    }
+    pages = [(f"lang{i}", ("daily", "weekly", "monthly")[i % 3]) for i in range(args.pages)]
+    print(f"{args.pages} 页，{args.workers} 并发")
+    print(f"{'scenario':<14}{'mode':<9}{'wall(s)':>9}{'p50(ms)':>9}{'p95(ms)':>9}{'p99(ms)':>9}"
+          f"{'failed':>8}{'requests':>10}")
+    for scenario, (direct_opts, proxy_opts) in scenarios.items():
+        for mode in ("off", "race", "delayed"):
+            with StandInServer(seed=1, **direct_opts) as direct, StandInServer(seed=2, **proxy_opts) as proxy:
+                # 代理线路：请求以绝对 URL 发给 proxy 服务，它按路径直接应答，相当于经代理访问 GitHub
+                config.github_web_url = direct.url
+                config.ip_api_url = f"{direct.url}/json"
+                config.clash_api_url = proxy.url
+                config.proxies = {"http": proxy.url, "https": proxy.url}
+                config.scrape_hedge = mode
+                small_utils._breakers.clear()
+                small_utils._network_states.clear()
+                scraper = TrendingScraper(max_workers=args.workers)
+
+                def timed(page):
+                    start = time.perf_counter()
+                    repos = scraper.get_repos(*page)
+                    return time.perf_counter() - start, bool(repos)
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                    results = list(pool.map(timed, pages))
+                wall = time.perf_counter() - start
+                requests_sent = sum(n for key, n in list(direct.requests.items()) + list(proxy.requests.items())
+                                    if "/trending" in key)
+            p50, p95, p99 = _percentiles([t for t, _ in results])
+            failed = sum(1 for _, ok in results if not ok)
+            print(f"{scenario:<14}{mode:<9}{wall:>9.2f}{p50 * 1000:>9.0f}{p95 * 1000:>9.0f}{p99 * 1000:>9.0f}"
+                  f"{failed:>8}{requests_sent:>10}")
+
+
+def bench_seen(args):
+    """已推送索引：分代 Bloom 过滤器 vs 全量 set，随年份增长的查询耗时与内存"""
+    import sys
+    import random
+    import logging
+    from datetime import date, timedelta
+    from seen_index import SeenIndex
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(5)
+    index = SeenIndex(config.base_dir / "seen.sqlite3")
+    list_key = index.list_key("python", "daily", "bench")
+    exact, recent, next_id = set(), [], 0
+    day0 = date(2020, 1, 1)
+    print(f"每天 25 个仓库、约 {args.new_per_day} 个新仓库；索引每代 {index.generation_days} 天，保留 {index.generations} 代")
+    print(f"{'years':<7}{'repos':>9}{'bloom(KB)':>11}{'set(KB)':>10}{'bloom lookup(us)':>18}"
+          f"{'set lookup(us)':>16}{'missed new':>12}")
+    for year in range(1, args.years + 1):
+        missed = total_new = 0
+        for d in range((year - 1) * 365, year * 365):
+            date_str = (day0 + timedelta(days=d)).isoformat()
+            # 榜单缓慢变化：大部分来自最近上过榜的仓库，少数是全新仓库
+            today = [f"owner{next_id + i}/repo" for i in range(args.new_per_day)]
+            next_id += args.new_per_day
+            today += rng.sample(recent, min(len(recent), 25 - len(today)))
+            recent = (recent + today)[-300:]
+            for key in today:
+                if key not in exact:
+                    total_new += 1
+                    missed += index.seen(list_key, key)  # 误判为已推送
+            index.mark(list_key, today, date_str)
+            exact.update(today)
+
+        probes = [f"owner{rng.randrange(next_id)}/repo" for _ in range(20000)]
+        start = time.perf_counter()
+        for key in probes:
+            index.seen(list_key, key)
+        bloom_us = (time.perf_counter() - start) / len(probes) * 1e6
+        start = time.perf_counter()
+        for key in probes:
+            _ = key in exact
+        set_us = (time.perf_counter() - start) / len(probes) * 1e6
+        set_kb = (sys.getsizeof(exact) + sum(sys.getsizeof(k) for k in exact)) / 1024
+        print(f"{year:<7}{len(exact):>9}{index.memory_bytes() / 1024:>11.0f}{set_kb:>10.0f}{bloom_us:>18.2f}"
+              f"{set_us:>16.3f}{missed:>7}/{total_new}")
+    index.close()
+
+
+def bench_search(args):
+    """全文检索：倒排索引 vs 逐个快照子串匹配，随历史年数增长的增量写入耗时、体积与查询延迟"""
+    import random
+    import logging
+    from datetime import date, timedelta
+    from history_store import JsonHistoryStore
+    from search_index import SearchIndex
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(23)
+    # 短语 -> 相关标签；另有大量只出现在少数仓库上的杂项标签
+    phrases = {"LLM agent framework": ["llm", "ai-agents"], "vector database": ["vector-database"],
+               "web framework": ["web"], "deep learning compiler": ["compiler", "deep-learning"],
+               "terminal UI": ["cli", "tui"], "static site generator": ["ssg"], "RAG pipeline": ["rag", "llm"],
+               "kubernetes operator": ["kubernetes"], "大模型智能体框架": ["llm", "ai-agents"],
+               "向量数据库": ["vector-database"], "高性能网络库": ["networking"], "中文自然语言处理": ["nlp", "chinese"],
+               "量化交易系统": ["quant"], "开源笔记应用": ["notes"]}
+    lists = [(f"lang{i}", since) for i in range(args.languages) for since in ("daily", "weekly")]
+    meta = []
+
+    def new_repo():
+        i = len(meta)
+        # 约四成仓库的描述含有关注的短语，其余是互不相同的杂项描述
+        picked = rng.sample(list(phrases), 2 if rng.random() < 0.1 else 1) if rng.random() < 0.4 else []
+        desc = " ".join(picked) or f"misc toolkit {i}"
+        repo_topics = [t for p in picked for t in phrases[p]] + [f"misc-{rng.randrange(5000)}"]
+        meta.append((f"owner{i}", f"{rng.choice(['fast', 'Open', 'mini', 'Deep'])}Repo{i}", desc, repo_topics))
+        return i
+
+    store = JsonHistoryStore(config.base_dir / "search_history")
+    index = SearchIndex(config.base_dir / "search_index.sqlite3")
+    recent = {key: [] for key in lists}
+    day0, latest = date(2022, 1, 1), ""
+    queries = [
+        ("llm agent, 90d", "llm agent", {"days": 90}),
+        ("vector db | 向量数据库", "vector database | 向量数据库", {"days": 90}),
+        ("中文 all time", "中文自然语言", {}),
+        ("topic, one list", "topic:vector-database", {"language": "lang0", "since": "daily"}),
+        ("web framework, 1y", "web framework", {"start": "2022-01-01", "end": "2022-12-31"}),
+    ]
+
+    def naive(query, start=None, end=None, days=None, language=None, since=None):
+        if days:
+            start = (date.fromisoformat(latest) - timedelta(days=days - 1)).isoformat()
+        alternatives = [part.lower().replace("topic:", "").replace("-", " ").split()
+                        for part in query.split("|")]
+        hits = set()
+        for record in store.iter_snapshots(start, end, language=language, since=since):
+            for r in record["repos"]:
+                text = " ".join(r.get("topics", [])) if query.startswith("topic:") else \
+                    f"{r['owner']} {r['repo']} {r['desc']} {' '.join(r.get('topics', []))}"
+                text = text.lower().replace("-", " ")
+                if any(all(w in text for w in words) for words in alternatives):
+                    hits.add((r["owner"], r["repo"]))
+        return hits
+
+    print(f"{args.languages} 语言 × daily/weekly，每个榜单 25 个仓库、每天约 {args.new_per_day} 个新仓库，描述中英混合")
+    print(f"{'years':<6}{'query':<24}{'hits':>7}{'naive':>7}{'index p50(ms)':>15}{'p95(ms)':>9}"
+          f"{'naive(ms)':>11}")
+    for year in range(1, args.years + 1):
+        start = time.perf_counter()
+        for d in range((year - 1) * 365, year * 365):
+            latest = (day0 + timedelta(days=d)).isoformat()
+            for language, since in lists:
+                # 榜单缓慢变化：大部分是最近上过榜的仓库，少数是新仓库
+                picked = [new_repo() for _ in range(args.new_per_day)]
+                pool = recent[(language, since)]
+                picked += rng.sample(pool, min(len(pool), 25 - len(picked)))
+                recent[(language, since)] = (pool + picked)[-60:]
+                repos = []
+                for i in dict.fromkeys(picked):
+                    owner, repo, desc, repo_topics = meta[i]
+                    item = BaseRepo(owner, repo, f"https://github.com/{owner}/{repo}", desc,
+                                    rng.randint(1, 2000), language, since).to_dict()
+                    # 约一半快照经过补全、带有标签
+                    if rng.random() < 0.5:
+                        item["topics"] = repo_topics
+                    repos.append(item)
+                record = {"date": latest, "type": since, "repos": repos}
+                store.save_record(record)
+                index.add_snapshot(record)
+        build = time.perf_counter() - start
+        stats = index.stats()
+        print(f"-- 第 {year} 年：写入 {build:.1f}s（jsonl.gz + 索引，每个快照 "
+              f"{build / 365 / len(lists) * 1000:.2f}ms），{stats['repos']} 个仓库，"
+              f"{stats['appearances']} 条上榜，索引 {stats['bytes'] / 1024 / 1024:.1f}MB")
+        for name, query, kwargs in queries:
+            cost = []
+            for _ in range(args.rounds):
+                t = time.perf_counter()
+                index.search(query, **kwargs)
+                cost.append((time.perf_counter() - t) * 1000)
+            hits = len(index.search(query, limit=len(meta), **kwargs))
+            t = time.perf_counter()
+            expected = naive(query, **kwargs)
+            naive_ms = (time.perf_counter() - t) * 1000
+            p50, p95 = _percentiles(cost, (50, 95))
+            print(f"{year:<6}{name:<24}{hits:>7}{len(expected):>7}{p50:>15.2f}{p95:>9.2f}{naive_ms:>11.0f}")
+
+    start = time.perf_counter()
+    index.rebuild(store)
+    print(f"从 jsonl.gz 全量重建索引 {time.perf_counter() - start:.1f}s")
+    index.close()
+
+
+def bench_ratelimit(args):
+    """限流场景：单 token 直接请求 vs 多 token 调度器，补全成功的仓库数"""
+    import logging
+    import requests
+    from stand_in_server import StandInServer
+    from github_scheduler import GitHubScheduler
+    from repo_enricher import enrich_repo_info
+
+    logging.getLogger().setLevel(logging.ERROR)
+    bases = _fake_bases(args.repos)
+    tokens = [f"token-{i}" for i in range(args.tokens)]
+    with StandInServer() as server:
+        config.github_api_base = server.url
+        server.rate_limit, server.rate_reset = args.limit, args.reset
+
+        print(f"{args.repos} 个仓库，每个 token 每 {args.reset}s 限 {args.limit} 次")
+        print(f"{'mode':<26}{'enriched':>10}{'403s':>7}{'wall(s)':>10}")
+
+        start = time.perf_counter()
+        with requests.Session() as session:
+            rich = [enrich_repo_info(b, tokens[0], session=session, use_cache=False) for b in bases]
+        ok = sum(1 for r in rich if r.stargazers_count)
+        print(f"{'single token, no sched':<26}{ok:>10}{server.requests['LIMITED core']:>7}"
+              f"{time.perf_counter() - start:>10.2f}")
+
+        server.reset_stats()
+        scheduler = GitHubScheduler(tokens=tokens, rate_per_sec=50, burst=10, max_wait=60)
+        start = time.perf_counter()
+        rich = [enrich_repo_info(b, None, session=scheduler, use_cache=False) for b in bases]
+        ok = sum(1 for r in rich if r.stargazers_count)
+        print(f"{f'scheduler ({args.tokens} tokens)':<26}{ok:>10}{server.requests['LIMITED core']:>7}"
+              f"{time.perf_counter() - start:>10.2f}")
+        for row in scheduler.report():
+            print("  ", row)
+
+_STARTUP_CHILD = """
+import time, json, sys
+start = time.perf_counter()
+import main
+from trending_scraper import TrendingScraper
+imported = time.perf_counter()
+resp = TrendingScraper().session.get(sys.argv[1], timeout=10)
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_request": done - start, "status": resp.status_code}), flush=True)
+"""
+
+
+def _parse_importtime(stderr: str, top: int):
+    """解析 -X importtime 输出，返回 (总导入耗时 ms, 按累计耗时排序的顶层模块)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        if not name.startswith("  "):  # 缩进表示被其他模块间接导入，只看顶层模块
+            rows.append((name.strip(), int(cumulative_us) / 1000))
+    rows.sort(key=lambda r: -r[1])
+    return sum(ms for _, ms in rows), rows[:top]
+
+
+def bench_startup(args):
+    """冷启动：子进程从解释器启动到首个请求完成的耗时，结果追加到历史文件便于跨版本对比"""
+    import json
+    import os
+    import statistics
+    import subprocess
+    import sys
+    from datetime import datetime
+    from stand_in_server import StandInServer
+
+    repo_dir = str(Path(__file__).resolve().parent)
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    wall, imports, first, stderr = [], [], [], ""
+    with StandInServer() as server:
+        url = f"{server.url}/repos/octo/startup"
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _STARTUP_CHILD, url],
+                                  cwd=config.base_dir, env=env, capture_output=True, text=True)
+            wall.append(time.perf_counter() - start)
+            if proc.returncode != 0:
+                print(proc.stderr[-2000:])
+                return
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            imports.append(result["import"])
+            first.append(result["first_request"])
+            stderr = proc.stderr
+
+    import_ms, top = _parse_importtime(stderr, args.top)
+    record = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir,
+                                   capture_output=True, text=True).stdout.strip(),
+        "python": sys.version.split()[0],
+        "rounds": args.rounds,
+        "process_wall_s": round(statistics.median(wall), 4),
+        "import_s": round(statistics.median(imports), 4),
+        "first_request_s": round(statistics.median(first), 4),
+        "importtime_top": [[name, round(ms, 1)] for name, ms in top],
+    }
+    print(f"中位数（{args.rounds} 轮）：进程总耗时 {record['process_wall_s']:.3f}s，"
+          f"导入 {record['import_s']:.3f}s，首个请求完成 {record['first_request_s']:.3f}s")
+    print(f"-X importtime 顶层模块合计 {import_ms:.1f}ms，耗时最多的：")
+    for name, ms in top:
+        print(f"  {name:<30}{ms:>8.1f}ms")
+
+    history = Path(args.history)
+    previous = None
+    if history.exists():
+        lines = history.read_text(encoding="utf-8").splitlines()
+        previous = json.loads(lines[-1]) if lines else None
+    if previous:
+        print(f"上次（{previous['revision'] or '-'}，{previous['date']}）首个请求 "
+              f"{previous['first_request_s']:.3f}s，本次 {record['first_request_s']:.3f}s")
+    history.parent.mkdir(parents=True, exist_ok=True)
+    with history.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main():
+    # 所有缓存/数据写入临时目录，不污染真实数据
+    config.base_dir = Path(tempfile.mkdtemp(prefix="gh_bench_"))
+
+    parser = argparse.ArgumentParser(description="github_trending_reporter 性能对比")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enrich", help="REST 逐个补全 vs GraphQL 批量补全")
+    p.add_argument("--repos", type=int, default=25)
+    p.add_argument("--missing", type=int, default=2, help="其中不存在的仓库数（触发 REST 回退）")
+    p.add_argument("--batch", type=int, default=config.graphql_batch_size)
+    p.add_argument("--latency", type=float, default=0.05, help="替身服务每个请求的模拟延迟（秒）")
+    p.set_defaults(func=bench_enrich)
+
+    p = sub.add_parser("enrich-cache", help="补全：每次全量 vs 按字段新鲜期的快照缓存")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--runs-per-day", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4],
+                   help="每天运行次数，逗号分隔可比较多组")
+    p.add_argument("--languages", type=int, default=4)
+    p.add_argument("--new-per-day", type=int, default=5, help="每个语言每天新上榜的仓库数")
+    p.add_argument("--latency", type=float, default=0.0)
+    p.set_defaults(func=bench_enrich_cache)
+
+    p = sub.add_parser("parse", help="趋势页解析：校验与旧实现输出一致并计时")
+    p.add_argument("--fixtures", default=str(Path(__file__).parent / "fixtures" / "trending"))
+    p.add_argument("--rounds", type=int, default=200)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("logging", help="逐条日志开销：同步写入 vs 队列后台写入 vs 限流")
+    p.add_argument("--fixtures", default=str(Path(__file__).parent / "fixtures" / "trending"))
+    p.add_argument("--rounds", type=int, default=200)
+    p.add_argument("--item-rate", type=int, default=50, help="限流模式下每秒最多放行的逐条日志数")
+    p.add_argument("--io-latency", type=float, default=0.0, help="每次写日志文件额外的模拟延迟（毫秒）")
+    p.set_defaults(func=bench_logging)
+
+    p = sub.add_parser("history", help="历史查询：JSON 文件扫描 vs SQLite 索引")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser("archive", help="历史文件格式：JSON vs jsonl.gz vs 月度归档")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--lists", type=int, default=6, help="每天的榜单数")
+    p.add_argument("--pool", type=int, default=2000)
+    p.add_argument("--churn", type=int, default=8, help="每个榜单每天新换上的仓库数")
+    p.set_defaults(func=bench_archive)
+
+    p = sub.add_parser("analyze", help="向量化趋势分析耗时")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--languages", type=int, default=20)
+    p.set_defaults(func=bench_analyze)
+
+    p = sub.add_parser("digest", help="区间汇总：流式读取 + 有界 top-k")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--languages", type=int, default=20)
+    p.add_argument("--pool", type=int, default=2000, help="每个语言的候选仓库数")
+    p.add_argument("--capacity", type=int, help="计数器上限，默认取配置 [digest] capacity")
+    p.set_defaults(func=bench_digest)
+
+    p = sub.add_parser("models", help="模型内存与序列化：dataclass vs slots vs 列式")
+    p.add_argument("--repos", type=int, default=100000, help="记录条数")
+    p.add_argument("--pool", type=int, default=5000, help="不同仓库数（同一仓库多天上榜）")
+    p.set_defaults(func=bench_models)
+
+    p = sub.add_parser("clash", help="节点选择：随机 vs 测速排序")
+    p.add_argument("--nodes", type=int, default=30)
+    p.add_argument("--dead", type=float, default=0.2, help="失效节点比例")
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_clash)
+
+    p = sub.add_parser("notify", help="企业微信推送：单次 post vs 分片并发 + outbox")
+    p.add_argument("--languages", type=int, default=10, help="报告包含的语言数")
+    p.add_argument("--webhooks", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.set_defaults(func=bench_notify)
+
+    p = sub.add_parser("queue", help="分片抓取：worker 进程数扩展性与崩溃恢复")
+    p.add_argument("--languages", type=int, default=12)
+    p.add_argument("--latency", type=float, default=0.1, help="每个任务的模拟网络耗时（秒）")
+    p.add_argument("--workers", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4, 8])
+    p.set_defaults(func=bench_queue)
+
+    p = sub.add_parser("replay", help="端到端回放：main.main 与矩阵抓取对接本地替身服务")
+    p.add_argument("--rounds", type=int, default=10, help="main.main 运行次数")
+    p.add_argument("--languages", type=int, default=10, help="矩阵抓取的语言数（× daily/weekly/monthly）")
+    p.add_argument("--workers", type=int, default=config.scrape_workers)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--jitter", type=float, default=0.02)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--forbidden-rate", type=float, default=0.0)
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser("pipeline", help="分段执行 vs 抓取 → 补全 → 保存 流水线")
+    p.add_argument("--languages", type=int, default=10)
+    p.add_argument("--workers", type=int, default=4, help="抓取并发数")
+    p.add_argument("--enrich-workers", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.1)
+    p.add_argument("--error-rate", type=float, default=0.2)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("hedge", help="线路对冲与熔断：顺序重试 vs race vs p95 延迟对冲")
+    p.add_argument("--pages", type=int, default=60)
+    p.add_argument("--workers", type=int, default=8)
+    p.set_defaults(func=bench_hedge)
+
+    p = sub.add_parser("seen", help="已推送索引：分代 Bloom vs 全量 set")
+    p.add_argument("--years", type=int, default=5)
+    p.add_argument("--new-per-day", type=int, default=4)
+    p.set_defaults(func=bench_seen)
+
+    p = sub.add_parser("search", help="全文检索：倒排索引 vs 快照子串匹配")
+    p.add_argument("--years", type=int, default=3)
+    p.add_argument("--languages", type=int, default=6)
+    p.add_argument("--new-per-day", type=int, default=4, help="每个榜单每天新上榜的仓库数")
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("ratelimit", help="限流场景：单 token vs 多 token 调度器")
+    p.add_argument("--repos", type=int, default=60)
+    p.add_argument("--tokens", type=int, default=3)
+    p.add_argument("--limit", type=int, default=15)
+    p.add_argument("--reset", type=int, default=3)
+    p.set_defaults(func=bench_ratelimit)
+
+    p = sub.add_parser("startup", help="冷启动耗时（-X importtime + 首个请求），结果追加到历史文件")
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--top", type=int, default=10, help="列出累计导入耗时最多的模块数")
+    p.add_argument("--history", default=str(Path(__file__).parent / "benchmark_history" / "startup.jsonl"))
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
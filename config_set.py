@@ -25,6 +25,22 @@ class Config:
     def __init__(self):
         # GitHub Token
         self.github_token = parser.get('github', 'token', fallback='')
+        # 多 token 轮换（逗号分隔），与 token 合并去重
+        self.github_tokens = list(dict.fromkeys(
+            t.strip() for t in [self.github_token] + parser.get('github', 'tokens', fallback='').split(',')
+            if t.strip()
+        ))
+        # API 请求节奏：每秒请求数与突发上限，额度耗尽时最多等待的秒数
+        self.github_rate_per_sec = parser.getfloat('github', 'rate_per_sec', fallback=5)
+        self.github_burst = parser.getint('github', 'burst', fallback=10)
+        self.github_max_wait = parser.getint('github', 'max_wait', fallback=3600)
+        # GitHub API 地址（可指向本地替身服务做测试）及 GraphQL 单次查询的仓库数
+        self.github_api_base = parser.get('github', 'api_base', fallback='https://api.github.com').rstrip('/')
+        self.graphql_batch_size = parser.getint('github', 'graphql_batch_size', fallback=20)
+
+        # 外部地址：GitHub 网页（趋势页与连通性探测）与出口 IP 查询，可指向本地替身服务做离线回放
+        self.github_web_url = parser.get('endpoints', 'github_web', fallback='https://github.com').rstrip('/')
+        self.ip_api_url = parser.get('endpoints', 'ip_api', fallback='http://ip-api.com/json')
 
         # 代理配置
         self.proxies = {
@@ -32,12 +48,132 @@ class Config:
             "https": parser.get('proxy', 'https', fallback=''),
         }
         self.group_name = parser.get('proxy', 'group_name', fallback='两元店')
+        # Clash 控制器：节点切换方式 random / best / weighted
+        self.clash_api_url = parser.get('clash', 'api_url', fallback='http://127.0.0.1:9090').rstrip('/')
+        self.clash_secret = parser.get('clash', 'secret', fallback='')
+        self.clash_select_mode = parser.get('clash', 'select_mode', fallback='best')
+
+        # 网络探测结论的缓存时间（秒），期间所有请求复用同一结论
+        self.network_verdict_ttl = parser.getint('proxy', 'verdict_ttl', fallback=300)
+
+        # 爬虫并发：同一连接池内同时进行的请求数上限
+        self.scrape_workers = parser.getint('scraper', 'max_workers', fallback=8)
+        # 对冲抓取：off 按探测结论走单条线路；race 直连与代理同时发；delayed 先走较快的线路，
+        # 超过其 p95 耗时（至少 hedge_min_delay 秒，无统计时 hedge_default_delay 秒）仍未返回再发另一条；
+        # 网络探测只在 off 时运行，对冲模式由各线路的熔断器判断可用性，代理线路熔断时切换节点
+        self.scrape_hedge = parser.get('scraper', 'hedge', fallback='delayed')
+        self.hedge_min_delay = parser.getfloat('scraper', 'hedge_min_delay', fallback=0.3)
+        self.hedge_default_delay = parser.getfloat('scraper', 'hedge_default_delay', fallback=1.0)
+        # 两条线路都熔断时最多等待的秒数，超过则放弃本页
+        self.hedge_max_wait = parser.getfloat('scraper', 'hedge_max_wait', fallback=30)
+        # 线路熔断：连续失败次数、首次退避秒数与退避上限
+        self.breaker_threshold = parser.getint('scraper', 'breaker_threshold', fallback=3)
+        self.breaker_backoff = parser.getfloat('scraper', 'breaker_backoff', fallback=5)
+        self.breaker_max_backoff = parser.getfloat('scraper', 'breaker_max_backoff', fallback=300)
 
         # 存储路径
         self.base_dir = Path(parser.get('path', 'base_dir', fallback='/tmp/github_data'))
+        # 历史数据存储后端，逗号分隔，可选 json / sqlite；报告默认读取 json 文件
+        self.history_backends = [
+            b.strip() for b in parser.get('storage', 'backends', fallback='json').split(',') if b.strip()
+        ]
+        # json 后端的写入格式：jsonl.gz（每天一个压缩文件，按榜单追加行）或 json（旧格式，每个榜单一个缩进 JSON）
+        self.history_file_format = parser.get('storage', 'file_format', fallback='jsonl.gz')
+
+        # 滚动聚合：窗口天数与每个排行榜保留的名次数
+        self.aggregates_enabled = parser.getboolean('aggregates', 'enabled', fallback=True)
+        self.aggregate_windows = [
+            int(w) for w in parser.get('aggregates', 'windows', fallback='7,30,90').split(',') if w.strip()
+        ]
+        self.aggregate_top_k = parser.getint('aggregates', 'top_k', fallback=20)
+
+        # 全文搜索索引：保存快照时同步更新
+        self.search_enabled = parser.getboolean('search', 'enabled', fallback=True)
+
+        # API 响应缓存（ETag 条件请求），超出容量按 LRU 淘汰
+        self.http_cache_max_mb = parser.getfloat('cache', 'http_max_mb', fallback=64)
+
+        # 常驻模式：任务列表（language:since[:report]，逗号分隔）、间隔与随机抖动
+        self.schedule_jobs = [
+            j.strip() for j in parser.get('schedule', 'jobs', fallback='python:daily:report').split(',') if j.strip()
+        ]
+        self.schedule_interval = parser.getint('schedule', 'interval_minutes', fallback=1440) * 60
+        self.schedule_jitter = parser.getint('schedule', 'jitter_seconds', fallback=300)
+        self.status_file = Path(parser.get('schedule', 'status_file',
+                                           fallback=str(self.base_dir / 'daemon_status.json')))
+
+        # 分片抓取队列：入队矩阵（逗号分隔，language 为空表示全部语言榜）、数据库位置、租约秒数与最大尝试次数
+        self.queue_languages = [
+            s.strip() for s in parser.get('queue', 'languages', fallback='python').split(',')
+        ]
+        self.queue_sinces = [
+            s.strip() for s in parser.get('queue', 'sinces', fallback='daily,weekly').split(',') if s.strip()
+        ]
+        self.queue_spoken_languages = [
+            s.strip() for s in parser.get('queue', 'spoken_languages', fallback='zh').split(',') if s.strip()
+        ]
+        self.queue_path = Path(parser.get('queue', 'path', fallback=str(self.base_dir / 'job_queue.sqlite3')))
+        self.queue_lease_seconds = parser.getint('queue', 'lease_seconds', fallback=300)
+        self.queue_max_attempts = parser.getint('queue', 'max_attempts', fallback=3)
+
+        # 补全快照缓存：各字段的新鲜期（小时，field:hours 逗号分隔，未列出的取 default），过期的字段才重新请求
+        self.enrich_cache_enabled = parser.getboolean('enrich_cache', 'enabled', fallback=True)
+        self.enrich_cache_ttl_hours = {
+            k.strip(): float(v) for k, v in (
+                item.split(':') for item in parser.get(
+                    'enrich_cache', 'ttl_hours',
+                    fallback='stargazers_count:6,forks_count:6,pushed_at:48,updated_at:48,open_issues_count:72,'
+                             'subscribers_count:72,topics:168,homepage:168,license:720,created_at:8760,default:24'
+                ).split(',') if item.strip()
+            )
+        }
+
+        # 流水线模式：是否补全、补全线程数、段间队列长度、每到多少个仓库先保存一次已有部分（0 只保存最终结果）
+        self.pipeline_enrich = parser.getboolean('pipeline', 'enrich', fallback=True)
+        self.pipeline_enrich_workers = parser.getint('pipeline', 'enrich_workers', fallback=4)
+        self.pipeline_queue_size = parser.getint('pipeline', 'queue_size', fallback=100)
+        self.pipeline_flush_every = parser.getint('pipeline', 'flush_every', fallback=10)
+
+        # 日志：级别、是否由后台线程写入、文件格式 text / json、逐条日志每秒最多条数（0 不限）
+        self.log_level = parser.get('logging', 'level', fallback='INFO').upper()
+        self.log_async = parser.getboolean('logging', 'async', fallback=True)
+        self.log_format = parser.get('logging', 'format', fallback='text')
+        self.log_item_rate = parser.getint('logging', 'item_rate', fallback=50)
+
+        # 运行指标：Prometheus textfile（供 node-exporter 采集）与 JSON 摘要；profile 可选 cprofile / pyinstrument
+        self.metrics_enabled = parser.getboolean('metrics', 'enabled', fallback=True)
+        self.metrics_textfile = Path(parser.get('metrics', 'textfile',
+                                                fallback=str(self.base_dir / 'metrics' / 'github_trending.prom')))
+        self.metrics_json_file = Path(parser.get('metrics', 'json_file',
+                                                 fallback=str(self.base_dir / 'metrics' / 'last_run.json')))
+        self.profile_mode = parser.get('metrics', 'profile', fallback='')
+        self.profile_dir = Path(parser.get('metrics', 'profile_dir', fallback=str(self.base_dir / 'profiles')))
+
+        # 区间汇总（周报 / 月报）的计数器上限，不同仓库数不超过该值时结果精确
+        self.digest_capacity = parser.getint('digest', 'capacity', fallback=20000)
+
+        # 日报只推送变化（新上榜 / 上升 / 掉榜），channel 区分不同推送渠道的已推送记录
+        self.report_diff = parser.getboolean('report', 'diff', fallback=True)
+        self.report_channel = parser.get('report', 'channel', fallback='qiwei')
+        # 已推送索引：每代天数、保留代数、每代容量与误判率
+        self.seen_generation_days = parser.getint('seen', 'generation_days', fallback=90)
+        self.seen_generations = parser.getint('seen', 'generations', fallback=4)
+        self.seen_capacity = parser.getint('seen', 'capacity', fallback=5000)
+        self.seen_error_rate = parser.getfloat('seen', 'error_rate', fallback=0.001)
 
         # 企业微信通知
         self.qiwx_webhook_url = parser.get('notify', 'qiwx_webhook_url', fallback='')
+        # 多个 webhook（逗号分隔），与 qiwx_webhook_url 合并去重
+        self.qiwx_webhook_urls = list(dict.fromkeys(
+            u.strip() for u in [self.qiwx_webhook_url] + parser.get('notify', 'qiwx_webhook_urls', fallback='').split(',')
+            if u.strip()
+        ))
+        # 每个 webhook 每分钟最多条数与突发条数、单条 markdown 字节上限、未送达消息的保存目录与有效期
+        self.notify_rate_per_min = parser.getint('notify', 'rate_per_min', fallback=20)
+        self.notify_burst = parser.getint('notify', 'burst', fallback=5)
+        self.notify_chunk_bytes = parser.getint('notify', 'chunk_bytes', fallback=4096)
+        self.notify_outbox_dir = Path(parser.get('notify', 'outbox_dir', fallback=str(self.base_dir / 'outbox')))
+        self.notify_outbox_max_age_hours = parser.getint('notify', 'outbox_max_age_hours', fallback=72)
 
 
 # 全局可用配置对象
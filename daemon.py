@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : daemon.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 常驻调度模式，复用会话、缓存与 Clash 状态，按计划执行抓取任务
+"""
+
+import os
+import json
+import time
+import random
+import signal
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+from config_set import config
+from log_utils import init_logger
+from trending_scraper import TrendingScraper
+from history_recorder import HistoryRecorder
+from output_generator import OutputGenerator
+from metrics import metrics
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class Job:
+    """一个计划任务：抓取 (language, since)，report 为 True 时推送报告"""
+
+    def __init__(self, language: str, since: str, report: bool = False):
+        self.language = language
+        self.since = since
+        self.report = report
+        self.next_run = 0.0
+        self.last_run: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_status: Optional[str] = None
+        self.runs = 0
+        self.failures = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Job":
+        """解析 'language:since[:report]'，如 'python:daily:report'"""
+        parts = spec.split(':')
+        language = parts[0]
+        since = parts[1] if len(parts) > 1 and parts[1] else "daily"
+        return cls(language, since, report=len(parts) > 2 and parts[2] == "report")
+
+    @property
+    def name(self) -> str:
+        return f"{self.language or 'all'}/{self.since}"
+
+    def status(self) -> Dict:
+        return {
+            "job": self.name,
+            "report": self.report,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_status": self.last_status,
+            "next_run": datetime.fromtimestamp(self.next_run).isoformat(timespec="seconds"),
+        }
+
+
+class TrendingDaemon:
+    """
+    常驻进程：爬虫会话、网络结论、HTTP 缓存和 Clash 节点评分在多次任务间保持热状态。
+    - 每个任务执行完后按 interval + 随机 jitter 安排下一次
+    - 任务在同一线程内依次执行，加锁保证不会重叠
+    - SIGTERM/SIGINT 时等当前任务结束后退出
+    - 状态写入 status_file（JSON），便于外部查看
+    """
+
+    def __init__(self, jobs: Optional[List[str]] = None, interval: Optional[int] = None,
+                 jitter: Optional[int] = None, status_file: Optional[Path] = None):
+        self.jobs = [Job.parse(spec) for spec in (jobs or config.schedule_jobs)]
+        self.interval = interval or config.schedule_interval
+        self.jitter = config.schedule_jitter if jitter is None else jitter
+        self.status_file = Path(status_file or config.status_file)
+
+        self.scraper = TrendingScraper()
+        self.recorder = HistoryRecorder()
+
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.state = "idle"
+        self.current: Optional[Job] = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    # —— 调度 ——
+    def _schedule(self, job: Job, first: bool = False):
+        delay = 0 if first else self.interval
+        job.next_run = time.time() + delay + random.uniform(0, self.jitter)
+
+    def run_job(self, job: Job) -> bool:
+        """执行一个任务；若已有任务在跑则跳过，返回是否执行"""
+        if not self._run_lock.acquire(blocking=False):
+            logger.warning(f"[{job.name}] 上一个任务尚未结束，跳过本次")
+            return False
+        try:
+            self.state, self.current = "running", job
+            self._write_status()
+            start = time.perf_counter()
+            job.last_run = datetime.now().isoformat(timespec="seconds")
+            try:
+                # 跨天时更新存储路径
+                self.recorder.refresh_date()
+                repos = self.scraper.get_repos(job.language, job.since)
+                save_path = self.recorder.save(repos)
+                if job.report and save_path:
+                    generator = OutputGenerator(save_path)
+                    generator.send_to_qiwei(generator.generate_markdown())
+                job.last_status = "ok" if repos else "empty"
+            except Exception as e:
+                job.failures += 1
+                job.last_status = f"error: {e}"
+                logger.exception(f"[{job.name}] 任务失败：{e}")
+            job.runs += 1
+            job.last_duration = round(time.perf_counter() - start, 3)
+            metrics.inc("job_runs_total", job=job.name, status="ok" if job.last_status in ("ok", "empty") else "error")
+            metrics.observe("stage_duration_seconds", job.last_duration, stage="run")
+            metrics.export()
+            logger.info(f"[{job.name}] 任务完成（{job.last_status}），耗时 {job.last_duration}s")
+            return True
+        finally:
+            self.state, self.current = "idle", None
+            self._run_lock.release()
+            self._write_status()
+
+    def serve(self):
+        """主循环：阻塞直到收到停止信号"""
+        self._install_signals()
+        for job in self.jobs:
+            self._schedule(job, first=True)
+        logger.info(f"常驻模式启动，共 {len(self.jobs)} 个任务：{[j.name for j in self.jobs]}")
+        self._write_status()
+
+        while not self._stop.is_set():
+            due = min(self.jobs, key=lambda j: j.next_run)
+            wait = due.next_run - time.time()
+            if wait > 0:
+                self._stop.wait(min(wait, 60))
+                continue
+            self.run_job(due)
+            self._schedule(due)
+
+        self.state = "stopped"
+        self._write_status()
+        logger.info("常驻模式已退出")
+
+    def stop(self, *_):
+        if not self._stop.is_set():
+            logger.info("收到停止信号，当前任务结束后退出")
+            self.state = "stopping"
+            self._stop.set()
+
+    def _install_signals(self):
+        # 只有主线程能注册信号处理
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+    # —— 状态文件 ——
+    def status(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "state": self.state,
+            "current_job": self.current.name if self.current else None,
+            "jobs": [j.status() for j in self.jobs],
+        }
+
+    def _write_status(self):
+        """先写临时文件再替换，避免读到半截内容"""
+        try:
+            self.status_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.status_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.status(), ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(self.status_file)
+        except Exception as e:
+            logger.warning(f"写入状态文件失败：{e}")
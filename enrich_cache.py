@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : enrich_cache.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 仓库补全数据的快照缓存（按字段设置新鲜期）与 star / fork 时间序列
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from config_set import config
+from log_utils import init_logger
+from repo_enricher import RICH_FIELDS
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class EnrichCache:
+    """
+    - fields: 每个仓库每个补全字段一行（JSON 值 + 取回时间），各字段按 ttl_hours 判断是否过期，
+      许可证、创建时间这类几乎不变的字段几周刷新一次，star 数几小时刷新一次
+    - series: 每次刷新到 star / fork 数时追加一个点，不额外请求就能画出总 star 增长曲线
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fields (
+            owner TEXT NOT NULL, repo TEXT NOT NULL, field TEXT NOT NULL,
+            value TEXT NOT NULL, fetched_at REAL NOT NULL,
+            PRIMARY KEY (owner, repo, field)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS series (
+            owner TEXT NOT NULL, repo TEXT NOT NULL, ts REAL NOT NULL,
+            stars INTEGER NOT NULL, forks INTEGER NOT NULL,
+            PRIMARY KEY (owner, repo, ts)
+        ) WITHOUT ROWID;
+    """
+    # 单条 SQL 的参数个数有上限（旧版 SQLite 为 999），批量查询按此分组
+    LOOKUP_CHUNK = 400
+
+    def __init__(self, path: Optional[Path] = None, ttl_hours: Optional[Dict[str, float]] = None):
+        self.path = Path(path or config.base_dir / "enrich_cache.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        ttl_hours = ttl_hours or config.enrich_cache_ttl_hours
+        default = ttl_hours.get("default", 24)
+        self.ttl = {field: ttl_hours.get(field, default) * 3600 for field in RICH_FIELDS}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    # —— 快照 ——
+    def lookup_many(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, tuple]]:
+        """批量取出缓存：{(owner, repo): {field: (value, fetched_at)}}，没有缓存的仓库不出现"""
+        keys = list(dict.fromkeys(keys))
+        result: Dict[Tuple[str, str], Dict[str, tuple]] = {}
+        with self._lock:
+            for start in range(0, len(keys), self.LOOKUP_CHUNK):
+                chunk = keys[start:start + self.LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT owner, repo, field, value, fetched_at FROM fields WHERE (owner, repo) IN "
+                    f"(VALUES {','.join(['(?, ?)'] * len(chunk))})",
+                    [v for key in chunk for v in key],
+                ).fetchall()
+                for owner, repo, field, value, fetched_at in rows:
+                    if field in self.ttl:
+                        result.setdefault((owner, repo), {})[field] = (json.loads(value), fetched_at)
+        return result
+
+    def stale_fields(self, entry: Dict[str, tuple], now: Optional[float] = None) -> List[str]:
+        """entry 中缺失或已过新鲜期的字段"""
+        now = now or time.time()
+        return [field for field, ttl in self.ttl.items()
+                if field not in entry or now - entry[field][1] >= ttl]
+
+    def store_many(self, rows: Iterable[Tuple[str, str, Dict]], now: Optional[float] = None):
+        """写入刷新结果 [(owner, repo, {field: value})]；带 star 或 fork 数的同时追加时间序列点"""
+        now = now or time.time()
+        rows = [row for row in rows if row[2]]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?, ?)",
+                [(owner, repo, field, json.dumps(value, ensure_ascii=False), now)
+                 for owner, repo, values in rows for field, value in values.items()],
+            )
+            points = []
+            for owner, repo, values in rows:
+                if "stargazers_count" not in values and "forks_count" not in values:
+                    continue
+                # 只刷新了其中一个时，另一个取缓存中的值
+                known = dict(self._conn.execute(
+                    "SELECT field, value FROM fields WHERE owner = ? AND repo = ? "
+                    "AND field IN ('stargazers_count', 'forks_count')", (owner, repo)).fetchall())
+                points.append((owner, repo, now, int(json.loads(known.get("stargazers_count", "0"))),
+                               int(json.loads(known.get("forks_count", "0")))))
+            self._conn.executemany("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?)", points)
+
+    # —— 时间序列 ——
+    def series(self, owner: str, repo: str, start: Optional[float] = None,
+               end: Optional[float] = None) -> List[Dict]:
+        """按时间顺序返回 [{ts, time, stars, forks}]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, stars, forks FROM series WHERE owner = ? AND repo = ? AND ts >= ? AND ts <= ? "
+                "ORDER BY ts",
+                (owner, repo, start or 0, end or float("inf")),
+            ).fetchall()
+        return [{"ts": ts, "time": datetime.fromtimestamp(ts).isoformat(timespec="seconds"),
+                 "stars": stars, "forks": forks} for ts, stars, forks in rows]
+
+    def growth(self, owner: str, repo: str, days: float = 7, now: Optional[float] = None) -> Optional[Dict]:
+        """最近 days 天的总 star / fork 增量（首尾两个点之差），不足两个点时返回 None"""
+        now = now or time.time()
+        points = self.series(owner, repo, now - days * 86400, now)
+        if len(points) < 2:
+            return None
+        first, last = points[0], points[-1]
+        hours = (last["ts"] - first["ts"]) / 3600
+        return {"stars": last["stars"] - first["stars"], "forks": last["forks"] - first["forks"],
+                "hours": round(hours, 1),
+                "stars_per_day": round((last["stars"] - first["stars"]) / hours * 24, 1) if hours else 0.0}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            repos = self._conn.execute("SELECT COUNT(DISTINCT owner || '/' || repo) FROM fields").fetchone()[0]
+            points = self._conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+        return {"repos": repos, "points": points, "bytes": self.path.stat().st_size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache: Optional[EnrichCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_enrich_cache() -> EnrichCache:
+    """进程内共享的补全缓存，首次使用时创建"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EnrichCache()
+        return _shared_cache
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="补全快照缓存")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="缓存的仓库数与时间序列点数")
+    p = sub.add_parser("series", help="打印一个仓库的 star / fork 时间序列")
+    p.add_argument("repo", help="owner/repo")
+    p.add_argument("--days", type=float, default=30)
+    args = arg_parser.parse_args()
+
+    cache = EnrichCache()
+    if args.command == "stats":
+        print(cache.stats())
+    else:
+        owner, name = args.repo.split("/", 1)
+        for point in cache.series(owner, name, time.time() - args.days * 86400):
+            print(f"{point['time']}  ⭐ {point['stars']}  🍴 {point['forks']}")
+        print(cache.growth(owner, name, args.days))
+    cache.close()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : github_scheduler.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 感知限流的 GitHub API 调度器：多 token 轮换、令牌桶控速、额度耗尽时等待重置
+"""
+
+import os
+import time
+import threading
+import requests
+from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from config_set import config
+from log_utils import init_logger
+from small_utils import TokenBucket
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class TokenState:
+    """单个 token 的额度状态，按资源（core / graphql / search）分别记录"""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.budget: Dict[str, Dict] = {}  # resource -> {remaining, limit, reset}
+        self.parked_until = 0.0  # 触发二级限流后暂停到此时间
+        self.requests = 0
+        self.limited = 0  # 403/429 次数
+        self.streak = 0  # 连续 403/429 次数，决定最短退避时长
+
+    @property
+    def label(self) -> str:
+        return f"...{self.token[-4:]}" if self.token else "anonymous"
+
+    def remaining(self, resource: str) -> float:
+        b = self.budget.get(resource)
+        if not b:
+            return float("inf")  # 尚未见过响应头，视为额度充足
+        if b["remaining"] <= 0 and time.time() >= b["reset"]:
+            return float("inf")  # 已过重置时间
+        return b["remaining"]
+
+    def available_at(self, resource: str) -> float:
+        """该 token 最早可用的时间戳"""
+        at = self.parked_until
+        b = self.budget.get(resource)
+        if b and b["remaining"] <= 0:
+            at = max(at, b["reset"])
+        return at
+
+
+class GitHubScheduler:
+    """
+    所有 GitHub API 请求的统一出口，接口与 requests.Session 的 get/post 一致：
+    - 多 token 轮换，优先选择剩余额度最多的 token
+    - 令牌桶控制整体请求节奏，避免触发滥用检测
+    - 根据 X-RateLimit-Remaining/Reset 记录额度，耗尽时等待重置而不是直接失败
+    - 403/429 带 Retry-After（二级限流）时暂停该 token 并重试；每次限流至少退避 MIN_BACKOFF 秒（连续时翻倍），
+      重置时间已过或缺失的限流响应也不会原地空转，超过 max_wait 仍未成功则放弃
+    """
+    MIN_BACKOFF = 1.0
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, tokens: Optional[List[str]] = None, rate_per_sec: Optional[float] = None,
+                 burst: Optional[int] = None, max_wait: Optional[float] = None,
+                 session: Optional[requests.Session] = None):
+        tokens = config.github_tokens if tokens is None else tokens
+        self.tokens = [TokenState(t) for t in tokens] or [TokenState("")]
+        self.has_tokens = bool(tokens)
+        self.bucket = TokenBucket(rate_per_sec or config.github_rate_per_sec, burst or config.github_burst)
+        self.max_wait = config.github_max_wait if max_wait is None else max_wait
+        self.waited = 0.0
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _resource(url: str) -> str:
+        return "graphql" if url.rstrip('/').endswith("/graphql") else "core"
+
+    def _pick(self, resource: str) -> Optional[TokenState]:
+        """选剩余额度最多且未被暂停的 token；都不可用时返回 None"""
+        now = time.time()
+        usable = [t for t in self.tokens if t.available_at(resource) <= now]
+        if not usable:
+            return None
+        return max(usable, key=lambda t: t.remaining(resource))
+
+    def _update(self, state: TokenState, resp: requests.Response, resource: str):
+        h = resp.headers
+        resource = h.get("X-RateLimit-Resource", resource)
+        if "X-RateLimit-Remaining" in h:
+            state.budget[resource] = {
+                "remaining": int(h["X-RateLimit-Remaining"]),
+                "limit": int(h.get("X-RateLimit-Limit", 0)),
+                "reset": float(h.get("X-RateLimit-Reset", time.time() + 60)),
+            }
+        # 只有确属限流的 403/429 才暂停 token；权限不足等普通 403 直接交还调用方，不影响后续请求
+        if self._is_rate_limited(resp):
+            state.limited += 1
+            state.streak += 1
+            retry_after = h.get("Retry-After")
+            if retry_after:
+                state.parked_until = time.time() + float(retry_after)
+            elif h.get("X-RateLimit-Remaining") == "0":
+                pass  # 主限流，available_at 会等到 reset
+            else:
+                # 没有任何提示的二级限流，按文档建议至少等 1 分钟
+                state.parked_until = time.time() + 60
+            # reset 已过去或缺失时 available_at 立即可用，保证最短退避
+            backoff = min(self.MAX_BACKOFF, self.MIN_BACKOFF * 2 ** (state.streak - 1))
+            state.parked_until = max(state.parked_until, time.time() + backoff)
+        else:
+            state.streak = 0
+
+    def _is_rate_limited(self, resp: requests.Response) -> bool:
+        if resp.status_code == 429:
+            return True
+        if resp.status_code != 403:
+            return False
+        h = resp.headers
+        return "Retry-After" in h or h.get("X-RateLimit-Remaining") == "0" or "rate limit" in resp.text.lower()
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        resource = self._resource(url)
+        headers = dict(headers or {})
+        deadline = time.time() + self.max_wait
+        while True:
+            with self._lock:
+                state = self._pick(resource)
+                if state is None:
+                    wake = min(t.available_at(resource) for t in self.tokens)
+            if state is None:
+                if wake > deadline:
+                    raise RuntimeError(f"GitHub {resource} 额度耗尽，需等待到 {time.ctime(wake)}，超过 max_wait")
+                wait = max(0.0, wake - time.time()) + 1
+                logger.warning(f"所有 token 的 {resource} 额度已用尽，等待 {wait:.0f}s 后继续")
+                self.waited += wait
+                time.sleep(wait)
+                continue
+
+            self.bucket.acquire()
+            if state.token:
+                headers["Authorization"] = f"Bearer {state.token}"
+            resp = self.session.request(method, url, headers=headers, **kwargs)
+            with self._lock:
+                state.requests += 1
+                self._update(state, resp, resource)
+            if self._is_rate_limited(resp):
+                if time.time() >= deadline:
+                    raise RuntimeError(f"GitHub {resource} 请求持续被限流（{resp.status_code}），超过 max_wait")
+                logger.warning(f"token {state.label} 触发限流（{resp.status_code}），切换/等待后重试")
+                continue
+            return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def report(self) -> List[Dict]:
+        """每个 token 的使用情况：请求数、限流次数、各资源剩余额度"""
+        with self._lock:
+            return [
+                {
+                    "token": t.label,
+                    "requests": t.requests,
+                    "rate_limited": t.limited,
+                    "budget": {r: f"{b['remaining']}/{b['limit']}" for r, b in t.budget.items()},
+                }
+                for t in self.tokens
+            ]
+
+    def log_report(self):
+        for row in self.report():
+            logger.info(f"token {row['token']}：请求 {row['requests']} 次，限流 {row['rate_limited']} 次，"
+                        f"剩余额度 {row['budget']}")
+        if self.waited:
+            logger.info(f"等待额度重置共 {self.waited:.0f}s")
+
+
+_shared_scheduler: Optional[GitHubScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def get_scheduler() -> GitHubScheduler:
+    """进程内共享的调度器，首次使用时按配置创建"""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = GitHubScheduler()
+        return _shared_scheduler
@@ -8,14 +8,16 @@ Description : 记录每天项目数据
 """
 
 import os
-import json
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 from models import BaseRepo
 from config_set import config
-from dataclasses import asdict
 from log_utils import init_logger
+from metrics import metrics
 from small_utils import get_current_date
+from history_store import JsonHistoryStore, get_history_store
+from rolling_aggregates import RollingAggregates
+from search_index import SearchIndex
 
 # 模块名用于日志标识
 module_name = os.path.splitext(os.path.basename(__file__))[0]
@@ -25,29 +27,38 @@ logger = init_logger('github', module_name)
 class HistoryRecorder:
     """
     负责将一系列 BaseRepo 实例保存到本地 JSON 文件，以便后续比对历史变化。
+    通过 backends（默认取 config.history_backends）可同时写入 SQLite 等其他后端。
     """
 
-    def __init__(self):
+    def __init__(self, backends: Optional[List[str]] = None):
         self.base_dir = config.base_dir
+        self.stores = [get_history_store(name) for name in (backends or config.history_backends)]
+        self.aggregates = RollingAggregates() if config.aggregates_enabled else None
+        self.search = None
+        if config.search_enabled:
+            # 搜索索引依赖 FTS5 和 SQLite >= 3.35，环境不支持时只关闭搜索，不影响保存
+            try:
+                self.search = SearchIndex()
+            except Exception as e:
+                logger.error(f"搜索索引初始化失败，已关闭搜索：{e}")
+        self.refresh_date()
+
+    def refresh_date(self):
+        """按当前日期更新存储路径，常驻进程跨天时调用"""
         self.date_str = get_current_date()
         self.save_path: Path = self._generate_dated_path()
 
         # 确保目录结构存在
         self.save_path.parent.mkdir(parents=True, exist_ok=True)
-        logger.info(f"存储目录已初始化：{self.save_path}")
+        logger.info(f"存储目录已初始化：{self.save_path.parent}")
 
-    def _generate_dated_path(self) -> Path:
+    def _generate_dated_path(self, language: Optional[str] = None, since: Optional[str] = None) -> Path:
         """生成带日期的层级路径"""
-        year, month, _ = self.date_str.split('-')
-        return (
-                self.base_dir
-                / year
-                / month
-                / f"{self.date_str}_data.json"
-        )
+        return JsonHistoryStore(self.base_dir).path_for(self.date_str, language, since)
 
+    @metrics.timed("save")
     def save(self, repos: List[BaseRepo]):
-        """将 BaseRepo 列表保存为 json 文件"""
+        """将 BaseRepo 列表保存到各存储后端，返回 json 文件路径"""
         if not repos:
             logger.warning("无数据可保存")
             return
@@ -55,13 +66,25 @@ class HistoryRecorder:
         today_record = {
             "date": self.date_str,
             "type": repos[0].since,
-            "repos": [asdict(r) for r in repos]
+            "repos": [r.to_dict() for r in repos]
         }
+        self.save_path = self._generate_dated_path(repos[0].language, repos[0].since)
 
-        with open(self.save_path, 'w', encoding='utf-8') as f:
-            json.dump(today_record, f, ensure_ascii=False, indent=2)
+        for store in self.stores:
+            location = store.save_record(today_record)
+            logger.info(f"已保存 {len(repos)} 条记录到 {location}")
 
-        logger.info(f"已保存 {len(repos)} 条记录到 {self.save_path}")
+        # 聚合失败不影响快照本身的保存
+        if self.aggregates:
+            try:
+                self.aggregates.update(self.date_str, today_record["repos"])
+            except Exception as e:
+                logger.error(f"滚动聚合更新失败：{e}")
+        if self.search:
+            try:
+                self.search.add_snapshot(today_record)
+            except Exception as e:
+                logger.error(f"搜索索引更新失败：{e}")
         return self.save_path
 
 
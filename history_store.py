@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : history_store.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 历史数据存储后端（每日 JSON / jsonl.gz 文件与月度归档 / SQLite 索引库）
+"""
+
+import os
+import re
+import gzip
+import json
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from config_set import config
+from log_utils import init_logger
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class HistoryStore(ABC):
+    """
+    存储后端基类。一条快照记录的格式与原 JSON 文件一致：
+        {"date": "YYYY-MM-DD", "type": since, "repos": [repo dict, ...]}
+    可作为上下文管理器使用，退出时调用 close()。
+    """
+    name = "base"
+
+    @abstractmethod
+    def save_record(self, record: Dict):
+        """保存一条快照记录，返回存储位置"""
+
+    @abstractmethod
+    def iter_snapshots(self, start: Optional[str] = None, end: Optional[str] = None,
+                       language: Optional[str] = None, since: Optional[str] = None) -> Iterator[Dict]:
+        """按日期顺序逐条产出 [start, end] 范围内的快照记录，可只取某个榜单"""
+
+    @staticmethod
+    def _matches(record: Dict, language: Optional[str], since: Optional[str]) -> bool:
+        """快照是否属于指定榜单（language 为空字符串表示全部语言榜）"""
+        if since is not None and record.get("type") != since:
+            return False
+        if language is not None:
+            repos = record.get("repos") or [{}]
+            return repos[0].get("language", "") == language
+        return True
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None,
+              owner: Optional[str] = None, repo: Optional[str] = None,
+              language: Optional[str] = None, since: Optional[str] = None) -> List[Dict]:
+        """
+        按条件查询上榜记录，每行为仓库字段加上 date、rank（从 1 开始）。
+        基类实现为逐个快照扫描，子类可用索引覆盖。
+        """
+        rows = []
+        for record in self.iter_snapshots(start, end):
+            for rank, r in enumerate(record.get("repos", []), 1):
+                if owner and r.get("owner") != owner:
+                    continue
+                if repo and r.get("repo") != repo:
+                    continue
+                if language and r.get("language") != language:
+                    continue
+                if since and r.get("since", record.get("type")) != since:
+                    continue
+                rows.append({**r, "date": record["date"], "rank": rank})
+        return rows
+
+    def query_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                      language: Optional[str] = None, since: Optional[str] = None) -> List[tuple]:
+        """
+        只取分析需要的列，不构造完整字典：
+        (date, rank, owner, repo, language, since, stars_today)
+        """
+        return [
+            (r["date"], r["rank"], r["owner"], r["repo"], r.get("language", ""), r.get("since", ""),
+             r.get("stars_today", 0))
+            for r in self.query(start, end, language=language, since=since)
+        ]
+
+    def first_seen(self, owner: str, repo: str) -> Optional[str]:
+        """仓库第一次上榜的日期"""
+        rows = self.query(owner=owner, repo=repo)
+        return min((r["date"] for r in rows), default=None)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _record_list(record: Dict) -> tuple:
+    """快照所属榜单 (language, since)"""
+    repos = record.get("repos") or [{}]
+    return repos[0].get("language", ""), record.get("type") or repos[0].get("since", "")
+
+
+def read_gzip_lines(path: Path) -> List[Dict]:
+    """
+    读取 .jsonl.gz：每次追加都是一个独立的 gzip member，gzip 模块会依次解压。
+    进程在写入中途被杀时最后一个 member 不完整，丢弃它并保留之前的记录。
+    """
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except (EOFError, OSError, ValueError) as e:
+        logger.error(f"{path} 末尾数据不完整，已读取 {len(records)} 条：{e}")
+    return records
+
+
+def read_records(path: Path) -> List[Dict]:
+    """读取任意格式的历史文件（*_data.json / *.jsonl.gz / 月度归档），返回其中的快照记录"""
+    path = Path(path)
+    if path.name.endswith(".gz"):
+        return read_gzip_lines(path)
+    history = json.loads(path.read_text(encoding="utf-8"))
+    return history if isinstance(history, list) else [history]
+
+
+class JsonHistoryStore(HistoryStore):
+    """
+    文件目录树后端，写入格式由 file_format（默认取 config.history_file_format）决定：
+    - json：{base_dir}/YYYY/MM/YYYY-MM-DD_{language}_{since}_data.json，每个榜单每天一个缩进 JSON 文件，
+      重复运行覆盖；也能读取早期不带榜单名的 YYYY-MM-DD_data.json
+    - jsonl.gz：{base_dir}/YYYY/MM/YYYY-MM-DD.jsonl.gz，当天所有榜单按行追加（每次追加一个 gzip member），
+      同一榜单重复运行时以最后一行为准
+    compact_month() 把一个月的日文件合并为 YYYY-MM.vN.archive.gz（每个榜单一个 gzip member）
+    和偏移索引 YYYY-MM.archive.idx，只取某个榜单时按索引 seek，不必解压整个月。
+    索引里记录它所描述的归档文件名，重新压缩时写入新版本的归档，再替换索引完成切换。
+    读取时三种格式混合存在也没关系。
+    """
+    name = "json"
+
+    ARCHIVE_SUFFIX = ".archive.gz"
+    INDEX_SUFFIX = ".archive.idx"
+    _lock = threading.Lock()  # 同一进程内多个线程追加同一个 jsonl.gz 时不交错
+
+    def __init__(self, base_dir: Optional[Path] = None, file_format: Optional[str] = None):
+        self.base_dir = Path(base_dir or config.base_dir)
+        self.file_format = file_format or config.history_file_format
+        if self.file_format not in ("json", "jsonl.gz"):
+            raise ValueError(f"未知的历史文件格式：{self.file_format}，可选 json / jsonl.gz")
+
+    def path_for(self, date_str: str, language: Optional[str] = None, since: Optional[str] = None) -> Path:
+        """生成带日期的层级路径；json 格式给出榜单时文件名带上 language/since，避免多个榜单互相覆盖"""
+        year, month, _ = date_str.split('-')
+        if self.file_format == "jsonl.gz":
+            return self.base_dir / year / month / f"{date_str}.jsonl.gz"
+        name = f"{date_str}_{language or 'all'}_{since}_data.json" if since else f"{date_str}_data.json"
+        return self.base_dir / year / month / name
+
+    def save_record(self, record: Dict) -> Path:
+        language, _ = _record_list(record)
+        path = self.path_for(record["date"], language, record.get("type"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.file_format == "jsonl.gz":
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            with self._lock, open(path, "ab") as f:
+                f.write(gzip.compress(line.encode("utf-8")))
+            return path
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def _list_of(path: Path) -> Optional[tuple]:
+        """从文件名取出 (language, since)；早期不带榜单名的文件返回 None"""
+        middle = path.name[11:-len("_data.json")]
+        if not middle or "_" not in middle:
+            return None
+        language, since = middle.rsplit("_", 1)
+        return ("" if language == "all" else language), since
+
+    @classmethod
+    def read_index(cls, index: Path) -> tuple:
+        """
+        归档索引 -> (归档路径, 版本号, entries)，
+        entries 为 [[date, language, since, member 偏移, member 长度, member 内行号], ...]，按日期排序。
+        早期的索引不记录归档名，对应同名的 YYYY-MM.archive.gz。
+        """
+        data = json.loads(index.read_text(encoding="utf-8"))
+        name = data.get("archive") or index.name[:-len(cls.INDEX_SUFFIX)] + cls.ARCHIVE_SUFFIX
+        return index.with_name(name), data.get("archive_version", 0), data["entries"]
+
+    def _sources(self, start: Optional[str], end: Optional[str]) -> List[tuple]:
+        """
+        列出 [start, end] 内的全部数据来源 (date, kind, path, entry)，按日期排序。
+        月度归档只读索引，日文件只看文件名，不解压内容。
+        """
+        sources = []
+        for index in self.base_dir.glob(f"*/*/*{self.INDEX_SUFFIX}"):
+            month = index.name[:7]
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            try:
+                archive, _, entries = self.read_index(index)
+            except Exception as e:
+                logger.error(f"读取归档索引失败 {index}：{e}")
+                continue
+            sources.extend((entry[0], 0, archive, entry) for entry in entries)
+        for path in self.base_dir.glob("*/*/*_data.json"):
+            sources.append((path.name[:10], 1, path, None))
+        for path in self.base_dir.glob("*/*/*.jsonl.gz"):
+            sources.append((path.name[:10], 2, path, None))
+        sources = [s for s in sources if not ((start and s[0] < start) or (end and s[0] > end))]
+        sources.sort(key=lambda s: (s[0], s[1], str(s[2]), s[3] or ()))
+        return sources
+
+    def iter_snapshots(self, start: Optional[str] = None, end: Optional[str] = None,
+                       language: Optional[str] = None, since: Optional[str] = None) -> Iterator[Dict]:
+        # 保留日文件的压缩（--keep-sources）或压缩后同一天再次保存时，同一天同一榜单会有多份，
+        # 按来源顺序后出现的覆盖先出现的，与 compact_month 合并的规则一致
+        day, latest = None, {}
+        for record in self._iter_sources(start, end, language, since, set()):
+            if record.get("date") != day:
+                yield from latest.values()
+                day, latest = record.get("date"), {}
+            latest[_record_list(record)] = record
+        yield from latest.values()
+
+    def _iter_sources(self, start: Optional[str], end: Optional[str], language: Optional[str],
+                      since: Optional[str], broken: set) -> Iterator[Dict]:
+        """按来源顺序产出快照；读不出来的归档加入 broken 并跳过"""
+        archive_path, members = None, {}
+        for date_str, kind, path, entry in self._sources(start, end):
+            if kind == 0:
+                # 归档：索引里有榜单信息，不属于指定榜单的快照不用解压
+                _, entry_language, entry_since, offset, length, line = entry
+                if (language is not None and entry_language != language) or \
+                        (since is not None and entry_since != since) or path in broken:
+                    continue
+                if path != archive_path:
+                    # 一次只缓存一个月的已解压 member
+                    archive_path, members = path, {}
+                try:
+                    lines = members.get(offset)
+                    if lines is None:
+                        with open(path, "rb") as f:
+                            f.seek(offset)
+                            lines = members[offset] = gzip.decompress(f.read(length)).splitlines()
+                    record = json.loads(lines[line])
+                except Exception as e:
+                    # 损坏的归档只跳过它自己，其他月份照常读取
+                    logger.error(f"读取归档失败 {path}，跳过该归档：{e}")
+                    broken.add(path)
+                    continue
+                yield record
+            elif kind == 1:
+                # 新文件名带榜单信息，不属于指定榜单的文件不用读
+                listed = self._list_of(path)
+                if listed and ((language is not None and listed[0] != language)
+                               or (since is not None and listed[1] != since)):
+                    continue
+                try:
+                    records = read_records(path)
+                except Exception as e:
+                    logger.error(f"读取历史文件失败 {path}：{e}")
+                    continue
+                for record in records:
+                    if listed or self._matches(record, language, since):
+                        yield record
+            else:
+                latest = {}
+                for record in read_gzip_lines(path):
+                    latest[_record_list(record)] = record
+                for record in latest.values():
+                    if self._matches(record, language, since):
+                        yield record
+
+    # —— 月度压缩 ——
+    def compact_month(self, month: str, remove_sources: bool = True) -> Optional[Path]:
+        """
+        把 month（YYYY-MM）的日文件（两种格式）与已有归档合并为一个归档，同一天同一榜单只保留最后一次。
+        新归档写入带版本号的新文件，索引记录归档名并整体替换：索引替换是唯一的切换点，
+        任何时刻中断，索引都指向一个完整的归档。切换完成后才删除被合并的旧归档和日文件，
+        中途中断最多留下重复数据或无人引用的归档；没有合并进新归档的归档一律不删。
+        当前索引或归档读不出来时放弃压缩并返回 None，不能在缺数据的情况下覆盖它们。
+        """
+        year, mon = month.split("-")
+        month_dir = self.base_dir / year / mon
+        index = month_dir / f"{month}{self.INDEX_SUFFIX}"
+        old_archive, version = None, 0
+        if index.exists():
+            try:
+                old_archive, version, _ = self.read_index(index)
+            except Exception as e:
+                logger.error(f"读取归档索引失败 {index}，放弃压缩 {month}：{e}")
+                return None
+            if not old_archive.exists():
+                logger.error(f"归档索引指向的 {old_archive.name} 不存在，放弃压缩 {month}")
+                return None
+        sources = [p for p in month_dir.glob("*_data.json")] + [p for p in month_dir.glob("*.jsonl.gz")]
+        if not sources:
+            return old_archive
+
+        # iter_snapshots 按 归档 → json → jsonl.gz 的顺序产出同一天的数据，后写入的覆盖先写入的
+        latest: Dict[tuple, Dict] = {}
+        broken: set = set()
+        for record in self._iter_sources(f"{month}-01", f"{month}-31", None, None, broken):
+            latest[(record["date"], *_record_list(record))] = record
+        if old_archive in broken:
+            logger.error(f"归档 {old_archive.name} 损坏，放弃压缩 {month}")
+            return None
+
+        # 每个榜单整月的快照压缩为一个 member：同一榜单相邻几天大多是相同仓库，压缩率比逐条压缩高得多
+        groups: Dict[tuple, List[tuple]] = {}
+        for key in sorted(latest):
+            groups.setdefault(key[1:], []).append(key)
+        entries, offset = [], 0
+        # 版本号取索引与已有归档文件名中最大的，之前中断留下的归档不会被同名覆盖
+        pattern = re.compile(rf"{re.escape(month)}\.v(\d+){re.escape(self.ARCHIVE_SUFFIX)}$")
+        found = [int(m.group(1)) for m in map(pattern.match, (p.name for p in month_dir.iterdir())) if m]
+        version = max([version, *found]) + 1
+        archive = month_dir / f"{month}.v{version}{self.ARCHIVE_SUFFIX}"
+        tmp = archive.with_name(archive.name + ".tmp")
+        with open(tmp, "wb") as f:
+            for keys in groups.values():
+                body = "".join(json.dumps(latest[key], ensure_ascii=False, separators=(",", ":")) + "\n"
+                               for key in keys)
+                # mtime 固定为 0：相同内容压缩结果一致，重复压缩不会改变归档
+                member = gzip.compress(body.encode("utf-8"), compresslevel=9, mtime=0)
+                f.write(member)
+                entries.extend([*key, offset, len(member), line] for line, key in enumerate(keys))
+                offset += len(member)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(archive)
+        entries.sort()
+        index_tmp = index.with_name(index.name + ".tmp")
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 2, "archive": archive.name, "archive_version": version, "entries": entries},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        index_tmp.replace(index)
+
+        # 索引已切换到新归档：只删除已合并进来的旧归档
+        if old_archive and old_archive != archive:
+            old_archive.unlink()
+
+        if remove_sources:
+            for path in sources:
+                path.unlink()
+        logger.info(f"{month}：{len(sources)} 个日文件合并为 {archive.name}（{len(entries)} 个快照，{offset / 1024:.1f} KB）")
+        return archive
+
+    def compact(self, before: Optional[str] = None, remove_sources: bool = True) -> List[Path]:
+        """压缩 before（YYYY-MM，默认本月）之前所有已结束月份的日文件"""
+        before = before or datetime.now().strftime("%Y-%m")
+        months = sorted({p.name[:7] for p in self.base_dir.glob("*/*/*_data.json")}
+                        | {p.name[:7] for p in self.base_dir.glob("*/*/*.jsonl.gz")})
+        return [self.compact_month(m, remove_sources) for m in months if m < before]
+
+
+class SqliteHistoryStore(HistoryStore):
+    """
+    SQLite 后端：每次保存追加一条快照（单事务），上榜记录按
+    (date)、(owner, repo)、(language, since) 建索引。
+    同一天同一榜单多次保存时，旧快照保留但 latest 置 0，查询只取最新一次。
+    """
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            date       TEXT NOT NULL,
+            language   TEXT NOT NULL,
+            since      TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            repo_count INTEGER NOT NULL,
+            latest     INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+            date        TEXT NOT NULL,
+            rank        INTEGER NOT NULL,
+            owner       TEXT NOT NULL,
+            repo        TEXT NOT NULL,
+            language    TEXT NOT NULL,
+            since       TEXT NOT NULL,
+            stars_today INTEGER NOT NULL,
+            data        TEXT NOT NULL,
+            latest      INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_snapshots_key ON snapshots(date, language, since);
+        CREATE INDEX IF NOT EXISTS idx_entries_date ON entries(date);
+        CREATE INDEX IF NOT EXISTS idx_entries_repo ON entries(owner, repo);
+        CREATE INDEX IF NOT EXISTS idx_entries_lang ON entries(language, since);
+        CREATE INDEX IF NOT EXISTS idx_entries_snapshot ON entries(snapshot_id);
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or config.base_dir / "history.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def save_record(self, record: Dict) -> Path:
+        repos = record.get("repos", [])
+        since = record.get("type") or (repos[0].get("since", "") if repos else "")
+        language = repos[0].get("language", "") if repos else ""
+        key = (record["date"], language, since)
+        with self._lock, self._conn:
+            # 同一榜单当天的旧快照不删除，只标记为非最新
+            old_ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM snapshots WHERE date = ? AND language = ? AND since = ? AND latest = 1", key)]
+            if old_ids:
+                marks = ",".join("?" * len(old_ids))
+                self._conn.execute(f"UPDATE snapshots SET latest = 0 WHERE id IN ({marks})", old_ids)
+                self._conn.execute(f"UPDATE entries SET latest = 0 WHERE snapshot_id IN ({marks})", old_ids)
+
+            cur = self._conn.execute(
+                "INSERT INTO snapshots (date, language, since, created_at, repo_count) VALUES (?, ?, ?, ?, ?)",
+                (*key, datetime.now().isoformat(timespec="seconds"), len(repos)),
+            )
+            snapshot_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                [
+                    (snapshot_id, record["date"], rank, r["owner"], r["repo"],
+                     r.get("language", language), r.get("since", since), r.get("stars_today", 0),
+                     json.dumps(r, ensure_ascii=False))
+                    for rank, r in enumerate(repos, 1)
+                ],
+            )
+        return self.path
+
+    def iter_snapshots(self, start: Optional[str] = None, end: Optional[str] = None,
+                       language: Optional[str] = None, since: Optional[str] = None) -> Iterator[Dict]:
+        where, args = ["latest = 1"], []
+        for column, op, value in (("date", ">=", start), ("date", "<=", end),
+                                  ("language", "=", language), ("since", "=", since)):
+            if value is not None and (value or column == "language"):
+                where.append(f"{column} {op} ?")
+                args.append(value)
+        with self._lock:
+            snapshots = self._conn.execute(
+                f"SELECT id, date, since FROM snapshots WHERE {' AND '.join(where)} ORDER BY date, id", args
+            ).fetchall()
+        for snap in snapshots:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT data FROM entries WHERE snapshot_id = ? ORDER BY rank", (snap["id"],)
+                ).fetchall()
+            yield {"date": snap["date"], "type": snap["since"], "repos": [json.loads(r["data"]) for r in rows]}
+
+    @staticmethod
+    def _where(start=None, end=None, owner=None, repo=None, language=None, since=None):
+        """拼接 entries 表的过滤条件，只取最新快照"""
+        where, args = ["latest = 1"], []
+        for column, op, value in (("date", ">=", start), ("date", "<=", end),
+                                  ("owner", "=", owner), ("repo", "=", repo),
+                                  ("language", "=", language), ("since", "=", since)):
+            if value:
+                where.append(f"{column} {op} ?")
+                args.append(value)
+        return " AND ".join(where), args
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None,
+              owner: Optional[str] = None, repo: Optional[str] = None,
+              language: Optional[str] = None, since: Optional[str] = None) -> List[Dict]:
+        where, args = self._where(start, end, owner, repo, language, since)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT date, rank, data FROM entries WHERE {where} ORDER BY date, rank", args
+            ).fetchall()
+        return [{**json.loads(r["data"]), "date": r["date"], "rank": r["rank"]} for r in rows]
+
+    def query_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                      language: Optional[str] = None, since: Optional[str] = None) -> List[tuple]:
+        where, args = self._where(start=start, end=end, language=language, since=since)
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.row_factory = None  # 直接返回元组，省去 Row 包装
+            return cur.execute(
+                "SELECT date, rank, owner, repo, language, since, stars_today FROM entries "
+                f"WHERE {where} ORDER BY date, rank", args
+            ).fetchall()
+
+    def first_seen(self, owner: str, repo: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(date) FROM entries WHERE owner = ? AND repo = ?", (owner, repo)
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        """关闭数据库连接；可重复调用"""
+        with self._lock:
+            self._conn.close()
+
+
+STORE_CLASSES = {cls.name: cls for cls in (JsonHistoryStore, SqliteHistoryStore)}
+
+
+def get_history_store(name: str) -> HistoryStore:
+    """按名字创建存储后端：json / sqlite"""
+    try:
+        return STORE_CLASSES[name]()
+    except KeyError:
+        raise ValueError(f"未知的存储后端：{name}，可选 {sorted(STORE_CLASSES)}")
+
+
+def import_json_tree(src_dir: Path, store: HistoryStore) -> int:
+    """把已有的 YYYY/MM/*_data.json 目录树一次性导入到另一个后端（由调用方关闭），返回导入的快照数"""
+    count = 0
+    with JsonHistoryStore(src_dir) as source:
+        for record in source.iter_snapshots():
+            store.save_record(record)
+            count += 1
+    logger.info(f"已从 {src_dir} 导入 {count} 个快照到 {store.name}")
+    return count
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="历史数据存储工具")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="将 JSON 目录树导入 SQLite")
+    p.add_argument("--src", default=str(config.base_dir), help="JSON 历史目录")
+    p = sub.add_parser("first-seen", help="查询仓库首次上榜日期")
+    p.add_argument("full_name", help="owner/repo")
+    p = sub.add_parser("compact", help="把已结束月份的日文件压缩为月度归档")
+    p.add_argument("--month", help="只压缩指定月份 YYYY-MM（默认本月之前的所有月份）")
+    p.add_argument("--keep-sources", action="store_true", help="保留原日文件")
+    args = arg_parser.parse_args()
+
+    if args.command == "compact":
+        json_store = JsonHistoryStore()
+        if args.month:
+            json_store.compact_month(args.month, not args.keep_sources)
+        else:
+            json_store.compact(remove_sources=not args.keep_sources)
+        raise SystemExit(0)
+
+    with SqliteHistoryStore() as sqlite_store:
+        if args.command == "import":
+            import_json_tree(Path(args.src), sqlite_store)
+        else:
+            print(sqlite_store.first_seen(*args.full_name.split('/', 1)))
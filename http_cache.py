@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : http_cache.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : GitHub API 响应的磁盘缓存，基于 ETag / Last-Modified 条件请求
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import requests
+from pathlib import Path
+from typing import Dict, Optional
+from config_set import config
+from log_utils import init_logger
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class HttpCache:
+    """
+    以 URL 为键缓存响应体及 ETag/Last-Modified：
+    - 仍在 max-age 内：直接返回缓存（hit，不发请求）
+    - 已过期：带 If-None-Match / If-Modified-Since 重新验证，304 时返回缓存体（not_modified，不计 GitHub 额度）
+    - 无缓存或内容有变：正常请求并写入缓存（miss）
+    总容量超过 max_bytes 时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or config.base_dir / "http_cache.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(config.http_cache_max_mb * 1024 * 1024)
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url           TEXT PRIMARY KEY,
+                etag          TEXT,
+                last_modified TEXT,
+                body          BLOB NOT NULL,
+                size          INTEGER NOT NULL,
+                stored_at     REAL NOT NULL,
+                max_age       INTEGER NOT NULL DEFAULT 0,
+                last_access   REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _lookup(self, url: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, body, stored_at, max_age FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _touch(self, url: str):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def _store(self, url: str, resp: requests.Response):
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        m = MAX_AGE_PATTERN.search(resp.headers.get("Cache-Control", ""))
+        max_age = int(m.group(1)) if m else 0
+        body = resp.content
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, len(body), now, max_age, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出容量时按 last_access 从旧到新删除，调用方持有锁"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for url, size in self._conn.execute(
+                "SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+            removed += 1
+        logger.info(f"缓存超出容量，已淘汰 {removed} 条")
+
+    @staticmethod
+    def _from_cache(url: str, body: bytes, base: Optional[requests.Response] = None) -> requests.Response:
+        resp = base if base is not None else requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = body
+        resp.encoding = "utf-8"
+        resp.headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        return resp
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            session: Optional[requests.Session] = None, timeout: float = 10) -> requests.Response:
+        """发起（条件）GET 请求，返回的响应在 304 时已替换为缓存内容"""
+        http = session or requests
+        headers = dict(headers or {})
+        cached = self._lookup(url)
+
+        if cached:
+            etag, last_modified, body, stored_at, max_age = cached
+            if time.time() < stored_at + max_age:
+                self._count("hits")
+                self._touch(url)
+                return self._from_cache(url, body)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        resp = http.get(url, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and cached:
+            self._count("not_modified")
+            # 304 带回新的过期时间，刷新 stored_at 以便 max-age 内直接命中
+            m = MAX_AGE_PATTERN.search(resp.headers.get("Cache-Control", ""))
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE responses SET stored_at = ?, max_age = ?, last_access = ? WHERE url = ?",
+                    (time.time(), int(m.group(1)) if m else cached[4], time.time(), url),
+                )
+                self._conn.commit()
+            return self._from_cache(url, cached[2], resp)
+
+        self._count("misses")
+        if resp.status_code == 200:
+            self._store(url, resp)
+        return resp
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"缓存命中 {s['hits']}，304 重新验证 {s['not_modified']}，未命中 {s['misses']}"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache: Optional[HttpCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache:
+    """进程内共享的缓存实例，首次使用时创建"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = HttpCache()
+        return _shared_cache
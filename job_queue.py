@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : job_queue.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 本地持久化任务队列（SQLite）：把 language × since × spoken_language 矩阵拆成任务，
+              多个 worker 进程 / 节点按租约领取，完成后按榜单幂等合并进历史存储
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+from pathlib import Path
+from itertools import product
+from typing import Callable, Dict, Iterable, List, Optional
+from config_set import config
+from log_utils import init_logger
+from metrics import metrics
+from small_utils import get_current_date
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class JobQueue:
+    """
+    任务状态：pending → leased → done / failed
+    - lease()：领取一个待处理任务，或租约已过期的任务（持有它的 worker 已崩溃 / 失联）
+    - complete() / fail()：提交结果；失败次数达到 max_attempts 后不再重试
+    - 同一 (date, language, since) 的全部任务结束后，由最后完成的 worker 合并结果并写入历史存储，
+      merged_jobs 表保证每个榜单每天只合并一次；合并中途崩溃的，租约过期后由其他 worker 重做
+    所有状态变更都在 BEGIN IMMEDIATE 事务内完成，多个进程可共用同一个数据库文件。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            date        TEXT NOT NULL,
+            language    TEXT NOT NULL,
+            since       TEXT NOT NULL,
+            spoken      TEXT NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            worker      TEXT,
+            lease_until REAL,
+            result      TEXT,
+            error       TEXT,
+            updated_at  REAL NOT NULL,
+            UNIQUE (date, language, since, spoken)
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, lease_until);
+        CREATE TABLE IF NOT EXISTS merged_jobs (
+            date        TEXT NOT NULL,
+            language    TEXT NOT NULL,
+            since       TEXT NOT NULL,
+            status      TEXT NOT NULL,
+            worker      TEXT NOT NULL,
+            lease_until REAL NOT NULL,
+            repo_count  INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, language, since)
+        );
+    """
+
+    def __init__(self, path: Optional[Path] = None, lease_seconds: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.path = Path(path or config.queue_path)
+        self.lease_seconds = lease_seconds or config.queue_lease_seconds
+        self.max_attempts = max_attempts or config.queue_max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 手动管理事务；timeout 为等待其他进程释放写锁的时间
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _write(self):
+        """写事务：BEGIN IMMEDIATE 立即取得写锁，领取任务时不会两个进程拿到同一行"""
+        return _Transaction(self._conn)
+
+    # —— 入队 ——
+    def enqueue(self, languages: Iterable[str], sinces: Iterable[str], spoken_codes: Iterable[str],
+                date_str: Optional[str] = None) -> int:
+        """按矩阵入队，同一天重复入队的任务忽略，返回新增任务数"""
+        date_str = date_str or get_current_date()
+        rows = [(date_str, language, since, spoken, time.time())
+                for language, since, spoken in product(languages, sinces, spoken_codes)]
+        with self._write() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (date, language, since, spoken, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            added = conn.total_changes - before
+        logger.info(f"[{date_str}] 入队 {added} 个任务（矩阵共 {len(rows)} 个）")
+        return added
+
+    # —— worker 接口 ——
+    def lease(self, worker: str) -> Optional[sqlite3.Row]:
+        """领取一个任务；过期租约视为持有者已崩溃，重新分配，已达重试上限的直接记为失败"""
+        now = time.time()
+        with self._write() as conn:
+            # 每次领取都会让 worker 崩溃的任务不能无限重发，否则所属榜单永远无法合并
+            expired = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                ("租约多次过期，放弃该任务", now, now, self.max_attempts),
+            ).rowcount
+            if expired:
+                logger.warning(f"{expired} 个任务的租约过期次数达到上限，记为失败")
+                metrics.inc("queue_jobs_total", expired, result="error")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "leased":
+                logger.warning(f"任务 {row['id']} 的租约已过期（{row['worker']}），重新分配给 {worker}")
+                metrics.inc("queue_released_total")
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?", (worker, now + self.lease_seconds, now, row["id"])
+            )
+        return row
+
+    def complete(self, job_id: int, repos: List[Dict]) -> bool:
+        """
+        提交结果。租约过期后原 worker 才交回结果的，只要任务还没完成仍然接受（结果相同，重复无害）。
+        返回该任务所属榜单是否已可以合并。
+        """
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status != 'done'",
+                (json.dumps(repos, ensure_ascii=False), time.time(), job_id),
+            )
+            return self._group_finished(conn, job_id)
+
+    def fail(self, job_id: int, error: str) -> bool:
+        """记录失败；未达到重试上限的放回 pending。返回所属榜单是否已可以合并"""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND status != 'done'",
+                (self.max_attempts, error[:500], time.time(), job_id),
+            )
+            return self._group_finished(conn, job_id)
+
+    @staticmethod
+    def _group_finished(conn, job_id: int) -> bool:
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE (date, language, since) = "
+            "(SELECT date, language, since FROM jobs WHERE id = ?) AND status IN ('pending', 'leased')",
+            (job_id,),
+        ).fetchone()[0] == 0
+
+    # —— 合并 ——
+    def claim_merge(self, worker: str) -> Optional[sqlite3.Row]:
+        """
+        领取一个待合并的榜单：其全部任务已结束（至少一个成功），且尚未合并、
+        或上次合并的 worker 租约已过期。
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT j.date, j.language, j.since FROM jobs j "
+                "LEFT JOIN merged_jobs m USING (date, language, since) "
+                "WHERE m.status IS NULL OR (m.status = 'merging' AND m.lease_until < ?) "
+                "GROUP BY j.date, j.language, j.since "
+                "HAVING SUM(j.status IN ('pending', 'leased')) = 0 AND SUM(j.status = 'done') > 0 "
+                "LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO merged_jobs (date, language, since, status, worker, lease_until) "
+                "VALUES (?, ?, ?, 'merging', ?, ?)",
+                (row["date"], row["language"], row["since"], worker, now + self.lease_seconds),
+            )
+        return row
+
+    def results(self, date_str: str, language: str, since: str) -> List[Dict]:
+        """按 spoken_language 入队顺序合并各任务结果，按 owner/repo 去重（保留先出现的名次）"""
+        rows = self._conn.execute(
+            "SELECT result FROM jobs WHERE date = ? AND language = ? AND since = ? AND status = 'done' "
+            "ORDER BY id", (date_str, language, since)
+        ).fetchall()
+        merged, seen = [], set()
+        for row in rows:
+            for r in json.loads(row["result"]):
+                key = (r["owner"], r["repo"])
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(r)
+        return merged
+
+    def finish_merge(self, date_str: str, language: str, since: str, repo_count: int):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE merged_jobs SET status = 'merged', repo_count = ? WHERE date = ? AND language = ? AND since = ?",
+                (repo_count, date_str, language, since),
+            )
+
+    def abort_merge(self, date_str: str, language: str, since: str):
+        """合并失败：删除标记，之后的 worker 会重新领取"""
+        with self._write() as conn:
+            conn.execute("DELETE FROM merged_jobs WHERE date = ? AND language = ? AND since = ? AND status = 'merging'",
+                         (date_str, language, since))
+
+    # —— 状态 ——
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({status: n for status, n in rows})
+        counts["merged"] = self._conn.execute(
+            "SELECT COUNT(*) FROM merged_jobs WHERE status = 'merged'").fetchone()[0]
+        return counts
+
+    def has_work(self) -> bool:
+        """还有未结束的任务，或已结束但未合并的榜单"""
+        counts = self.counts()
+        if counts["pending"] or counts["leased"]:
+            return True
+        return self._conn.execute(
+            "SELECT 1 FROM jobs j LEFT JOIN merged_jobs m USING (date, language, since) "
+            "WHERE j.status = 'done' AND (m.status IS NULL OR m.status = 'merging') LIMIT 1"
+        ).fetchone() is not None
+
+    def close(self):
+        self._conn.close()
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class Worker:
+    """
+    从队列领取任务执行，直到队列清空（drain）或收到停止。
+    fetch(language, since, spoken) 返回 repo 字典列表，默认用 TrendingScraper 抓取；
+    TrendingScraper 网络失败时返回空列表而不抛异常，因此空结果按失败处理，走 fail() 重试；
+    合并时用 HistoryRecorder 写入，与单次运行产出的历史文件完全一致。
+    """
+
+    def __init__(self, queue: Optional[JobQueue] = None, worker_id: Optional[str] = None,
+                 fetch: Optional[Callable[[str, str, str], List[Dict]]] = None, recorder=None):
+        self.queue = queue or JobQueue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._fetch = fetch
+        self._recorder = recorder
+        self._scraper = None
+        self.stopped = False
+        self.processed = 0
+
+    def fetch(self, language: str, since: str, spoken: str) -> List[Dict]:
+        if self._fetch:
+            return self._fetch(language, since, spoken)
+        if self._scraper is None:
+            from trending_scraper import TrendingScraper
+            self._scraper = TrendingScraper()
+        return [r.to_dict() for r in self._scraper.get_repos(language, since, spoken)]
+
+    @property
+    def recorder(self):
+        if self._recorder is None:
+            from history_recorder import HistoryRecorder
+            self._recorder = HistoryRecorder()
+        return self._recorder
+
+    def run_one(self) -> bool:
+        """处理一个任务（或一次合并），没有可做的事时返回 False"""
+        if self.merge_ready():
+            return True
+        job = self.queue.lease(self.worker_id)
+        if job is None:
+            return False
+        name = f"{job['language'] or 'all'}/{job['since']}/{job['spoken']}"
+        try:
+            with metrics.timer("queue_job"):
+                repos = self.fetch(job["language"], job["since"], job["spoken"])
+            if not repos:
+                raise RuntimeError("没有抓取到任何仓库")
+        except Exception as e:
+            logger.error(f"[{self.worker_id}] 任务 {name} 失败（第 {job['attempts'] + 1} 次）：{e}")
+            metrics.inc("queue_jobs_total", result="error")
+            self.queue.fail(job["id"], str(e))
+        else:
+            logger.info(f"[{self.worker_id}] 任务 {name} 完成：{len(repos)} 个仓库")
+            metrics.inc("queue_jobs_total", result="ok")
+            self.queue.complete(job["id"], repos)
+        self.processed += 1
+        self.merge_ready()
+        return True
+
+    def merge_ready(self) -> bool:
+        """合并一个已完成的榜单；不同 spoken_language 的结果按 owner/repo 去重后写入历史存储"""
+        group = self.queue.claim_merge(self.worker_id)
+        if group is None:
+            return False
+        from models import BaseRepo
+
+        date_str, language, since = group["date"], group["language"], group["since"]
+        repos = self.queue.results(date_str, language, since)
+        try:
+            recorder = self.recorder
+            recorder.date_str = date_str  # 按入队日期写入，跨天完成的任务不会落到第二天
+            recorder.save([BaseRepo.from_dict(r) for r in repos])
+        except Exception as e:
+            logger.error(f"[{self.worker_id}] 合并 {language or 'all'}/{since} 失败：{e}")
+            self.queue.abort_merge(date_str, language, since)
+            return False
+        self.queue.finish_merge(date_str, language, since, len(repos))
+        metrics.inc("queue_merges_total")
+        logger.info(f"[{self.worker_id}] 已合并 {date_str} {language or 'all'}/{since}：{len(repos)} 个仓库")
+        return True
+
+    def run(self, drain: bool = True, poll: float = 5.0):
+        """drain 为 True 时队列没有剩余工作就退出，否则持续轮询"""
+        logger.info(f"[{self.worker_id}] worker 启动")
+        while not self.stopped:
+            if self.run_one():
+                continue
+            if drain and not self.queue.has_work():
+                break
+            # 其他 worker 还持有租约：等它们完成或租约过期
+            time.sleep(poll)
+        logger.info(f"[{self.worker_id}] worker 退出，共处理 {self.processed} 个任务")
+        return self.processed
@@ -9,8 +9,13 @@ Description : Add your script's purpose here.
 
 import os
 import sys
+import json
+import time
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 
 class ColoredFormatter(logging.Formatter):
@@ -30,6 +35,90 @@ class ColoredFormatter(logging.Formatter):
         return f"{self.CSI}{color}m{msg}{self.RESET}" if color else msg
 
 
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式，附带 stage / language / repo / duration 等结构化字段（通过 extra 传入）"""
+
+    FIELDS = ("stage", "language", "repo", "duration", "suppressed")
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    对逐条刷屏的日志（extra={"chatty": True}）限流：
+    同一 logger 的同一消息模板每秒最多放行 rate 条，超出的丢弃，
+    下一个窗口放行的第一条记录上带 suppressed=丢弃条数。
+    """
+
+    def __init__(self, rate=50, window=1.0):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self._windows = {}  # (logger, 模板) -> [窗口开始时间, 已放行, 已丢弃]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or not getattr(record, "chatty", False):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state and state[2]:
+                    record.suppressed = state[2]
+                state = self._windows[key] = [now, 0, 0]
+            if state[1] >= self.rate:
+                state[2] += 1
+                return False
+            state[1] += 1
+            return True
+
+
+class _QueueHandler(QueueHandler):
+    """
+    标准 QueueHandler.prepare 会在调用线程里完整格式化并复制一份记录；
+    这里只合并 msg % args（避免参数对象之后被修改），格式化留给后台线程。
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_listener = None
+
+
+def stop_logging():
+    """停止后台写日志线程，等待队列中的记录全部写完"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
 def setup_logger(
         level=logging.DEBUG,
         console_fmt="%(asctime)s %(name)s %(levelname)s %(message)s",
@@ -37,37 +126,95 @@ def setup_logger(
         log_dir=None,  # 如果不需要文件日志，传 None
         log_filename="temu.log",
         max_bytes=10 * 1024 * 1024,
-        backup_count=3
+        backup_count=3,
+        use_queue=False,  # True：调用线程只入队，由后台线程负责格式化与写入
+        json_format=False,  # True：文件日志使用 JSON Lines
+        item_rate=0,  # >0：chatty 日志每秒最多放行条数
 ):
+    global _listener
     root = logging.getLogger()
     root.setLevel(level)
 
-    # 清空旧 handler
+    # 清空旧 handler，并停掉上一次的后台线程
+    stop_logging()
     while root.handlers:
         root.handlers.pop()
 
+    handlers = []
     # 1) 控制台彩色输出
     ch = logging.StreamHandler(sys.stdout)
     ch.setLevel(level)
     ch.setFormatter(ColoredFormatter(fmt=console_fmt, datefmt=datefmt))
-    root.addHandler(ch)
+    handlers.append(ch)
 
     # 2) 可选：滚动文件输出（非彩色）
     if log_dir:
         os.makedirs(log_dir, exist_ok=True)
         path = os.path.join(log_dir, log_filename)
-        fh = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        # delay=True：第一条日志写入时才打开文件
+        fh = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
         fh.setLevel(level)
-        # 文件里就不加色了，用普通 Formatter
-        fh.setFormatter(logging.Formatter(fmt=console_fmt, datefmt=datefmt))
-        root.addHandler(fh)
+        # 文件里就不加色了，用普通 Formatter 或 JSON
+        if json_format:
+            fh.setFormatter(JsonFormatter(datefmt=datefmt))
+        else:
+            fh.setFormatter(logging.Formatter(fmt=console_fmt, datefmt=datefmt))
+        handlers.append(fh)
+
+    # 3) 可选：队列 + 后台线程，文件 I/O 和滚动不再阻塞业务线程
+    if use_queue:
+        qh = _QueueHandler(queue.SimpleQueue())
+        _listener = QueueListener(qh.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        handlers = [qh]
+
+    for handler in handlers:
+        # 限流挂在最外层 handler 上，被丢弃的记录不会入队也不会格式化
+        if item_rate > 0:
+            handler.addFilter(RateLimitFilter(item_rate))
+        root.addHandler(handler)
+
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
+def _entry_name(default):
+    """入口脚本名（python main.py -> main），交互式/-c 运行时用 default"""
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else ''
+    name = os.path.splitext(script)[0]
+    return name if name and name not in ('-c', '-m') else default
+
+
+def bootstrap_logging(name='github', entry=None, level=None):
+    """
+    进程内只配置一次根 logger，重复调用直接返回。
+    日志文件按入口脚本命名：./{name}_logs/{name}_{entry}.log
+    级别、后台写入、JSON 格式与限流取自配置 [logging]。
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        from config_set import config
+
+        entry = entry or _entry_name(name)
+        setup_logger(
+            level=level or logging.getLevelName(config.log_level),
+            log_dir=f"./{name}_logs",
+            log_filename=f'{name}_{entry}.log',
+            use_queue=config.log_async,
+            json_format=config.log_format == 'json',
+            item_rate=config.log_item_rate,
+        )
+        _bootstrapped = True
+
 
 def init_logger(name, module_name):
-    setup_logger(
-        level=logging.INFO,
-        log_dir=f"./{name}_logs",
-        log_filename=f'{name}_{module_name}.log'
-    )
+    # 各模块导入时都会调用，只有第一次真正初始化 handler
+    bootstrap_logging(name, entry=_entry_name(module_name))
     logger = logging.getLogger(module_name)
     return logger
 
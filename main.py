@@ -4,19 +4,35 @@
 File Name   : main.py
 Author      : wzw
 Date Created: 2025/5/18
-Description : Add your script's purpose here.
+Description : 程序入口：python main.py 单次运行，python main.py serve 常驻调度，
+              python main.py enqueue / worker 分片抓取，python main.py pipeline 流水线抓取补全
 """
 import os
+import argparse
 from log_utils import init_logger
-from trending_scraper import TrendingScraper
-from history_recorder import HistoryRecorder
-from output_generator import OutputGenerator
 
 module_name = os.path.splitext(os.path.basename(__file__))[0]
+# 入口处先完成唯一一次日志初始化，之后各模块导入时不再重复配置
 logger = init_logger('github', module_name)
 
 
-def main(language="python", since="daily"):
+def main(language="python", since="daily", profile=None):
+    # 重依赖（requests / lxml 等）在真正运行时才导入，--help 等命令不需要付出这部分启动开销
+    from metrics import metrics, profiled
+
+    try:
+        with profiled(profile), metrics.timer("run"):
+            _run(language, since)
+    finally:
+        metrics.log_summary()
+        metrics.export()
+
+
+def _run(language, since):
+    from trending_scraper import TrendingScraper
+    from history_recorder import HistoryRecorder
+    from output_generator import OutputGenerator
+
     # 抓取信息
     scraper = TrendingScraper()
     result = scraper.get_repos(language, since)
@@ -31,5 +47,120 @@ def main(language="python", since="daily"):
     generator.send_to_qiwei(markdown)
 
 
+def digest(start=None, end=None, days=7, language=None, since="daily", top=10, send=False):
+    """区间汇总：默认最近 7 天，按累计新增 star 排名"""
+    from datetime import date, timedelta
+    from output_generator import OutputGenerator
+
+    end = end or date.today().isoformat()
+    start = start or (date.fromisoformat(end) - timedelta(days=days - 1)).isoformat()
+    generator = OutputGenerator()
+    markdown = generator.generate_digest(start, end, language=language, since=since, top=top)
+    print(markdown)
+    if send:
+        generator.send_to_qiwei(markdown)
+
+
+def enqueue(languages=None, sinces=None, spoken=None):
+    """把抓取矩阵拆成任务写入本地队列，由 worker 进程领取"""
+    from config_set import config
+    from job_queue import JobQueue
+
+    queue = JobQueue()
+    queue.enqueue(languages or config.queue_languages, sinces or config.queue_sinces,
+                  spoken or config.queue_spoken_languages)
+    print(queue.counts())
+    queue.close()
+
+
+def worker(processes=1, drain=True):
+    """启动 processes 个 worker 进程领取队列任务；其他机器共享队列文件时也可各自运行"""
+    if processes <= 1:
+        _worker(drain)
+        return
+    import multiprocessing
+
+    # spawn：子进程重新导入并初始化日志后台线程（fork 出来的子进程没有日志写入线程）
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker, args=(drain,)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+def _worker(drain):
+    from metrics import metrics
+    from job_queue import Worker
+
+    try:
+        Worker().run(drain=drain)
+    finally:
+        metrics.log_summary()
+
+
+def pipeline(languages=None, sinces=None, spoken=None, report=False):
+    """抓取、补全、保存三段流水线跑完整个矩阵；report 为 True 时每个榜单保存完就推送报告"""
+    from config_set import config
+    from metrics import metrics
+    from pipeline import Pipeline
+
+    def _report(key, save_path, repos):
+        from output_generator import OutputGenerator
+
+        generator = OutputGenerator(save_path)
+        generator.send_to_qiwei(generator.generate_markdown())
+
+    try:
+        Pipeline(on_complete=_report if report else None).run(
+            languages or config.queue_languages, sinces or config.queue_sinces, spoken)
+    finally:
+        metrics.log_summary()
+        metrics.export()
+
+
+def _split(value):
+    return [v.strip() for v in value.split(",")] if value else None
+
+
+def serve():
+    from daemon import TrendingDaemon
+
+    TrendingDaemon().serve()
+
+
 if __name__ == '__main__':
-    main()
+    arg_parser = argparse.ArgumentParser(description="GitHub trending 抓取与推送")
+    arg_parser.add_argument("command", nargs="?", default="run",
+                            choices=["run", "serve", "digest", "enqueue", "worker", "pipeline"],
+                            help="run：单次运行（默认）；serve：常驻调度；digest：区间汇总；"
+                                 "enqueue：任务入队；worker：领取队列任务；pipeline：流水线抓取补全")
+    arg_parser.add_argument("--language", help="run：默认 python（空字符串为全部语言榜）；digest：默认不限语言")
+    arg_parser.add_argument("--since", default="daily")
+    arg_parser.add_argument("--start", help="digest：开始日期 YYYY-MM-DD")
+    arg_parser.add_argument("--end", help="digest：结束日期，默认今天")
+    arg_parser.add_argument("--days", type=int, default=7, help="digest：未给 --start 时的天数")
+    arg_parser.add_argument("--top", type=int, default=10)
+    arg_parser.add_argument("--send", action="store_true", help="digest：推送到企业微信")
+    arg_parser.add_argument("--languages", help="enqueue / pipeline：逗号分隔，默认取配置 [queue] languages")
+    arg_parser.add_argument("--sinces", help="enqueue / pipeline：逗号分隔，默认取配置 [queue] sinces")
+    arg_parser.add_argument("--spoken", help="enqueue / pipeline：spoken_language_code，逗号分隔")
+    arg_parser.add_argument("--workers", type=int, default=1, help="worker：本机启动的进程数")
+    arg_parser.add_argument("--follow", action="store_true", help="worker：队列清空后继续等待新任务")
+    arg_parser.add_argument("--report", action="store_true", help="pipeline：每个榜单完成后推送报告")
+    arg_parser.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                            help="对本次运行做性能剖析（默认取配置 [metrics] profile）")
+    args = arg_parser.parse_args()
+
+    if args.command == "serve":
+        serve()
+    elif args.command == "digest":
+        digest(args.start, args.end, args.days, args.language or None, args.since, args.top, args.send)
+    elif args.command == "enqueue":
+        enqueue(_split(args.languages), _split(args.sinces), _split(args.spoken))
+    elif args.command == "worker":
+        worker(args.workers, drain=not args.follow)
+    elif args.command == "pipeline":
+        pipeline(_split(args.languages), _split(args.sinces), _split(args.spoken), args.report)
+    else:
+        main("python" if args.language is None else args.language, args.since, args.profile)
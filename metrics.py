@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : metrics.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 分阶段计时与计数，导出为 Prometheus textfile 与 JSON 摘要；可选单次运行性能剖析
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from config_set import config
+from log_utils import init_logger
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+# 直方图分桶（秒）：覆盖从解析（毫秒级）到带重试的请求（数十秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """按 Prometheus 文本格式转义标签值：反斜杠、双引号和换行"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """累计分桶直方图，同时记录最小/最大值供 JSON 摘要使用"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估计分位数"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS + (self.max,), self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    进程内指标登记表（线程安全）：
+    - counter：只增计数，如解析出的仓库数、节点切换次数
+    - gauge：最新值，如最后一次运行的时间戳
+    - histogram：耗时分布，timed() 记录到 trending_stage_duration_seconds{stage=...}
+    """
+
+    PREFIX = "trending"
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (f"{self.PREFIX}_{name}", _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(f"{self.PREFIX}_{name}", _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (f"{self.PREFIX}_{name}", _labels(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def timed(self, stage: str):
+        """装饰器：记录函数耗时，抛出异常时计入 stage_errors_total"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    # —— 导出 ——
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({n for n, _ in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (n, labels), value in sorted(series.items()):
+                        if n == name:
+                            value = int(value) if float(value).is_integer() else repr(float(value))
+                            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), hist in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """JSON 摘要：每个阶段的次数、总耗时、均值、p50/p95 估计与最大值，以及所有计数"""
+        with self._lock:
+            stages = {}
+            for (name, labels), hist in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                key = ",".join(v for _, v in labels) or name
+                stages[key] = {
+                    "count": hist.count,
+                    "total_s": round(hist.sum, 4),
+                    "mean_s": round(hist.sum / hist.count, 4) if hist.count else 0,
+                    "p50_s": round(hist.quantile(0.5), 4),
+                    "p95_s": round(hist.quantile(0.95), 4),
+                    "max_s": round(hist.max, 4),
+                }
+            counters = {f"{name}{_fmt_labels(labels)}": value for (name, labels), value in sorted(self.counters.items())}
+            gauges = {f"{name}{_fmt_labels(labels)}": value for (name, labels), value in sorted(self.gauges.items())}
+        return {"generated_at": datetime.now().isoformat(timespec="seconds"),
+                "stages": stages, "counters": counters, "gauges": gauges}
+
+    def export(self, textfile: Optional[Path] = None, json_file: Optional[Path] = None):
+        """
+        写出 Prometheus textfile（node-exporter textfile collector 读取）与 JSON 摘要。
+        先写临时文件再替换，collector 不会读到写了一半的文件。
+        """
+        if not config.metrics_enabled:
+            return
+        self.set("last_run_timestamp_seconds", time.time())
+        for path, content in (
+            (textfile or config.metrics_textfile, self.to_prometheus),
+            (json_file or config.metrics_json_file, lambda: json.dumps(self.summary(), ensure_ascii=False, indent=2)),
+        ):
+            try:
+                path = Path(path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_text(content(), encoding="utf-8")
+                tmp.replace(path)
+            except Exception as e:
+                logger.warning(f"写出指标失败 {path}：{e}")
+
+    def log_summary(self):
+        for stage, row in self.summary()["stages"].items():
+            logger.info(f"[metrics] {stage}：{row['count']} 次，共 {row['total_s']}s，p95 {row['p95_s']}s")
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(mode: Optional[str] = None, out_dir: Optional[Path] = None) -> Iterator[None]:
+    """
+    单次运行的性能剖析（按需开启）：
+    - cprofile：写出 .prof（可用 snakeviz 查看）及按累计耗时排序的文本
+    - pyinstrument：写出 HTML；未安装时退回 cProfile
+    """
+    mode = (mode if mode is not None else config.profile_mode).lower()
+    if not mode:
+        yield
+        return
+
+    out_dir = Path(out_dir or config.profile_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("未安装 pyinstrument，改用 cProfile")
+            mode = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                path = out_dir / f"profile_{stamp}.html"
+                path.write_text(profiler.output_html(), encoding="utf-8")
+                logger.info(f"性能剖析结果：{path}")
+            return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = out_dir / f"profile_{stamp}.prof"
+        profiler.dump_stats(str(path))
+        with open(path.with_suffix(".txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        logger.info(f"性能剖析结果：{path}")
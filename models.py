@@ -7,10 +7,33 @@ Date Created: 2025/5/18
 Description : 数据类型
 """
 
-from dataclasses import dataclass, field
-from typing import List
+import sys
+from array import array
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, Iterator, List, Optional
 
 
+def _slotted(cls):
+    """
+    给 dataclass 加上 __slots__（等价于 3.10+ 的 dataclass(slots=True)，兼容 3.9）。
+    每个实例不再带 __dict__，大量历史数据加载时内存占用明显下降。
+    注意：类体内的方法不要使用无参 super()，它绑定的是重建前的类。
+    """
+    own = tuple(f.name for f in fields(cls) if f.name not in getattr(cls.__base__, "__slots__", ()))
+    cls_dict = dict(cls.__dict__)
+    for name in own:
+        cls_dict.pop(name, None)  # 默认值已记录在 __init__ 中，类属性会与 slot 冲突
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    cls_dict["__slots__"] = own
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+@_slotted
 @dataclass
 class BaseRepo:
     """GitHub 仓库基础信息"""
@@ -22,7 +45,52 @@ class BaseRepo:
     language: str  # 主要编程语言
     since: str  # 统计时间范围
 
+    # 趋势页上的附加信息
+    stars: int = 0  # 总star数（趋势页显示值）
+    forks: int = 0  # fork总数（趋势页显示值）
+    built_by: List[str] = field(default_factory=list)  # 主要贡献者用户名
+    repo_language: str = ""  # 仓库自身的主要语言（趋势页标注）
+
+    def __post_init__(self):
+        # 取值种类很少的字段驻留，成千上万条记录共享同一个字符串对象
+        self.language = _intern(self.language)
+        self.since = _intern(self.since)
+        self.repo_language = _intern(self.repo_language)
 
+    def to_dict(self) -> Dict:
+        """与 dataclasses.asdict 结果一致，但不做递归深拷贝"""
+        return {
+            "owner": self.owner,
+            "repo": self.repo,
+            "url": self.url,
+            "desc": self.desc,
+            "stars_today": self.stars_today,
+            "language": self.language,
+            "since": self.since,
+            "stars": self.stars,
+            "forks": self.forks,
+            "built_by": list(self.built_by),
+            "repo_language": self.repo_language,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BaseRepo":
+        """
+        由 to_dict / 历史 JSON 记录构建；旧记录缺少的字段取默认值，多余字段忽略。
+        与 cls(**data) 相同，列表字段直接沿用 data 中的对象，不再复制。
+        """
+        get = data.get
+        return cls(
+            data["owner"], data["repo"], get("url", ""), get("desc", ""),
+            get("stars_today", 0), get("language", ""), get("since", ""),
+            stars=get("stars", 0),
+            forks=get("forks", 0),
+            built_by=get("built_by") or [],
+            repo_language=get("repo_language", ""),
+        )
+
+
+@_slotted
 @dataclass
 class RichRepo(BaseRepo):
     """GitHub 仓库详细信息"""
@@ -41,3 +109,187 @@ class RichRepo(BaseRepo):
     # 分类信息
     topics: List[str] = field(default_factory=list)  # 仓库标签列表
     homepage: str = ""  # 项目官网/演示地址
+
+    def __post_init__(self):
+        BaseRepo.__post_init__(self)
+        self.license = _intern(self.license)
+
+    @classmethod
+    def from_base(cls, base: BaseRepo) -> "RichRepo":
+        """继承 BaseRepo 的全部字段，补全字段取默认值"""
+        return cls(
+            base.owner, base.repo, base.url, base.desc, base.stars_today, base.language, base.since,
+            stars=base.stars,
+            forks=base.forks,
+            built_by=list(base.built_by),
+            repo_language=base.repo_language,
+        )
+
+    def to_dict(self) -> Dict:
+        data = BaseRepo.to_dict(self)
+        data.update({
+            "stargazers_count": self.stargazers_count,
+            "forks_count": self.forks_count,
+            "open_issues_count": self.open_issues_count,
+            "subscribers_count": self.subscribers_count,
+            "license": self.license,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "pushed_at": self.pushed_at,
+            "topics": list(self.topics),
+            "homepage": self.homepage,
+        })
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RichRepo":
+        get = data.get
+        return cls(
+            data["owner"], data["repo"], get("url", ""), get("desc", ""),
+            get("stars_today", 0), get("language", ""), get("since", ""),
+            stars=get("stars", 0),
+            forks=get("forks", 0),
+            built_by=get("built_by") or [],
+            repo_language=get("repo_language", ""),
+            stargazers_count=get("stargazers_count", 0),
+            forks_count=get("forks_count", 0),
+            open_issues_count=get("open_issues_count", 0),
+            subscribers_count=get("subscribers_count", 0),
+            license=get("license", ""),
+            created_at=get("created_at", ""),
+            updated_at=get("updated_at", ""),
+            pushed_at=get("pushed_at", ""),
+            topics=get("topics") or [],
+            homepage=get("homepage", ""),
+        )
+
+
+class StringTable:
+    """字符串字典编码：相同取值只存一份，列中只保存编号"""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(_intern(value))
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class RepoBatch:
+    """
+    BaseRepo 的列式存储，用于批量加载多年历史数据：
+    - 数值字段存为 array（每个值 8 字节，而不是一个 int 对象）
+    - language / since / repo_language 字典编码为 array('H') + StringTable
+    - owner / repo / desc / built_by 为 list，同一仓库多天上榜时共享同一字符串对象
+    - url 为标准的 https://github.com/{owner}/{repo} 时不单独保存
+    需要对象时用 batch[i] 或迭代按行还原为 BaseRepo。
+    """
+
+    INT_FIELDS = ("stars_today", "stars", "forks")
+    CODE_FIELDS = ("language", "since", "repo_language")
+    STR_FIELDS = ("owner", "repo", "url", "desc")
+
+    def __init__(self, keep_built_by: bool = True):
+        self.owner: List[str] = []
+        self.repo: List[str] = []
+        self.url: List[str] = []
+        self.desc: List[str] = []
+        self.stars_today = array("q")
+        self.stars = array("q")
+        self.forks = array("q")
+        self.language = array("H")
+        self.since = array("H")
+        self.repo_language = array("H")
+        self.tables = {name: StringTable() for name in self.CODE_FIELDS}
+        self.built_by: Optional[List[tuple]] = [] if keep_built_by else None
+        self._shared: Dict[str, str] = {}  # 批内字符串去重
+
+    @classmethod
+    def from_repos(cls, repos: Iterable[BaseRepo], keep_built_by: bool = True) -> "RepoBatch":
+        batch = cls(keep_built_by)
+        batch.extend(repos)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict], keep_built_by: bool = True) -> "RepoBatch":
+        """直接由历史 JSON 记录构建，不经过 BaseRepo 对象"""
+        batch = cls(keep_built_by)
+        for row in rows:
+            batch._append(row["owner"], row["repo"], row.get("url", ""), row.get("desc", ""),
+                          row.get("stars_today", 0), row.get("stars", 0), row.get("forks", 0),
+                          row.get("language", ""), row.get("since", ""), row.get("repo_language", ""),
+                          row.get("built_by") or [])
+        return batch
+
+    def _append(self, owner, repo, url, desc, stars_today, stars, forks, language, since, repo_language,
+                built_by):
+        share = self._shared.setdefault
+        owner, repo = share(owner, owner), share(repo, repo)
+        self.owner.append(owner)
+        self.repo.append(repo)
+        self.url.append(None if url == f"https://github.com/{owner}/{repo}" else url)
+        self.desc.append(share(desc, desc))
+        self.stars_today.append(stars_today)
+        self.stars.append(stars)
+        self.forks.append(forks)
+        self.language.append(self.tables["language"].code(language))
+        self.since.append(self.tables["since"].code(since))
+        self.repo_language.append(self.tables["repo_language"].code(repo_language))
+        if self.built_by is not None:
+            self.built_by.append(tuple(share(u, u) for u in built_by))
+
+    def append(self, r: BaseRepo):
+        self._append(r.owner, r.repo, r.url, r.desc, r.stars_today, r.stars, r.forks,
+                     r.language, r.since, r.repo_language, r.built_by)
+
+    def extend(self, repos: Iterable[BaseRepo]):
+        for r in repos:
+            self.append(r)
+
+    def __len__(self):
+        return len(self.owner)
+
+    def decode(self, name: str) -> List[str]:
+        """把编码列还原为字符串列表"""
+        values = self.tables[name].values
+        return [values[c] for c in getattr(self, name)]
+
+    def where(self, **conditions: str) -> List[int]:
+        """按编码字段筛选行号，如 where(language="python", since="daily")"""
+        wanted = {}
+        for name, value in conditions.items():
+            code = self.tables[name]._codes.get(value)
+            if code is None:
+                return []
+            wanted[name] = code
+        columns = [(getattr(self, name), code) for name, code in wanted.items()]
+        return [i for i in range(len(self)) if all(col[i] == code for col, code in columns)]
+
+    def __getitem__(self, i: int) -> BaseRepo:
+        t = self.tables
+        owner, repo, url = self.owner[i], self.repo[i], self.url[i]
+        return BaseRepo(
+            owner, repo, url if url is not None else f"https://github.com/{owner}/{repo}",
+            self.desc[i], self.stars_today[i],
+            t["language"].values[self.language[i]], t["since"].values[self.since[i]],
+            stars=self.stars[i],
+            forks=self.forks[i],
+            built_by=list(self.built_by[i]) if self.built_by is not None else [],
+            repo_language=t["repo_language"].values[self.repo_language[i]],
+        )
+
+    def __iter__(self) -> Iterator[BaseRepo]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self) -> List[Dict]:
+        return [self[i].to_dict() for i in range(len(self))]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : notifier.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 企业微信消息投递：按字节上限分片、多 webhook 并发、每个 webhook 限速、失败消息落盘待重发
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import requests
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from config_set import config
+from log_utils import init_logger
+from small_utils import TokenBucket
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+# 企业微信频率超限的错误码
+ERRCODE_RATE_LIMITED = 45009
+
+
+def split_markdown(text: str, limit: int = 4096) -> List[str]:
+    """
+    按 UTF-8 字节数把 markdown 切成不超过 limit 的片段，尽量在行尾断开；
+    单行本身超长时按字符切开（不会截断多字节字符），因此 limit 至少要放得下一个字符（4 字节）。
+    """
+    if limit < 4:
+        raise ValueError(f"limit 至少为 4 字节（一个 UTF-8 字符的最大长度），实际为 {limit}")
+    if len(text.encode("utf-8")) <= limit:
+        return [text]
+
+    chunks, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        line_size = len(line.encode("utf-8"))
+        if size + line_size > limit and current:
+            chunks.append("".join(current))
+            current, size = [], 0
+        while line_size > limit:
+            # 超长单行：取能放下的最长前缀
+            cut = len(line.encode("utf-8")[:limit].decode("utf-8", errors="ignore"))
+            chunks.append(line[:cut])
+            line = line[cut:]
+            line_size = len(line.encode("utf-8"))
+        current.append(line)
+        size += line_size
+    if current:
+        chunks.append("".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+class Notifier:
+    """
+    - 报告按 chunk_bytes 分片，每个 webhook 按顺序发送各片段
+    - 多个 webhook 并发发送，共用一个连接池
+    - 每个 webhook 一个令牌桶：任意 60 秒内不超过 rate_per_min 条（企业微信限制 20 条/分钟）
+    - 重试后仍失败的消息写入 outbox 目录，下次发送前先补发
+    """
+
+    def __init__(self, webhooks: Optional[List[str]] = None, rate_per_min: Optional[int] = None,
+                 burst: Optional[int] = None, outbox_dir: Optional[Path] = None,
+                 chunk_bytes: Optional[int] = None, retries: int = 2,
+                 session: Optional[requests.Session] = None):
+        self.webhooks = list(config.qiwx_webhook_urls if webhooks is None else webhooks)
+        self.chunk_bytes = chunk_bytes or config.notify_chunk_bytes
+        self.retries = retries
+        self.outbox_dir = Path(outbox_dir or config.notify_outbox_dir)
+
+        # 桶容量 burst、每秒补充 (rate - burst) / 60：任意 60 秒窗口内最多 burst + (rate - burst) = rate 条
+        rate = rate_per_min or config.notify_rate_per_min
+        burst = min(burst or config.notify_burst, rate - 1) if rate > 1 else 1
+        self._buckets = {url: TokenBucket(max(rate - burst, 1) / 60, burst) for url in self.webhooks}
+        self._buckets_lock = threading.Lock()
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(4, len(self.webhooks)))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"sent": 0, "failed": 0, "rate_limited": 0, "outboxed": 0, "redelivered": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _bucket(self, webhook: str) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(webhook)
+            if bucket is None:
+                # outbox 里可能有已从配置中移除的 webhook，按第一个桶的参数补建
+                ref = next(iter(self._buckets.values()), None)
+                bucket = self._buckets[webhook] = TokenBucket(ref.rate if ref else 15 / 60,
+                                                              ref.capacity if ref else 5)
+            return bucket
+
+    # —— 单条发送 ——
+    def _post(self, webhook: str, payload: Dict) -> bool:
+        """带令牌桶与重试的单条发送，返回是否成功"""
+        for attempt in range(self.retries + 1):
+            self._bucket(webhook).acquire()
+            try:
+                resp = self.session.post(webhook, json=payload, timeout=10)
+                body = resp.json() if resp.content else {}
+                errcode = body.get("errcode")
+                if resp.status_code == 200 and errcode == 0:
+                    self._count("sent")
+                    return True
+                if errcode == ERRCODE_RATE_LIMITED:
+                    self._count("rate_limited")
+                    logger.warning(f"webhook 频率超限，{(attempt + 1) * 5}s 后重试")
+                    time.sleep((attempt + 1) * 5)
+                    continue
+                logger.warning(f"发送失败（{resp.status_code}）：{resp.text[:200]}")
+            except Exception as e:
+                logger.warning(f"发送异常：{e}")
+            time.sleep(attempt + 1)
+        self._count("failed")
+        return False
+
+    def _deliver(self, webhook: str, payloads: List[Dict]) -> List[Dict]:
+        """按顺序发送一个 webhook 的全部片段；某片失败后剩余片段不再尝试，一并返回"""
+        for i, payload in enumerate(payloads):
+            if not self._post(webhook, payload):
+                return payloads[i:]
+        return []
+
+    # —— outbox ——
+    def _outbox_put(self, webhook: str, payloads: List[Dict]):
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        for i, payload in enumerate(payloads):
+            # 文件名以时间和序号开头，按名字排序即为入队顺序
+            name = f"{stamp}_{i:04d}_{uuid.uuid4().hex[:8]}.json"
+            item = {"webhook": webhook, "payload": payload, "created_at": time.time()}
+            tmp = self.outbox_dir / (name + ".tmp")
+            tmp.write_text(json.dumps(item, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.outbox_dir / name)
+        self._count("outboxed", len(payloads))
+        logger.warning(f"{len(payloads)} 条消息未送达，已写入 outbox，下次运行时重发")
+
+    def pending(self) -> int:
+        return len(list(self.outbox_dir.glob("*.json"))) if self.outbox_dir.exists() else 0
+
+    def flush_outbox(self) -> int:
+        """补发 outbox 中的消息，返回仍未送达的条数；过期消息直接丢弃"""
+        if not self.outbox_dir.exists():
+            return 0
+        self._flush_outbox()
+        left = self.pending()
+        logger.info(f"outbox 补发完成，剩余 {left} 条")
+        return left
+
+    def _flush_outbox(self) -> set:
+        """补发 outbox，返回仍有消息未送达的 webhook"""
+        if not self.outbox_dir.exists():
+            return set()
+        max_age = config.notify_outbox_max_age_hours * 3600
+        queues: Dict[str, List] = {}
+        for path in sorted(self.outbox_dir.glob("*.json")):
+            try:
+                item = json.loads(path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.error(f"outbox 文件损坏 {path}：{e}")
+                path.unlink()
+                continue
+            if time.time() - item.get("created_at", 0) > max_age:
+                logger.warning(f"outbox 消息超过 {config.notify_outbox_max_age_hours}h 未送达，丢弃：{path.name}")
+                path.unlink()
+                continue
+            queues.setdefault(item["webhook"], []).append((path, item["payload"]))
+        if not queues:
+            return set()
+
+        def redeliver(webhook, items) -> bool:
+            # 保持顺序：某条失败后，该 webhook 后面的消息留到下次
+            for path, payload in items:
+                if not self._post(webhook, payload):
+                    return False
+                path.unlink()
+                self._count("redelivered")
+            return True
+
+        with ThreadPoolExecutor(max_workers=len(queues)) as pool:
+            delivered = dict(zip(queues, pool.map(redeliver, queues.keys(), queues.values())))
+        return {webhook for webhook, ok in delivered.items() if not ok}
+
+    # —— 对外接口 ——
+    def send_markdown(self, markdown: str) -> bool:
+        """
+        发送一份 markdown 报告到全部 webhook，全部送达返回 True。
+        某个 webhook 的 outbox 补发后仍有积压时，新消息直接排在积压之后进入 outbox，
+        不抢在旧消息前面发送，也不再对不可用的 webhook 多发一轮请求。
+        """
+        if not self.webhooks:
+            raise RuntimeError("[error] 未设置企业微信 webhook，请在配置 [notify] 中设置 qiwx_webhook_url(s)")
+        chunks = split_markdown(markdown, self.chunk_bytes)
+        payloads = [{"msgtype": "markdown", "markdown": {"content": c}} for c in chunks]
+        blocked = self._flush_outbox()
+        if blocked:
+            logger.info(f"outbox 补发后仍有 {self.pending()} 条积压")
+
+        def deliver(url):
+            return payloads if url in blocked else self._deliver(url, payloads)
+
+        with ThreadPoolExecutor(max_workers=len(self.webhooks)) as pool:
+            undelivered = dict(zip(self.webhooks, pool.map(deliver, self.webhooks)))
+        for webhook, rest in undelivered.items():
+            if rest:
+                self._outbox_put(webhook, rest)
+        ok = not any(undelivered.values())
+        logger.info(f"报告分 {len(chunks)} 片发送到 {len(self.webhooks)} 个 webhook：{'全部成功' if ok else '部分失败'}")
+        return ok
+
+
+_shared_notifier: Optional[Notifier] = None
+_shared_lock = threading.Lock()
+
+
+def get_notifier() -> Notifier:
+    """进程内共享的 Notifier（常驻模式下令牌桶状态跨任务保留）"""
+    global _shared_notifier
+    with _shared_lock:
+        if _shared_notifier is None:
+            _shared_notifier = Notifier()
+        return _shared_notifier
@@ -7,18 +7,64 @@ Date Created: 2025/5/18
 Description : 每周生成项目推荐榜单（md/html）
 """
 import os
-import json
-import requests
+import heapq
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Hashable, List, Optional
 from config_set import config
 from log_utils import init_logger
+from metrics import metrics
 
 # 模块名用于日志标识
 module_name = os.path.splitext(os.path.basename(__file__))[0]
 logger = init_logger('github', module_name)
 
 
+class SpaceSavingTopK:
+    """
+    Space-Saving 有界 top-k：最多保留 capacity 个计数器，内存与数据总量无关。
+    计数器满时新来的仓库替换当前最小的计数器，并继承其计数作为误差上界，
+    因此 count 为高估值，count - error 为保证下界；不同仓库数不超过 capacity 时结果精确。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.counters: Dict[Hashable, List] = {}  # key -> [count, error, days, payload]
+        self._heap: List[tuple] = []  # (count, key)，惰性删除：与当前计数不符的条目直接丢弃
+
+    def add(self, key: Hashable, amount: int, payload=None):
+        entry = self.counters.get(key)
+        if entry is None:
+            if len(self.counters) >= self.capacity:
+                floor = self._evict()
+                entry = [floor, floor, 0, payload]
+            else:
+                entry = [0, 0, 0, payload]
+            self.counters[key] = entry
+        entry[0] += amount
+        entry[2] += 1
+        if payload is not None:
+            entry[3] = payload
+        heapq.heappush(self._heap, (entry[0], key))
+        # 惰性删除会让堆变长，超过一定比例时重建
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(e[0], k) for k, e in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def _evict(self) -> int:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self.counters.get(key)
+            if entry is not None and entry[0] == count:
+                del self.counters[key]
+                return count
+
+    def top(self, k: int) -> List[tuple]:
+        """[(key, count, error, days, payload)]，按 count 降序"""
+        best = heapq.nlargest(k, self.counters.items(), key=lambda kv: kv[1][0])
+        return [(key, e[0], e[1], e[2], e[3]) for key, e in best]
+
+
 class OutputGenerator:
     """
     从历史记录文件中读取最新记录，生成 Markdown 报告并推送至企业微信。
@@ -29,7 +75,13 @@ class OutputGenerator:
 {rows}
     """
 
-    def __init__(self, history_path):
+    def __init__(self, history_path=None):
+        # generate_markdown 算出变化后待记入已推送索引的榜单，送达后由 send_to_qiwei 提交
+        self._pending_seen: Optional[tuple] = None
+        if history_path is None:
+            # 只做区间汇总时不需要单日文件
+            self.history_path = None
+            return
         try:
             self.history_path = Path(history_path)
             if not self.history_path.exists():
@@ -39,8 +91,10 @@ class OutputGenerator:
             logger.error(e)
 
     def _load_latest(self) -> Dict:
-        history = json.loads(self.history_path.read_text(encoding='utf-8'))
-        return history if isinstance(history, dict) else history[-1]
+        """文件中最后一条快照；jsonl.gz 日文件里是最近一次保存的榜单"""
+        from history_store import read_records
+
+        return read_records(self.history_path)[-1]
 
     def _format_rows(self, repos: List[Dict]) -> str:
         """
@@ -60,34 +114,152 @@ class OutputGenerator:
             )
         return "\n".join(lines)
 
-    def generate_markdown(self) -> str:
+    def _format_diff(self, diff: Dict[str, List]) -> str:
+        """新上榜按完整格式列出，上升 / 掉榜只列名次变化"""
+        parts = []
+        if diff["new"]:
+            parts.append(f"### 🆕 新上榜（{len(diff['new'])}）\n" + self._format_rows(diff["new"]))
+        if diff["climbing"]:
+            lines = [f"- [{r['owner']}/{r['repo']}]({r['url']}) #{r['from_rank']} → #{r['to_rank']}"
+                     for r in diff["climbing"][:10]]
+            parts.append(f"### 📈 排名上升（{len(diff['climbing'])}）\n" + "\n".join(lines))
+        if diff["dropped"]:
+            lines = [f"- {d['repo']}（上次 #{d['rank']}）" for d in diff["dropped"][:10]]
+            parts.append(f"### 📉 掉出榜单（{len(diff['dropped'])}）\n" + "\n".join(lines))
+        return "\n\n".join(parts) or "今日榜单与上次推送相比没有变化"
+
+    def generate_markdown(self, diff: Optional[bool] = None, channel: Optional[str] = None) -> str:
+        """
+        diff 为 True（默认取配置 report.diff）时只报告相对上次推送的变化；否则输出前 10 名。
+        这里只读已推送索引，本次榜单在 send_to_qiwei 送达后才记入，因此可以反复预览、失败后重试。
+        """
         latest = self._load_latest()
         date = latest.get('date', '未知日期')
         _type = latest.get('type', '未知模式')
-        rows = self._format_rows(latest.get('repos', []))
+        repos = latest.get('repos', [])
+        if (config.report_diff if diff is None else diff) and repos:
+            from seen_index import SeenIndex
+
+            language = repos[0].get('language', '')
+            channel = channel or config.report_channel
+            index = SeenIndex()
+            try:
+                rows = self._format_diff(index.diff(language, _type, repos, channel))
+            finally:
+                index.close()
+            self._pending_seen = (language, _type, repos, channel, date)
+        else:
+            rows = self._format_rows(repos)
         return self.MSG_TEMPLATE.format(date=date, type=_type, rows=rows)
 
+    DIGEST_TEMPLATE = """\
+    ## GitHub 趋势仓库汇总（{start} ~ {end} {scope}）
+
+{rows}
+    """
+
+    @staticmethod
+    def build_digest(store=None, start: Optional[str] = None, end: Optional[str] = None,
+                     language: Optional[str] = None, since: Optional[str] = "daily",
+                     top: int = 10, capacity: Optional[int] = None) -> List[Dict]:
+        """
+        逐个读取 [start, end] 内的快照，按 owner/repo 去重累加 stars_today，返回前 top 个仓库。
+        只持有一天的快照，计数器个数固定为 capacity，区间再长内存也不增长。
+        默认只统计 daily 榜，避免同一天的 daily / weekly 榜重复累加；
+        不限语言时同一仓库可能同时出现在全部语言榜和某个语言榜上，同一天只按较大的 stars_today 计一次。
+        """
+        from history_store import get_history_store
+
+        topk = SpaceSavingTopK(capacity or config.digest_capacity)
+        snapshots = 0
+        day, best = None, {}
+
+        def flush():
+            for key, (stars_today, payload) in best.items():
+                topk.add(key, stars_today, payload)
+            best.clear()
+
+        # 传入的 store 由调用方关闭，这里创建的用完即关
+        with nullcontext(store) if store else get_history_store(config.history_backends[0]) as store:
+            # 快照按日期顺序产出，攒够一天再计入
+            for record in store.iter_snapshots(start, end, language=language, since=since):
+                snapshots += 1
+                if record.get("date") != day:
+                    flush()
+                    day = record.get("date")
+                for r in record.get("repos", []):
+                    key, stars_today = (r["owner"], r["repo"]), r.get("stars_today", 0)
+                    if key not in best or stars_today > best[key][0]:
+                        best[key] = (stars_today, (r.get("url", ""), r.get("desc", "")))
+            flush()
+        logger.info(f"汇总 {snapshots} 个快照，保留 {len(topk.counters)} 个计数器")
+        return [
+            {"owner": owner, "repo": repo, "url": url, "desc": desc,
+             "stars": count, "min_stars": count - error, "days": days}
+            for (owner, repo), count, error, days, (url, desc) in topk.top(top)
+        ]
+
+    def generate_digest(self, start: Optional[str] = None, end: Optional[str] = None,
+                        language: Optional[str] = None, since: Optional[str] = "daily",
+                        top: int = 10, store=None) -> str:
+        """区间汇总报告（周报 / 月报）"""
+        repos = self.build_digest(store, start, end, language, since, top)
+        lines = []
+        for idx, r in enumerate(repos, 1):
+            desc = (r['desc'] or '').strip()[:100] or "暂无描述"
+            lines.append(
+                f"{idx}. [{r['owner']}/{r['repo']}]({r['url']})  \n"
+                f" - ⭐ {r['stars']}（上榜 {r['days']} 次）\n"
+                f" - 📝 {desc}"
+            )
+        scope = f"{language or '全部语言'} {since or ''}".strip()
+        return self.DIGEST_TEMPLATE.format(start=start or '最早', end=end or '最新', scope=scope,
+                                           rows="\n".join(lines))
+
+    def _commit_seen(self):
+        """把最近一次 generate_markdown 的榜单记入已推送索引"""
+        if self._pending_seen is None:
+            return
+        from seen_index import SeenIndex
+
+        index = SeenIndex()
+        try:
+            index.commit(*self._pending_seen)
+        finally:
+            index.close()
+        self._pending_seen = None
+
+    @metrics.timed("push")
     def send_to_qiwei(self, markdown: str):
+        """
+        交给 notifier 投递：分片、多 webhook、限速，失败的消息进入 outbox 下次补发。
+        全部送达后才把本次榜单记入已推送索引；未送达时下次报告仍会把这些仓库列为变化。
+        """
+        from notifier import get_notifier
+
         try:
-            webhook = config.qiwx_webhook_url
-            if not webhook:
-                raise RuntimeError("[error] 未设置企业微信 webhook，请在 config_set.py 中配置 qiwx_webhook_url")
-            payload = {
-                "msgtype": "markdown",
-                "markdown": {"content": markdown}
-            }
-            resp = requests.post(webhook, json=payload)
-            if resp.status_code == 200 and resp.json().get("errcode") == 0:
+            if get_notifier().send_markdown(markdown):
                 logger.info("[success] 已成功发送到企业微信")
+                metrics.inc("push_total", result="ok")
+                self._commit_seen()
             else:
-                raise RuntimeError(f"[error] 发送失败：{resp.text}")
-
+                metrics.inc("push_total", result="queued")
         except Exception as e:
+            metrics.inc("push_total", result="error")
             logger.error(e)
 
 
 if __name__ == '__main__':
-    history_path = r"D:\ComputerScience\Python\temp\github_trending\github_trend_data\2025\05\2025-05-19_data.json"
+    import sys
+
+    # 用法：python output_generator.py [历史文件]，默认取 config.base_dir 下最新的日文件
+    if len(sys.argv) > 1:
+        history_path = Path(sys.argv[1])
+    else:
+        daily_files = list(config.base_dir.glob("*/*/*_data.json")) + list(config.base_dir.glob("*/*/*.jsonl.gz"))
+        if not daily_files:
+            raise SystemExit(f"{config.base_dir} 下没有历史文件")
+        history_path = max(daily_files, key=lambda p: p.name[:10])
     generator = OutputGenerator(history_path)
     markdown = generator.generate_markdown()
     print(markdown)
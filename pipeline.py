@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : pipeline.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 流水线模式：抓取 → 补全 → 保存 三段并行，段间用有界队列衔接
+"""
+
+import os
+import queue
+import threading
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from config_set import config
+from log_utils import init_logger
+from metrics import metrics
+from models import BaseRepo, RichRepo
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class _PageDone:
+    """抓取段发给保存段的页面结束标记：该页实际放入流水线的仓库数"""
+    __slots__ = ("key", "count")
+
+    def __init__(self, key: Tuple[str, str], count: int):
+        self.key = key
+        self.count = count
+
+
+class _ListState:
+    """保存段对一个榜单 (language, since) 的收集进度"""
+
+    def __init__(self, pages: int):
+        self.pages_left = pages
+        self.expected = 0
+        self.items: Dict[tuple, BaseRepo] = {}  # (页序号, 页内名次) -> 仓库
+        self.flushed = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.pages_left == 0 and len(self.items) == self.expected
+
+    def ordered(self) -> List[BaseRepo]:
+        return [self.items[k] for k in sorted(self.items)]
+
+
+class Pipeline:
+    """
+    - 抓取：fetch_workers 个线程并发抓取各页面，边解析边把仓库放进补全队列；队列满时 put 阻塞（背压），
+      抓取不会把补全远远甩在后面占满内存
+    - 补全：enrich_workers 个线程，每次取出队列里已有的至多 batch_size 个仓库合并成一次 GraphQL 请求，
+      队列空时不等凑满，来一个就处理一个；开启补全缓存时只请求过期的字段
+    - 保存：单个线程按榜单收集，每新到 flush_every 个仓库就把该榜单目前已有的部分按名次保存一次，
+      全部到齐后保存最终结果；某页抓取失败、补全异常或进程中途退出时，已完成的榜单和已保存的部分都在
+    - 报告：on_complete 在单独的线程里按完成顺序执行，推送限速时不会拖住保存段、经背压拖住整条流水线
+    整体耗时接近最慢的一段，而不是三段之和。
+    """
+
+    def __init__(self, scraper=None, recorder=None, enrich: Optional[bool] = None,
+                 enrich_workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None, flush_every: Optional[int] = None,
+                 token: Optional[str] = None, session=None,
+                 on_complete: Optional[Callable[[Tuple[str, str], object, List[BaseRepo]], None]] = None):
+        if scraper is None:
+            from trending_scraper import TrendingScraper
+            scraper = TrendingScraper()
+        if recorder is None:
+            from history_recorder import HistoryRecorder
+            recorder = HistoryRecorder()
+        self.scraper = scraper
+        self.recorder = recorder
+        self.enrich = config.pipeline_enrich if enrich is None else enrich
+        self.enrich_workers = max(1, enrich_workers or config.pipeline_enrich_workers)
+        self.batch_size = max(1, batch_size or config.graphql_batch_size)
+        self.flush_every = config.pipeline_flush_every if flush_every is None else flush_every
+        self.token = config.github_token if token is None else token
+        self.session = session
+        self.on_complete = on_complete
+        queue_size = queue_size or config.pipeline_queue_size
+        self._enrich_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._save_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._report_q: queue.Queue = queue.Queue()  # 不设上限，保存段放入时从不阻塞
+        self.results: Dict[Tuple[str, str], List[BaseRepo]] = {}
+        self.failed_pages = 0
+        self._failed_lock = threading.Lock()
+
+    # —— 抓取段 ——
+    def _fetch_page(self, page: int, language: str, since: str, code: str,
+                    seen: set, seen_lock: threading.Lock):
+        key, count = (language, since), 0
+        try:
+            for pos, repo in enumerate(self.scraper.iter_repos(language, since, code)):
+                # 同一榜单的多个 spoken_language 页面按 owner/repo 去重，重复的不再补全
+                with seen_lock:
+                    if (repo.owner, repo.repo) in seen:
+                        continue
+                    seen.add((repo.owner, repo.repo))
+                self._enrich_q.put((key, (page, pos), repo))
+                count += 1
+        except Exception as e:
+            with self._failed_lock:
+                self.failed_pages += 1
+            metrics.inc("pipeline_pages_total", result="error")
+            logger.error(f"[{language or 'all'}/{since}/{code}] 抓取失败，已产出 {count} 个仓库：{e}")
+        else:
+            metrics.inc("pipeline_pages_total", result="ok")
+        # 结束标记直接交给保存段，保存段按计数判断这一页的仓库是否都已补全到达
+        self._save_q.put(_PageDone(key, count))
+
+    # —— 补全段 ——
+    def _enrich_batch(self, batch: List[tuple]) -> List[BaseRepo]:
+        bases = [repo for _, _, repo in batch]
+        if not self.enrich:
+            return bases
+        from repo_enricher import enrich_repos_batch, enrich_repos_cached
+
+        enrich = enrich_repos_cached if config.enrich_cache_enabled else enrich_repos_batch
+        try:
+            return enrich(bases, self.token, batch_size=self.batch_size, session=self.session)
+        except Exception as e:
+            logger.error(f"补全 {len(bases)} 个仓库失败，保留趋势页信息：{e}")
+            return [RichRepo.from_base(b) for b in bases]
+
+    def _enrich_loop(self):
+        done = False
+        while not done:
+            item = self._enrich_q.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._enrich_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # 每个补全线程恰好收到一个结束标记：处理完手上这批就退出
+                    done = True
+                    break
+                batch.append(item)
+            metrics.observe("pipeline_enrich_batch", len(batch))
+            for (key, order, _), repo in zip(batch, self._enrich_batch(batch)):
+                self._save_q.put((key, order, repo))
+
+    # —— 保存段 ——
+    def _save(self, key: Tuple[str, str], state: _ListState, final: bool):
+        repos = state.ordered()
+        if not repos:
+            return
+        try:
+            path = self.recorder.save(repos)
+        except Exception as e:
+            logger.error(f"[{key[0] or 'all'}/{key[1]}] 保存失败：{e}")
+            return
+        state.flushed = len(repos)
+        if final:
+            self.results[key] = repos
+            metrics.inc("pipeline_lists_total", result="complete")
+            logger.info(f"[{key[0] or 'all'}/{key[1]}] 流水线完成：{len(repos)} 个仓库")
+            if self.on_complete:
+                self._report_q.put((key, path, repos))
+
+    # —— 报告段 ——
+    def _report_loop(self):
+        while True:
+            item = self._report_q.get()
+            if item is None:
+                break
+            key, path, repos = item
+            try:
+                self.on_complete(key, path, repos)
+            except Exception as e:
+                logger.error(f"[{key[0] or 'all'}/{key[1]}] 完成回调失败：{e}")
+
+    def _save_loop(self, states: Dict[Tuple[str, str], _ListState]):
+        while True:
+            item = self._save_q.get()
+            if item is None:
+                break
+            # 保存段一旦退出，上游会阻塞在满队列上，所以单条出错只记日志、继续消费
+            try:
+                self._collect(states, item)
+            except Exception as e:
+                logger.error(f"保存段处理失败：{e}")
+        # 正常情况下所有榜单都已完整保存；有仓库在途中丢失时，把已到达、尚未保存的部分写下来
+        for key, state in states.items():
+            if state.pages_left >= 0 and len(state.items) > state.flushed:
+                logger.warning(f"[{key[0] or 'all'}/{key[1]}] 未完整到达，保存已有的 {len(state.items)} 个仓库")
+                metrics.inc("pipeline_lists_total", result="partial")
+                self._save(key, state, final=False)
+
+    def _collect(self, states: Dict[Tuple[str, str], _ListState], item):
+        if isinstance(item, _PageDone):
+            key, state = item.key, states[item.key]
+            state.pages_left -= 1
+            state.expected += item.count
+        else:
+            key, order, repo = item
+            state = states[key]
+            state.items[order] = repo
+            if self.flush_every and not state.complete \
+                    and len(state.items) - state.flushed >= self.flush_every:
+                self._save(key, state, final=False)
+        if state.complete:
+            self._save(key, state, final=True)
+            state.pages_left = -1  # 已保存最终结果
+
+    # —— 对外接口 ——
+    def run(self, languages: Iterable[str], sinces: Iterable[str],
+            spoken_language_codes: Optional[Iterable[str]] = None) -> Dict[Tuple[str, str], List[BaseRepo]]:
+        """跑完 languages × sinces（× spoken_language_codes）整个矩阵，返回各榜单最终保存的仓库"""
+        languages, sinces = list(languages), list(sinces)
+        codes = list(spoken_language_codes or [self.scraper.DEFAULT_PARAMS["spoken_language_code"]])
+        states = {key: _ListState(len(codes)) for key in product(languages, sinces)}
+        seen = {key: set() for key in states}
+        seen_lock = threading.Lock()
+
+        with metrics.timer("pipeline"):
+            reporter = None
+            if self.on_complete:
+                reporter = threading.Thread(target=self._report_loop, name="pipeline-report", daemon=True)
+                reporter.start()
+            saver = threading.Thread(target=self._save_loop, args=(states,), name="pipeline-save", daemon=True)
+            saver.start()
+            enrichers = [threading.Thread(target=self._enrich_loop, name=f"pipeline-enrich-{i}", daemon=True)
+                         for i in range(self.enrich_workers)]
+            for t in enrichers:
+                t.start()
+
+            # page 序号按 product 顺序递增，同一榜单内按 codes 顺序排列，与 get_repos_many 的合并顺序一致
+            pages = list(enumerate(product(languages, sinces, codes)))
+            with ThreadPoolExecutor(max_workers=min(self.scraper.max_workers, len(pages))) as pool:
+                list(pool.map(lambda p: self._fetch_page(p[0], *p[1], seen[p[1][:2]], seen_lock), pages))
+            for _ in enrichers:
+                self._enrich_q.put(None)
+            for t in enrichers:
+                t.join()
+            self._save_q.put(None)
+            saver.join()
+            if reporter:
+                self._report_q.put(None)
+                reporter.join()
+
+        complete = sum(1 for key in states if key in self.results)
+        logger.info(f"流水线结束：{complete}/{len(states)} 个榜单完整保存，{self.failed_pages} 页抓取失败")
+        return self.results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="抓取 → 补全 → 保存 流水线")
+    arg_parser.add_argument("--languages", default="python")
+    arg_parser.add_argument("--sinces", default="daily")
+    arg_parser.add_argument("--spoken")
+    arg_parser.add_argument("--no-enrich", action="store_true")
+    args = arg_parser.parse_args()
+    split = lambda s: [v.strip() for v in s.split(",")] if s else None
+    result = Pipeline(enrich=not args.no_enrich).run(split(args.languages), split(args.sinces), split(args.spoken))
+    for (language, since), repos in result.items():
+        print(f"{language or 'all'}/{since}: {len(repos)} 个仓库")
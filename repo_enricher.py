@@ -7,45 +7,276 @@ Date Created: 2025/5/18
 Description : 用 API 补全每个项目的详细数据（stars, issues, 活跃度）
 """
 
+import os
+import json
+import time
 import requests
+from typing import Dict, List, Optional, Sequence, Union
+from config_set import config
+from log_utils import init_logger
+from metrics import metrics
+from http_cache import get_http_cache
+from github_scheduler import GitHubScheduler, get_scheduler
 from models import BaseRepo, RichRepo
 
-def enrich_repo_info(base: BaseRepo, token) -> RichRepo:
-    """
-    根据 BaseRepo 补全信息，生成 RichRepo（使用 GitHub API）
-    """
-    github_api_base = "https://api.github.com/repos"
-    url = f"{github_api_base}/{base.owner}/{base.repo}"
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+# 发请求的对象：普通 requests.Session，或接口一致的 GitHubScheduler
+Session = Union[requests.Session, GitHubScheduler]
+
+# RichRepo 补全字段 -> GraphQL 选择集；只刷新部分字段时按字段拼出各仓库自己的查询
+GRAPHQL_SELECTIONS = {
+    "stargazers_count": "stargazerCount",
+    "forks_count": "forkCount",
+    "open_issues_count": "issues(states: OPEN) { totalCount } pullRequests(states: OPEN) { totalCount }",
+    "subscribers_count": "watchers { totalCount }",
+    "license": "licenseInfo { name }",
+    "created_at": "createdAt",
+    "updated_at": "updatedAt",
+    "pushed_at": "pushedAt",
+    "topics": "repositoryTopics(first: 20) { nodes { topic { name } } }",
+    "homepage": "homepageUrl",
+}
+# 补全字段全集
+RICH_FIELDS = tuple(GRAPHQL_SELECTIONS)
+
+# GraphQL 单个仓库需要的字段，与 RichRepo 字段一一对应
+GRAPHQL_REPO_FIELDS = (
+        "\nfragment RepoFields on Repository {\n"
+        + "".join(f"  {selection}\n" for selection in GRAPHQL_SELECTIONS.values())
+        + "}\n"
+)
 
+
+def _headers(token) -> Dict[str, str]:
     headers = {
         "Accept": "application/vnd.github+json",
         "User-Agent": "GithubTrendingBot"
     }
-
     if token:
         headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+def _rest_values(data: Dict) -> Dict:
+    """REST /repos/{owner}/{repo} 响应 -> 补全字段（与 GitHub API 对应字段名一致）"""
+    return {
+        "stargazers_count": data.get("stargazers_count", 0),
+        "forks_count": data.get("forks_count", 0),
+        "open_issues_count": data.get("open_issues_count", 0),
+        "subscribers_count": data.get("subscribers_count", 0),
+        "license": (data.get("license") or {}).get("name", ""),
+        "created_at": data.get("created_at", ""),
+        "updated_at": data.get("updated_at", ""),
+        "pushed_at": data.get("pushed_at", ""),
+        "topics": data.get("topics", []),
+        "homepage": data.get("homepage") or "",
+    }
+
+
+def _graphql_values(node: Dict, fields=RICH_FIELDS) -> Dict:
+    """GraphQL Repository 节点 -> 补全字段（只取 fields 中的），字段语义与 REST 保持一致"""
+    get = node.get
+    extract = {
+        "stargazers_count": lambda: get("stargazerCount", 0),
+        "forks_count": lambda: get("forkCount", 0),
+        # REST 的 open_issues_count 包含未关闭的 PR
+        "open_issues_count": lambda: (
+                (get("issues") or {}).get("totalCount", 0)
+                + (get("pullRequests") or {}).get("totalCount", 0)
+        ),
+        "subscribers_count": lambda: (get("watchers") or {}).get("totalCount", 0),
+        "license": lambda: (get("licenseInfo") or {}).get("name", ""),
+        "created_at": lambda: get("createdAt", ""),
+        "updated_at": lambda: get("updatedAt", ""),
+        "pushed_at": lambda: get("pushedAt", ""),
+        "topics": lambda: [
+            n["topic"]["name"]
+            for n in (get("repositoryTopics") or {}).get("nodes", [])
+            if n and n.get("topic")
+        ],
+        "homepage": lambda: get("homepageUrl") or "",
+    }
+    return {field: extract[field]() for field in fields}
+
+
+def _with_values(base: BaseRepo, values: Dict) -> RichRepo:
+    rich = RichRepo.from_base(base)  # 基础字段继承
+    for field, value in values.items():
+        setattr(rich, field, value)
+    return rich
+
+
+def _from_rest(base: BaseRepo, data: Dict) -> RichRepo:
+    """REST /repos/{owner}/{repo} 响应 -> RichRepo"""
+    return _with_values(base, _rest_values(data))
+
+
+def _from_graphql(base: BaseRepo, node: Dict) -> RichRepo:
+    """GraphQL Repository 节点 -> RichRepo"""
+    return _with_values(base, _graphql_values(node))
+
 
+def _rest_json(base: BaseRepo, token, session: Session, use_cache: bool = True) -> Optional[Dict]:
+    """请求 REST /repos/{owner}/{repo}，失败返回 None"""
+    url = f"{config.github_api_base}/repos/{base.owner}/{base.repo}"
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        if use_cache:
+            resp = get_http_cache().get(url, headers=_headers(token), session=session)
+        else:
+            resp = session.get(url, headers=_headers(token), timeout=10)
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+    except Exception as e:
+        logger.error(f"enrich_repo_info: 请求失败 {base.owner}/{base.repo}：{e}")
+        return None
 
-        rich = RichRepo(**vars(base))  # 基础字段继承
 
-        # 补全字段（与 GitHub API 对应字段名一致）
-        rich.stargazers_count = data.get("stargazers_count", 0)
-        rich.forks_count = data.get("forks_count", 0)
-        rich.open_issues_count = data.get("open_issues_count", 0)
-        rich.subscribers_count = data.get("subscribers_count", 0)
-        rich.license = data.get("license", {}).get("name", "")
-        rich.created_at = data.get("created_at", "")
-        rich.updated_at = data.get("updated_at", "")
-        rich.pushed_at = data.get("pushed_at", "")
-        rich.topics = data.get("topics", [])
-        rich.homepage = data.get("homepage", "")
+@metrics.timed("enrich")
+def enrich_repo_info(base: BaseRepo, token, session: Optional[Session] = None,
+                     use_cache: bool = True) -> RichRepo:
+    """
+    根据 BaseRepo 补全信息，生成 RichRepo（使用 GitHub API）
+    use_cache 为 True 时走 ETag 条件请求缓存，未变化的仓库只消耗一次 304 验证
+    session 默认为共享的 GitHubScheduler（多 token 轮换、按额度限流）
+    """
+    data = _rest_json(base, token, session or get_scheduler(), use_cache)
+    # 失败时返回基础信息作为 fallback
+    return _from_rest(base, data) if data is not None else RichRepo.from_base(base)
 
-        return rich
 
-    except Exception as e:
-        print(f"[ERROR] enrich_repo_info: 请求失败 {base.owner}/{base.repo}：{e}")
-        return RichRepo(**vars(base))  # 返回基础信息作为 fallback
+def _build_query(chunk: List[BaseRepo], fields: Optional[List[Sequence[str]]] = None) -> str:
+    """为一批仓库拼出带别名的 GraphQL 查询：r0, r1, ...；给出 fields 时每个仓库只查询各自列出的字段"""
+    if fields is None:
+        parts = [
+            f"  r{i}: repository(owner: {json.dumps(b.owner)}, name: {json.dumps(b.repo)}) {{ ...RepoFields }}"
+            for i, b in enumerate(chunk)
+        ]
+        return "query {\n" + "\n".join(parts) + "\n  rateLimit { cost remaining }\n}\n" + GRAPHQL_REPO_FIELDS
+    parts = [
+        f"  r{i}: repository(owner: {json.dumps(b.owner)}, name: {json.dumps(b.repo)}) "
+        f"{{ {' '.join(GRAPHQL_SELECTIONS[f] for f in fields[i])} }}"
+        for i, b in enumerate(chunk)
+    ]
+    return "query {\n" + "\n".join(parts) + "\n  rateLimit { cost remaining }\n}\n"
+
+
+@metrics.timed("enrich_batch")
+def enrich_repos_batch(
+        bases: List[BaseRepo],
+        token,
+        batch_size: Optional[int] = None,
+        session: Optional[Session] = None,
+) -> List[RichRepo]:
+    """
+    批量补全：每 batch_size 个仓库合并为一次 GraphQL 请求（别名查询），
+    查询失败或单个仓库无数据时回退到 REST 的 enrich_repo_info。
+    返回顺序与 bases 一致。
+    """
+    batch_size = max(1, batch_size or config.graphql_batch_size)
+    session = session or get_scheduler()
+    results: List[Optional[RichRepo]] = [None] * len(bases)
+
+    # GitHub GraphQL 必须鉴权，没有 token 时只能走 REST
+    if token or getattr(session, "has_tokens", False):
+        url = f"{config.github_api_base}/graphql"
+        for start in range(0, len(bases), batch_size):
+            chunk = bases[start:start + batch_size]
+            try:
+                resp = session.post(url, headers=_headers(token),
+                                    json={"query": _build_query(chunk)}, timeout=20)
+                resp.raise_for_status()
+                body = resp.json()
+            except Exception as e:
+                logger.warning(f"GraphQL 批量请求失败（{len(chunk)} 个仓库），回退 REST：{e}")
+                continue
+
+            data = body.get("data") or {}
+            cost = (data.get("rateLimit") or {}).get("cost")
+            logger.info(f"GraphQL 补全 {len(chunk)} 个仓库，消耗额度 {cost}")
+            for i, base in enumerate(chunk):
+                node = data.get(f"r{i}")
+                if node:
+                    results[start + i] = _from_graphql(base, node)
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing and (token or getattr(session, "has_tokens", False)):
+        logger.warning(f"{len(missing)} 个仓库 GraphQL 未返回数据，回退 REST")
+    for i in missing:
+        results[i] = enrich_repo_info(bases[i], token, session)
+    return results
+
+
+@metrics.timed("enrich_cached")
+def enrich_repos_cached(
+        bases: List[BaseRepo],
+        token,
+        batch_size: Optional[int] = None,
+        session: Optional[Session] = None,
+        cache=None,
+        now: Optional[float] = None,
+) -> List[RichRepo]:
+    """
+    带快照缓存的批量补全（缓存默认为共享的 EnrichCache）：
+    - 一次查询取出全部仓库的缓存字段，按各字段的 TTL 判断哪些已过期；star / fork 数取趋势页上的值
+    - 全部字段都新鲜的仓库不发请求；其余仓库每 batch_size 个合并为一次 GraphQL 请求，每个别名只查询自己过期的字段
+    - GraphQL 失败或没有 token 时回退 REST（整个仓库一次取回，全部字段一起刷新）
+    - 刷新失败的仓库沿用缓存里的旧值
+    返回顺序与 bases 一致。
+    """
+    from enrich_cache import get_enrich_cache
+
+    cache = cache or get_enrich_cache()
+    now = now or time.time()
+    batch_size = max(1, batch_size or config.graphql_batch_size)
+    session = session or get_scheduler()
+
+    cached = cache.lookup_many([(b.owner, b.repo) for b in bases])
+    entries = [dict(cached.get((b.owner, b.repo), {})) for b in bases]
+    # 趋势页上已有总 star / fork 数，直接作为这两个字段的最新值，不必为它们请求 API
+    refreshed: Dict[int, Dict] = {}
+    for i, base in enumerate(bases):
+        if base.stars:
+            refreshed[i] = {"stargazers_count": base.stars, "forks_count": base.forks}
+            entries[i].update({field: (value, now) for field, value in refreshed[i].items()})
+    stale = [cache.stale_fields(entry, now) for entry in entries]
+    todo = [i for i, fields in enumerate(stale) if fields]
+    fetched = set()
+
+    if todo and (token or getattr(session, "has_tokens", False)):
+        url = f"{config.github_api_base}/graphql"
+        for start in range(0, len(todo), batch_size):
+            chunk = todo[start:start + batch_size]
+            try:
+                resp = session.post(url, headers=_headers(token),
+                                    json={"query": _build_query([bases[i] for i in chunk],
+                                                                [stale[i] for i in chunk])},
+                                    timeout=20)
+                resp.raise_for_status()
+                data = resp.json().get("data") or {}
+            except Exception as e:
+                logger.warning(f"GraphQL 增量补全失败（{len(chunk)} 个仓库），回退 REST：{e}")
+                continue
+            for j, i in enumerate(chunk):
+                node = data.get(f"r{j}")
+                if node:
+                    refreshed.setdefault(i, {}).update(_graphql_values(node, stale[i]))
+                    fetched.add(i)
+    for i in todo:
+        if i not in fetched:
+            data = _rest_json(bases[i], token, session)
+            if data is not None:
+                refreshed.setdefault(i, {}).update(_rest_values(data))
+                fetched.add(i)
+
+    cache.store_many([(bases[i].owner, bases[i].repo, values) for i, values in refreshed.items()], now)
+    metrics.inc("enrich_cache_total", len(bases) - len(todo), result="fresh")
+    metrics.inc("enrich_cache_total", len(fetched), result="refreshed")
+    metrics.inc("enrich_cache_total", len(todo) - len(fetched), result="failed")
+    logger.info(f"补全 {len(bases)} 个仓库：缓存新鲜 {len(bases) - len(todo)}，刷新 {len(fetched)}，"
+                f"失败 {len(todo) - len(fetched)}")
+    return [
+        _with_values(base, {**{field: value for field, (value, _) in entry.items()}, **refreshed.get(i, {})})
+        for i, (base, entry) in enumerate(zip(bases, entries))
+    ]
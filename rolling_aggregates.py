@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : rolling_aggregates.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 滚动聚合（累计 star、上榜次数、7/30/90 天窗口和及排行榜）的增量维护
+"""
+
+import os
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+from config_set import config
+from log_utils import init_logger
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class RollingAggregates:
+    """
+    每次保存快照时增量更新，代价只与当天上榜仓库数相关：
+    - totals:      每个仓库在每个榜单 (language, since) 下的累计 star、上榜次数
+    - window_sums: 最近 W 天的 star 和，新的一天加入、移出窗口的那天扣除（每条日记录只过期一次）
+    - leaderboard: 每个 (language, since, window) 的前 top_k 名，报告直接按名次读取
+    窗口以该榜单最新日期 D 为终点，覆盖 (D-W, D]。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS daily (
+            language TEXT NOT NULL, since TEXT NOT NULL, date TEXT NOT NULL,
+            owner TEXT NOT NULL, repo TEXT NOT NULL, stars_today INTEGER NOT NULL,
+            PRIMARY KEY (language, since, date, owner, repo)
+        );
+        CREATE TABLE IF NOT EXISTS totals (
+            language TEXT NOT NULL, since TEXT NOT NULL, owner TEXT NOT NULL, repo TEXT NOT NULL,
+            cum_stars INTEGER NOT NULL, appearances INTEGER NOT NULL,
+            first_date TEXT NOT NULL, last_date TEXT NOT NULL,
+            PRIMARY KEY (language, since, owner, repo)
+        );
+        CREATE TABLE IF NOT EXISTS window_sums (
+            language TEXT NOT NULL, since TEXT NOT NULL, window INTEGER NOT NULL,
+            owner TEXT NOT NULL, repo TEXT NOT NULL, stars INTEGER NOT NULL, days INTEGER NOT NULL,
+            PRIMARY KEY (language, since, window, owner, repo)
+        );
+        CREATE INDEX IF NOT EXISTS idx_window_rank ON window_sums(language, since, window, stars DESC);
+        CREATE TABLE IF NOT EXISTS window_state (
+            language TEXT NOT NULL, since TEXT NOT NULL, window INTEGER NOT NULL,
+            expired_through TEXT NOT NULL,
+            PRIMARY KEY (language, since, window)
+        );
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            language TEXT NOT NULL, since TEXT NOT NULL, window INTEGER NOT NULL, rank INTEGER NOT NULL,
+            owner TEXT NOT NULL, repo TEXT NOT NULL, stars INTEGER NOT NULL,
+            PRIMARY KEY (language, since, window, rank)
+        );
+    """
+
+    def __init__(self, path: Optional[Path] = None, windows: Optional[Sequence[int]] = None,
+                 top_k: Optional[int] = None):
+        self.path = Path(path or config.base_dir / "aggregates.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.windows = list(windows or config.aggregate_windows)
+        self.top_k = top_k or config.aggregate_top_k
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    # —— 增量更新 ——
+    def _add_window(self, key, window: int, owner: str, repo: str, stars: int, sign: int):
+        self._conn.execute(
+            "INSERT INTO window_sums VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (language, since, window, owner, repo) "
+            "DO UPDATE SET stars = stars + excluded.stars, days = days + excluded.days",
+            (*key, window, owner, repo, sign * stars, sign),
+        )
+
+    def _expired_through(self, key, window: int) -> str:
+        row = self._conn.execute(
+            "SELECT expired_through FROM window_state WHERE language = ? AND since = ? AND window = ?",
+            (*key, window),
+        ).fetchone()
+        return row[0] if row else ""
+
+    def _retract_day(self, key, date_str: str):
+        """同一天重复保存时，先撤销这一天之前记入的数据"""
+        rows = self._conn.execute(
+            "SELECT owner, repo, stars_today FROM daily WHERE language = ? AND since = ? AND date = ?",
+            (*key, date_str),
+        ).fetchall()
+        if not rows:
+            return
+        for owner, repo, stars in rows:
+            self._conn.execute(
+                "UPDATE totals SET cum_stars = cum_stars - ?, appearances = appearances - 1 "
+                "WHERE language = ? AND since = ? AND owner = ? AND repo = ?",
+                (stars, *key, owner, repo),
+            )
+            for window in self.windows:
+                if date_str > self._expired_through(key, window):
+                    self._add_window(key, window, owner, repo, stars, -1)
+        self._conn.execute("DELETE FROM daily WHERE language = ? AND since = ? AND date = ?", (*key, date_str))
+        # 只检查刚撤销的仓库（走主键），不扫描整个 totals 表
+        self._conn.executemany(
+            "DELETE FROM totals WHERE language = ? AND since = ? AND owner = ? AND repo = ? AND appearances <= 0",
+            [(*key, owner, repo) for owner, repo, _ in rows],
+        )
+        # 被撤销的那天可能正是首次/最近上榜日，按剩余记录重新取
+        self._conn.executemany(
+            "UPDATE totals SET "
+            "first_date = (SELECT MIN(date) FROM daily d WHERE d.language = totals.language "
+            "AND d.since = totals.since AND d.owner = totals.owner AND d.repo = totals.repo), "
+            "last_date = (SELECT MAX(date) FROM daily d WHERE d.language = totals.language "
+            "AND d.since = totals.since AND d.owner = totals.owner AND d.repo = totals.repo) "
+            "WHERE language = ? AND since = ? AND owner = ? AND repo = ?",
+            [(*key, owner, repo) for owner, repo, _ in rows],
+        )
+
+    def _expire(self, key, window: int):
+        """把已移出窗口的日记录从窗口和中扣除，并推进 expired_through"""
+        latest = self._conn.execute(
+            "SELECT MAX(date) FROM daily WHERE language = ? AND since = ?", key
+        ).fetchone()[0]
+        cutoff = (date.fromisoformat(latest) - timedelta(days=window)).isoformat()
+        done = self._expired_through(key, window)
+        if cutoff <= done:
+            return
+        for owner, repo, stars in self._conn.execute(
+                "SELECT owner, repo, stars_today FROM daily "
+                "WHERE language = ? AND since = ? AND date > ? AND date <= ?",
+                (*key, done, cutoff)).fetchall():
+            self._add_window(key, window, owner, repo, stars, -1)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO window_state VALUES (?, ?, ?, ?)", (*key, window, cutoff)
+        )
+
+    def _refresh_leaderboard(self, key, window: int):
+        """借助 (language, since, window, stars DESC) 索引，只读取前 top_k 行"""
+        self._conn.execute(
+            "DELETE FROM leaderboard WHERE language = ? AND since = ? AND window = ?", (*key, window)
+        )
+        top = self._conn.execute(
+            "SELECT owner, repo, stars FROM window_sums WHERE language = ? AND since = ? AND window = ? "
+            "ORDER BY stars DESC, owner, repo LIMIT ?",
+            (*key, window, self.top_k),
+        ).fetchall()
+        self._conn.executemany(
+            "INSERT INTO leaderboard VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(*key, window, rank, owner, repo, stars) for rank, (owner, repo, stars) in enumerate(top, 1)],
+        )
+
+    def update(self, date_str: str, repos: List[Dict]):
+        """记入一天的快照（repo 字典列表，字段同 BaseRepo），单事务完成"""
+        if not repos:
+            return
+        key = (repos[0]["language"], repos[0]["since"])
+        with self._lock, self._conn:
+            self._retract_day(key, date_str)
+            self._conn.executemany(
+                "INSERT INTO daily VALUES (?, ?, ?, ?, ?, ?)",
+                [(*key, date_str, r["owner"], r["repo"], r.get("stars_today", 0)) for r in repos],
+            )
+            for r in repos:
+                owner, repo, stars = r["owner"], r["repo"], r.get("stars_today", 0)
+                self._conn.execute(
+                    "INSERT INTO totals VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                    "ON CONFLICT (language, since, owner, repo) DO UPDATE SET "
+                    "cum_stars = cum_stars + excluded.cum_stars, appearances = appearances + 1, "
+                    "first_date = MIN(first_date, excluded.first_date), "
+                    "last_date = MAX(last_date, excluded.last_date)",
+                    (*key, owner, repo, stars, date_str, date_str),
+                )
+            for window in self.windows:
+                # 补录的旧日期如果已在窗口之外，只计入累计值
+                if date_str > self._expired_through(key, window):
+                    for r in repos:
+                        self._add_window(key, window, r["owner"], r["repo"], r.get("stars_today", 0), 1)
+                self._expire(key, window)
+                self._conn.execute(
+                    "DELETE FROM window_sums WHERE language = ? AND since = ? AND window = ? AND days <= 0",
+                    (*key, window),
+                )
+                self._refresh_leaderboard(key, window)
+        logger.info(f"滚动聚合已更新：{key[0]}/{key[1]} {date_str}，{len(repos)} 个仓库")
+
+    # —— 读取 ——
+    def leaderboard(self, language: str, since: str, window: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rank, owner, repo, stars FROM leaderboard "
+                "WHERE language = ? AND since = ? AND window = ? ORDER BY rank",
+                (language, since, window),
+            ).fetchall()
+        return [{"rank": r[0], "owner": r[1], "repo": r[2], "stars": r[3]} for r in rows]
+
+    def totals(self, owner: str, repo: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT language, since, cum_stars, appearances, first_date, last_date FROM totals "
+                "WHERE owner = ? AND repo = ?", (owner, repo),
+            ).fetchall()
+        keys = ("language", "since", "cum_stars", "appearances", "first_date", "last_date")
+        return [dict(zip(keys, r)) for r in rows]
+
+    # —— 校验 ——
+    def verify(self) -> List[str]:
+        """用 daily 全量重算累计值、窗口和与排行榜，返回与增量结果不一致的描述"""
+        problems = []
+        with self._lock:
+            expected = {
+                row[:4]: row[4:] for row in self._conn.execute(
+                    "SELECT language, since, owner, repo, SUM(stars_today), COUNT(*), MIN(date), MAX(date) "
+                    "FROM daily GROUP BY language, since, owner, repo")
+            }
+            actual = {
+                row[:4]: row[4:] for row in self._conn.execute(
+                    "SELECT language, since, owner, repo, cum_stars, appearances, first_date, last_date FROM totals")
+            }
+            if expected != actual:
+                diff = set(expected.items()) ^ set(actual.items())
+                problems.append(f"totals 不一致 {len(diff)} 处，例如 {sorted(diff)[:3]}")
+
+            keys = self._conn.execute("SELECT DISTINCT language, since FROM daily").fetchall()
+            for key in keys:
+                latest = self._conn.execute(
+                    "SELECT MAX(date) FROM daily WHERE language = ? AND since = ?", key).fetchone()[0]
+                for window in self.windows:
+                    cutoff = (date.fromisoformat(latest) - timedelta(days=window)).isoformat()
+                    expected = {
+                        (o, r): (s, d) for o, r, s, d in self._conn.execute(
+                            "SELECT owner, repo, SUM(stars_today), COUNT(*) FROM daily "
+                            "WHERE language = ? AND since = ? AND date > ? GROUP BY owner, repo",
+                            (*key, cutoff))
+                    }
+                    actual = {
+                        (o, r): (s, d) for o, r, s, d in self._conn.execute(
+                            "SELECT owner, repo, stars, days FROM window_sums "
+                            "WHERE language = ? AND since = ? AND window = ?", (*key, window))
+                    }
+                    if expected != actual:
+                        problems.append(f"{key[0]}/{key[1]} {window} 天窗口和不一致")
+                    top = sorted(((-s, o, r) for (o, r), (s, _) in expected.items()))[:self.top_k]
+                    board = self._conn.execute(
+                        "SELECT owner, repo, stars FROM leaderboard WHERE language = ? AND since = ? "
+                        "AND window = ? ORDER BY rank", (*key, window)).fetchall()
+                    if [(o, r, -s) for s, o, r in top] != [tuple(b) for b in board]:
+                        problems.append(f"{key[0]}/{key[1]} {window} 天排行榜不一致")
+
+        for p in problems:
+            logger.error(f"校验失败：{p}")
+        if not problems:
+            logger.info("滚动聚合校验通过")
+        return problems
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="滚动聚合工具")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("verify", help="与全量重算结果比对")
+    p = sub.add_parser("top", help="读取物化排行榜")
+    p.add_argument("--language", default="python")
+    p.add_argument("--since", default="daily")
+    p.add_argument("--window", type=int, default=7)
+    args = arg_parser.parse_args()
+
+    aggregates = RollingAggregates()
+    if args.command == "verify":
+        aggregates.verify()
+    else:
+        for item in aggregates.leaderboard(args.language, args.since, args.window):
+            print(item)
+    aggregates.close()
@@ -14,7 +14,7 @@ conda activate "$CONDAENV"
 # 切换到脚本所在目录，防止 cron 定时任务时路径错误
 cd "$(dirname "$0")"
 
-# 运行的脚本
-python main.py
+# 运行的脚本（传入 serve 则以常驻模式运行，替代 cron）
+python main.py "$@"
 
 exit 0
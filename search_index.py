@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : search_index.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 趋势历史的全文 / 标签倒排索引（SQLite FTS5），支持中文描述，按日期、语言、榜单过滤的排序查询
+"""
+
+import os
+import re
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import date, timedelta
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
+from config_set import config
+from log_utils import init_logger
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+# 连续的中日韩字符 / 连续的字母数字
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+")
+_WORD = re.compile(r"[0-9a-z]+")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def _cjk_bigrams(run: str) -> List[str]:
+    """中文没有空格分词，按重叠二元组切分：“向量数据库” -> 向量 量数 数据 据库；单字保留原样"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str, split_camel: bool = False) -> List[str]:
+    """
+    索引与查询共用的分词：英文数字按非字母数字切开并转小写，中日韩字符切成二元组。
+    split_camel 用于仓库名 / 用户名，LangChain 额外产出 lang、chain。
+    """
+    if not text:
+        return []
+    tokens = []
+    for piece in _CJK_RUN.split(text):
+        if split_camel:
+            for word in re.findall(r"[0-9A-Za-z]+", piece):
+                tokens.append(word.lower())
+                parts = _CAMEL.findall(word)
+                if len(parts) > 1:
+                    tokens.extend(p.lower() for p in parts)
+        else:
+            tokens.extend(_WORD.findall(piece.lower()))
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(_cjk_bigrams(run))
+    return tokens
+
+
+def _phrase(tokens: Iterable[str]) -> str:
+    return '"' + " ".join(t.replace('"', '') for t in tokens) + '"'
+
+
+def build_match(query: str) -> str:
+    """
+    把用户查询转成 FTS5 MATCH 表达式：
+    - “|” 或 “ OR ” 分隔的各部分之间为或，部分内的词之间为与
+    - 中文词转成二元组短语，单个汉字用前缀匹配
+    - topic:xxx 只匹配标签，词尾 * 为前缀匹配
+    """
+    alternatives = []
+    for part in re.split(r"\s+OR\s+|\|", query):
+        terms = []
+        for word in part.split():
+            column = ""
+            if word.lower().startswith("topic:"):
+                column, word = "topics : ", word[6:]
+            prefix = word.endswith("*")
+            for run in _CJK_RUN.findall(word):
+                grams = _cjk_bigrams(run)
+                terms.append(column + (_phrase(grams) + "*" if len(run) == 1 else _phrase(grams)))
+            ascii_tokens = _WORD.findall(_CJK_RUN.sub(" ", word).lower())
+            if column and len(ascii_tokens) > 1:
+                # 标签 vector-database 按短语匹配
+                terms.append(column + _phrase(ascii_tokens))
+            else:
+                terms.extend(column + _phrase([t]) + ("*" if prefix and i == len(ascii_tokens) - 1 else "")
+                             for i, t in enumerate(ascii_tokens))
+        if terms:
+            alternatives.append("(" + " AND ".join(terms) + ")")
+    return " OR ".join(alternatives)
+
+
+class SearchIndex:
+    """
+    - repos:       每个仓库一行，保存最新的描述、标签与上榜过的月份
+    - repo_fts:    FTS5 倒排索引，rowid 即 repos.id，各列存放 tokenize 之后以空格连接的词；
+                   months 列存放 m202405 这样的月份词，日期范围查询先在倒排表里按月份剪枝，
+                   不必对多年来所有匹配的仓库逐个查上榜记录
+    - appearances: 每次上榜一行，用于按日期、语言、榜单精确过滤并统计上榜天数 / 新增 star
+    保存快照时增量更新：描述、标签没变且本月已上过榜的仓库只写 appearances，不动倒排索引。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS repos (
+            id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL, repo TEXT NOT NULL, url TEXT NOT NULL,
+            desc TEXT NOT NULL, topics TEXT NOT NULL, months TEXT NOT NULL,
+            UNIQUE (owner, repo)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS repo_fts USING fts5(
+            name, desc, topics, months, tokenize = 'porter unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS appearances (
+            repo_id INTEGER NOT NULL, date TEXT NOT NULL, language TEXT NOT NULL, since TEXT NOT NULL,
+            rank INTEGER NOT NULL, stars_today INTEGER NOT NULL,
+            PRIMARY KEY (repo_id, date, language, since)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_appearances_list ON appearances(language, since, date);
+        CREATE INDEX IF NOT EXISTS idx_appearances_date ON appearances(date);
+    """
+    # bm25 列权重：名称 > 标签 > 描述，月份列不参与相关度
+    WEIGHTS = (4.0, 1.0, 2.0, 0.0)
+    # 查询范围超过这么多个月时不再按月份剪枝，直接在连接时按日期过滤
+    MAX_PRUNE_MONTHS = 24
+    # search() 用 MATERIALIZED CTE，需要 SQLite 3.35 及以上
+    MIN_SQLITE_VERSION = (3, 35, 0)
+
+    def __init__(self, path: Optional[Path] = None):
+        # 构造时就检查，旧版本 SQLite 上由调用方直接关闭搜索，而不是每次查询都报错
+        if sqlite3.sqlite_version_info < self.MIN_SQLITE_VERSION:
+            raise RuntimeError(f"搜索索引需要 SQLite >= {'.'.join(map(str, self.MIN_SQLITE_VERSION))}，"
+                               f"当前为 {sqlite3.sqlite_version}")
+        self.path = Path(path or config.base_dir / "search_index.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    # —— 增量更新 ——
+    def _upsert_repo(self, r: Dict, month: str) -> int:
+        owner, repo = r["owner"], r["repo"]
+        desc = r.get("desc") or ""
+        row = self._conn.execute(
+            "SELECT id, desc, topics, months FROM repos WHERE owner = ? AND repo = ?", (owner, repo)
+        ).fetchone()
+        # 趋势页快照不带标签，沿用之前补全时记下的
+        topics = " ".join(r.get("topics") or []) or (row[2] if row else "")
+        months = row[3].split() if row else []
+        if month not in months:
+            months = sorted(months + [month])
+        months = " ".join(months)
+        if row and (row[1], row[2], row[3]) == (desc, topics, months):
+            return row[0]
+        if row:
+            repo_id = row[0]
+            self._conn.execute("UPDATE repos SET url = ?, desc = ?, topics = ?, months = ? WHERE id = ?",
+                               (r.get("url") or "", desc, topics, months, repo_id))
+            self._conn.execute("DELETE FROM repo_fts WHERE rowid = ?", (repo_id,))
+        else:
+            repo_id = self._conn.execute(
+                "INSERT INTO repos (owner, repo, url, desc, topics, months) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, repo, r.get("url") or "", desc, topics, months),
+            ).lastrowid
+        self._conn.execute(
+            "INSERT INTO repo_fts (rowid, name, desc, topics, months) VALUES (?, ?, ?, ?, ?)",
+            (repo_id, " ".join(tokenize(f"{owner} {repo}", split_camel=True)),
+             " ".join(tokenize(desc)), " ".join(tokenize(topics.replace("-", " "))), months),
+        )
+        return repo_id
+
+    @staticmethod
+    def _month_token(date_str: str) -> str:
+        return "m" + date_str[:7].replace("-", "")
+
+    def _month_filter(self, start: Optional[str], end: Optional[str]) -> str:
+        """[start, end] 覆盖的月份词组成的 MATCH 子句；范围不限或太长时返回空串"""
+        if start is None:
+            return ""
+        if end is None:
+            end = self._conn.execute("SELECT MAX(date) FROM appearances").fetchone()[0] or start
+        year, month = int(start[:4]), int(start[5:7])
+        tokens = []
+        while f"{year:04d}-{month:02d}" <= end[:7]:
+            tokens.append(f"m{year:04d}{month:02d}")
+            if len(tokens) > self.MAX_PRUNE_MONTHS:
+                return ""
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return "months : (" + " OR ".join(tokens) + ")" if tokens else ""
+
+    def _add(self, record: Dict):
+        repos = record.get("repos") or []
+        if not repos:
+            return
+        date_str, since = record["date"], record.get("type") or repos[0].get("since", "")
+        language = repos[0].get("language", "")
+        # 同一天重复保存同一榜单时以最后一次为准
+        self._conn.execute("DELETE FROM appearances WHERE language = ? AND since = ? AND date = ?",
+                           (language, since, date_str))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO appearances VALUES (?, ?, ?, ?, ?, ?)",
+            [(self._upsert_repo(r, self._month_token(date_str)), date_str, language, since, rank, r.get("stars_today", 0))
+             for rank, r in enumerate(repos, 1)],
+        )
+
+    def add_snapshot(self, record: Dict):
+        """记入一个快照（HistoryRecorder 保存的 {date, type, repos}），单事务完成"""
+        with self._lock, self._conn:
+            self._add(record)
+        logger.debug(f"搜索索引已更新：{record.get('date')} {record.get('type')}")
+
+    def rebuild(self, store=None) -> int:
+        """清空后从历史存储重建，返回快照数"""
+        from history_store import get_history_store
+
+        count = 0
+        # 传入的 store 由调用方关闭，这里创建的用完即关
+        with nullcontext(store) if store else get_history_store(config.history_backends[0]) as store, \
+                self._lock, self._conn:
+            self._conn.execute("DELETE FROM appearances")
+            self._conn.execute("DELETE FROM repo_fts")
+            self._conn.execute("DELETE FROM repos")
+            for record in store.iter_snapshots():
+                self._add(record)
+                count += 1
+            # 合并倒排索引的分段，查询时少读几个 b-tree
+            self._conn.execute("INSERT INTO repo_fts (repo_fts) VALUES ('optimize')")
+        logger.info(f"搜索索引重建完成：{count} 个快照")
+        return count
+
+    # —— 查询 ——
+    def search(self, query: str, start: Optional[str] = None, end: Optional[str] = None,
+               days: Optional[int] = None, language: Optional[str] = None, since: Optional[str] = None,
+               limit: int = 20) -> List[Dict]:
+        """
+        全文检索 owner / repo / desc / topics，只返回在 [start, end] 内、指定榜单上出现过的仓库。
+        days 表示最近 N 天（以索引中最新日期为终点），与 start 同时给出时以 days 为准。
+        排序：bm25 相关度按区间内上榜天数加权（最多 30 天），同分按区间内新增 star 排。
+        """
+        match = build_match(query)
+        if not match:
+            return []
+        with self._lock:
+            if days:
+                latest = self._conn.execute("SELECT MAX(date) FROM appearances").fetchone()[0]
+                if latest is None:
+                    return []
+                end = end or latest
+                start = (date.fromisoformat(end) - timedelta(days=days - 1)).isoformat()
+            months = self._month_filter(start, end)
+            if months:
+                match = f"({match}) AND {months}"
+            filters, params = [], [*self.WEIGHTS, match]
+            for clause, value in (("a.date >= ?", start), ("a.date <= ?", end),
+                                  ("a.language = ?", language), ("a.since = ?", since)):
+                if value is not None:
+                    filters.append(clause)
+                    params.append(value)
+            rows = self._conn.execute(
+                # MATERIALIZED：bm25 只能在 FTS 查询本身里求值，不能让 CTE 被展开进连接
+                "WITH hits AS MATERIALIZED (SELECT rowid AS id, bm25(repo_fts, ?, ?, ?, ?) AS score "
+                "FROM repo_fts WHERE repo_fts MATCH ?) "
+                "SELECT r.owner, r.repo, r.url, r.desc, r.topics, h.score, "
+                "COUNT(DISTINCT a.date) AS days, SUM(a.stars_today) AS stars, "
+                "MIN(a.rank), MIN(a.date), MAX(a.date) "
+                "FROM hits h JOIN repos r ON r.id = h.id JOIN appearances a ON a.repo_id = h.id "
+                + ("WHERE " + " AND ".join(filters) + " " if filters else "") +
+                "GROUP BY h.id ORDER BY h.score * (1 + 0.1 * MIN(days, 30)), stars DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        keys = ("owner", "repo", "url", "desc", "topics", "score", "days", "stars", "best_rank",
+                "first_date", "last_date")
+        results = [dict(zip(keys, row)) for row in rows]
+        for item in results:
+            item["topics"] = item["topics"].split()
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            repos = self._conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+            appearances = self._conn.execute("SELECT COUNT(*) FROM appearances").fetchone()[0]
+        return {"repos": repos, "appearances": appearances, "bytes": self.path.stat().st_size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="趋势历史搜索")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="从历史存储重建索引")
+    p = sub.add_parser("query", help="检索，例如 'llm agent | 向量数据库' 或 topic:vector-database")
+    p.add_argument("query")
+    p.add_argument("--start")
+    p.add_argument("--end")
+    p.add_argument("--days", type=int)
+    p.add_argument("--language")
+    p.add_argument("--since")
+    p.add_argument("--limit", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    index = SearchIndex()
+    if args.command == "rebuild":
+        index.rebuild()
+    else:
+        for item in index.search(args.query, args.start, args.end, args.days, args.language, args.since,
+                                 args.limit):
+            print(f"{item['owner']}/{item['repo']}  上榜 {item['days']} 天  ⭐ {item['stars']}  "
+                  f"{item['first_date']} ~ {item['last_date']}  {item['desc'][:60]}")
+    index.close()
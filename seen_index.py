@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : seen_index.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 已推送仓库索引（按代轮换的 Bloom 过滤器）与上次报告状态，用于生成 新上榜 / 上升 / 掉榜 报告
+"""
+
+import os
+import math
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+from config_set import config
+from log_utils import init_logger
+from small_utils import get_current_date
+
+module_name = os.path.splitext(os.path.basename(__file__))[0]
+logger = init_logger('github', module_name)
+
+
+class BloomFilter:
+    """
+    定长 Bloom 过滤器：capacity 个元素时误判率约为 error_rate，只会把没见过的误判为见过。
+    k 个哈希位由一次 blake2b 摘要双重哈希得到。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, bits: Optional[bytearray] = None,
+                 count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> bool:
+        """加入元素，返回之前是否（可能）已存在"""
+        existed = True
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & mask:
+                existed = False
+                self.bits[byte] |= mask
+        if not existed:
+            self.count += 1
+        return existed
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class SeenIndex:
+    """
+    每个 (language, since, channel) 一组 Bloom 过滤器，按 generation_days 天分代：
+    - 新元素写入当前代；查询时检查保留的所有代
+    - 超过 generations 代时丢弃最老的一代（压缩），“见过”的含义变为“最近 N 代内推送过”
+    因此每个榜单的内存与单次查询成本固定，不随年份增长。
+    另外保存每个榜单上次报告的名次，用于计算上升 / 掉榜。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS generations (
+            list_key TEXT NOT NULL,
+            started  TEXT NOT NULL,
+            count    INTEGER NOT NULL,
+            bits     BLOB NOT NULL,
+            PRIMARY KEY (list_key, started)
+        );
+        CREATE TABLE IF NOT EXISTS last_report (
+            list_key TEXT PRIMARY KEY,
+            date     TEXT NOT NULL,
+            ranks    TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: Optional[Path] = None, generation_days: Optional[int] = None,
+                 generations: Optional[int] = None, capacity: Optional[int] = None,
+                 error_rate: Optional[float] = None):
+        self.path = Path(path or config.base_dir / "seen_index.sqlite3")
+        self.generation_days = generation_days or config.seen_generation_days
+        self.generations = generations or config.seen_generations
+        self.capacity = capacity or config.seen_capacity
+        self.error_rate = error_rate or config.seen_error_rate
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, List] = {}  # list_key -> [(started, BloomFilter)]，新的在前
+
+    @staticmethod
+    def list_key(language: str, since: str, channel: str = "default") -> str:
+        return f"{language or 'all'}/{since}/{channel}"
+
+    def _filters(self, list_key: str) -> List:
+        filters = self._cache.get(list_key)
+        if filters is None:
+            rows = self._conn.execute(
+                "SELECT started, count, bits FROM generations WHERE list_key = ? ORDER BY started DESC", (list_key,)
+            ).fetchall()
+            filters = []
+            for started, count, bits in rows:
+                bloom = BloomFilter(self.capacity, self.error_rate, bytearray(bits), count)
+                if len(bits) != (bloom.size + 7) // 8:
+                    # 容量 / 误判率配置改过，旧位图无法复用
+                    logger.warning(f"[{list_key}] {started} 这一代索引参数与当前配置不符，已忽略")
+                    continue
+                filters.append((started, bloom))
+            self._cache[list_key] = filters
+        return filters
+
+    def _current(self, list_key: str, date_str: str) -> BloomFilter:
+        """当前代的过滤器；到了新一代时新建，并丢弃超出保留数的旧代"""
+        filters = self._filters(list_key)
+        if filters:
+            started, bloom = filters[0]
+            if date.fromisoformat(date_str) - date.fromisoformat(started) < timedelta(days=self.generation_days):
+                return bloom
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        filters.insert(0, (date_str, bloom))
+        for started, _ in filters[self.generations:]:
+            self._conn.execute("DELETE FROM generations WHERE list_key = ? AND started = ?", (list_key, started))
+            logger.info(f"[{list_key}] 丢弃 {started} 开始的一代索引")
+        del filters[self.generations:]
+        return bloom
+
+    def seen(self, list_key: str, key: str) -> bool:
+        with self._lock:
+            return any(key in bloom for _, bloom in self._filters(list_key))
+
+    def mark(self, list_key: str, keys: Iterable[str], date_str: Optional[str] = None):
+        date_str = date_str or get_current_date()
+        with self._lock:
+            bloom = self._current(list_key, date_str)
+            for key in keys:
+                bloom.add(key)
+            if bloom.count > self.capacity:
+                logger.warning(f"[{list_key}] 当前代已有 {bloom.count} 个元素，超过容量 {self.capacity}，误判率会上升")
+            started = self._filters(list_key)[0][0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (list_key, started, count, bits) VALUES (?, ?, ?, ?)",
+                (list_key, started, bloom.count, bytes(bloom.bits)),
+            )
+            self._conn.commit()
+
+    def last_ranks(self, list_key: str) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute("SELECT ranks FROM last_report WHERE list_key = ?", (list_key,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_ranks(self, list_key: str, ranks: Dict[str, int], date_str: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO last_report (list_key, date, ranks) VALUES (?, ?, ?)",
+                (list_key, date_str or get_current_date(), json.dumps(ranks, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def diff(self, language: str, since: str, repos: List[Dict], channel: str = "default") -> Dict[str, List]:
+        """
+        与已推送记录对比，返回：
+        - new：索引中没有的仓库
+        - climbing：上次报告里也有、名次上升的仓库（附 from_rank / to_rank）
+        - dropped：上次报告里有、本次不在榜的仓库（附上次的 rank）
+        """
+        list_key = self.list_key(language, since, channel)
+        previous = self.last_ranks(list_key)
+        new, climbing, current = [], [], set()
+        for rank, r in enumerate(repos, 1):
+            key = f"{r['owner']}/{r['repo']}"
+            current.add(key)
+            if not self.seen(list_key, key):
+                new.append(r)
+            elif key in previous and rank < previous[key]:
+                climbing.append({**r, "from_rank": previous[key], "to_rank": rank})
+        dropped = [{"repo": key, "rank": rank} for key, rank in sorted(previous.items(), key=lambda kv: kv[1])
+                   if key not in current]
+        return {"new": new, "climbing": climbing, "dropped": dropped}
+
+    def commit(self, language: str, since: str, repos: List[Dict], channel: str = "default",
+               date_str: Optional[str] = None):
+        """报告送达后调用：记入已推送索引并保存本次名次"""
+        list_key = self.list_key(language, since, channel)
+        keys = [f"{r['owner']}/{r['repo']}" for r in repos]
+        self.mark(list_key, keys, date_str)
+        self.save_ranks(list_key, {key: rank for rank, key in enumerate(keys, 1)}, date_str)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(bloom.nbytes for filters in self._cache.values() for _, bloom in filters)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -9,43 +9,49 @@ Description : 一些辅助函数
 
 import os
 import time
+import random
+import threading
 import requests
+from collections import deque
 from datetime import datetime
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from config_set import config
 from log_utils import init_logger
 
 module_name = os.path.splitext(os.path.basename(__file__))[0]
 logger = init_logger('utils', module_name)
 
 
-def ip_test(proxies):
+def _do_test(session_proxies) -> bool:
     """
-    先测试传入的代理 IP 能否正常访问，如果失败，则回退测试直连。
+    用给定的 proxies 测试出口 IP 查询（config.ip_api_url）和 GitHub（config.github_web_url）
+    返回 True/False，表示是否测试成功
     """
+    try:
+        # 测试 IP 信息
+        r = requests.get(config.ip_api_url, proxies=session_proxies, timeout=5)
+        r.raise_for_status()
+        data = r.json()
+        ip = data.get("query")
+        ip = ip.split('.')[:2] + ["xxx", "xxx"]
+        logger.info("当前 IP=%s (%s)", '.'.join(ip), data.get("country"))
 
-    def _do_test(session_proxies):
-        """
-        内部函数：用给定的 proxies 测试 ip-api.com 和 github.com
-        返回 True/False，表示是否测试成功
-        """
-        try:
-            # 测试 IP 信息
-            r = requests.get("http://ip-api.com/json", proxies=session_proxies, timeout=5)
-            r.raise_for_status()
-            data = r.json()
-            ip = data.get("query")
-            ip = ip.split('.')[:2] + ["xxx", "xxx"]
-            logger.info("当前 IP=%s (%s)", '.'.join(ip), data.get("country"))
-
-            # 测试能否访问 GitHub
-            gh = requests.get("https://github.com", proxies=session_proxies, timeout=5)
-            gh.raise_for_status()
-            logger.info("访问 GitHub 成功")
-            return True
-
-        except Exception as e:
-            logger.warning("测试失败: %s", e)
-            return False
+        # 测试能否访问 GitHub
+        gh = requests.get(config.github_web_url, proxies=session_proxies, timeout=5)
+        gh.raise_for_status()
+        logger.info("访问 GitHub 成功")
+        return True
 
+    except Exception as e:
+        logger.warning("测试失败: %s", e)
+        return False
+
+
+def ip_test(proxies):
+    """
+    先测试直连能否正常访问，如果失败，则回退测试传入的代理 IP。
+    """
     # 测试直连
     logger.info("正在测试直连网络...")
     if _do_test(None):
@@ -62,18 +68,209 @@ def ip_test(proxies):
     return False, None
 
 
+class NetworkState:
+    """
+    共享的网络连通性结论：直连和代理两条线路同时探测，结论 (ok, mode) 缓存 ttl 秒。
+    只有真实请求失败时调用 invalidate()，下一次 verdict() 才会重新探测。
+    """
+
+    def __init__(self, proxies, ttl: float = 300):
+        self.proxies = proxies
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._verdict: Optional[Tuple[bool, Optional[str]]] = None
+        self._checked_at = 0.0
+
+    def _probe(self) -> Tuple[bool, Optional[str]]:
+        logger.info("正在同时探测直连与代理线路...")
+        pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            direct = pool.submit(_do_test, None)
+            proxied = pool.submit(_do_test, self.proxies)
+            # 直连优先，代理次之；直连可用时不等待代理探测结束
+            if direct.result():
+                return True, "DIRECT"
+            if proxied.result():
+                return True, "PROXIES"
+        finally:
+            pool.shutdown(wait=False)
+        logger.error("直连与代理均不可用，请检查网络或代理配置")
+        return False, None
+
+    def verdict(self, force: bool = False) -> Tuple[bool, Optional[str]]:
+        """返回 (是否可用, 'DIRECT'/'PROXIES'/None)，缓存有效时不发请求"""
+        with self._lock:
+            fresh = self._verdict is not None and time.monotonic() - self._checked_at < self.ttl
+            if force or not fresh:
+                self._verdict = self._probe()
+                self._checked_at = time.monotonic()
+            return self._verdict
+
+    def invalidate(self):
+        with self._lock:
+            if self._verdict is not None:
+                logger.info("网络结论已失效，下次请求前重新探测")
+            self._verdict = None
+
+
+_network_states: Dict[tuple, NetworkState] = {}
+_network_states_lock = threading.Lock()
+
+
+def get_network_state(proxies, ttl: Optional[float] = None) -> NetworkState:
+    """按代理配置取进程内共享的 NetworkState"""
+    key = tuple(sorted((proxies or {}).items()))
+    with _network_states_lock:
+        if key not in _network_states:
+            _network_states[key] = NetworkState(proxies, ttl or config.network_verdict_ttl)
+        return _network_states[key]
+
+
+class CircuitBreaker:
+    """
+    单条线路（直连 / 代理）的熔断器，进程内所有并发抓取共用：
+    - closed：正常放行；连续失败 threshold 次后 open
+    - open：拒绝请求，backoff 秒后进入 half_open；每次重新 open 退避时间翻倍（不超过 max_backoff），
+      并乘以 0.5~1.5 的随机抖动，避免多个进程同时恢复探测
+    - half_open：只放行一个试探请求，成功则 closed，失败则再次 open
+    同时记录最近的成功耗时，供对冲请求估计 p95。
+    """
+
+    def __init__(self, name: str, threshold: int = 3, backoff: float = 5, max_backoff: float = 300,
+                 window: int = 100):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0  # 连续 open 的次数，决定退避时长
+        self.open_until = 0.0
+        self._trial = False
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        """open 到期后转为 half_open（调用方持有锁）"""
+        if self.state == "open" and time.monotonic() >= self.open_until:
+            self.state, self._trial = "half_open", False
+            logger.info(f"[{self.name}] 熔断到期，放行一个试探请求")
+
+    def available(self) -> bool:
+        """当前能否放行，只查看不占用 half_open 的试探名额"""
+        with self._lock:
+            self._expire()
+            return self.state == "closed" or (self.state == "half_open" and not self._trial)
+
+    def allow(self) -> bool:
+        """放行一个请求；half_open 时占用唯一的试探名额，请求结束后须调用 success / failure / release 之一"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            self._expire()
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """放行的请求没有得出线路好坏的结论（被对手抢先、4xx 等），归还试探名额"""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial = False
+
+    def retry_in(self) -> float:
+        """距离下一次可以放行的秒数"""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.open_until - time.monotonic())
+
+    def success(self, latency: Optional[float] = None):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"[{self.name}] 线路恢复")
+            self.state, self.failures, self.opened, self._trial = "closed", 0, 0, False
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def failure(self) -> bool:
+        """记录一次失败，本次导致熔断打开时返回 True"""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.opened += 1
+                wait = min(self.max_backoff, self.backoff * 2 ** (self.opened - 1)) * random.uniform(0.5, 1.5)
+                self.state, self.open_until, self._trial = "open", time.monotonic() + wait, False
+                logger.warning(f"[{self.name}] 连续失败 {self.failures} 次，熔断 {wait:.1f}s")
+                return True
+            return False
+
+    def p95(self) -> Optional[float]:
+        """最近成功请求耗时的 p95，样本不足 5 个时返回 None"""
+        with self._lock:
+            if len(self._latencies) < 5:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(route: str) -> CircuitBreaker:
+    """按线路名取进程内共享的熔断器，参数取配置 [scraper] breaker_*"""
+    with _breakers_lock:
+        if route not in _breakers:
+            _breakers[route] = CircuitBreaker(route, config.breaker_threshold, config.breaker_backoff,
+                                              config.breaker_max_backoff)
+        return _breakers[route]
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶：rate 个/秒匀速补充，最多积攒 capacity 个。
+    acquire() 在令牌不足时阻塞等待。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """尝试取一个令牌：成功返回 0，否则返回还需等待的秒数"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
 def get_current_date(format_str: str = "%Y-%m-%d") -> str:
     """生成当前日期的格式化字符串"""
     return datetime.now().strftime(format_str)
 
 
 if __name__ == '__main__':
-    # 测试1
-    PROXIES = {
-        "http": "http://127.0.0.1:7890",
-        "https": "http://127.0.0.1:7890",
-    }
-    ip_test(PROXIES)
+    # 测试1：代理取配置 [proxy]
+    ip_test(config.proxies)
 
     # 测试2
     date_str = get_current_date()
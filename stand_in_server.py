@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : stand_in_server.py
+Author      : wzw
+Date Created: 2025/5/18
+Description : 本地替身服务（回放环境），模拟 GitHub 趋势页 / REST / GraphQL、ip-api、Clash 控制器与企业微信 webhook，
+              支持注入延迟、错误与 403 限流，用于离线测试和端到端性能对比
+"""
+
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from pathlib import Path
+from collections import Counter
+from urllib.parse import parse_qs, unquote, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# GraphQL 别名查询：r0: repository(owner: "x", name: "y")
+ALIAS_PATTERN = re.compile(r'(\w+):\s*repository\(owner:\s*("(?:[^"\\]|\\.)*"),\s*name:\s*("(?:[^"\\]|\\.)*")\)')
+
+
+def fake_repo(owner: str, repo: str) -> dict:
+    """根据仓库名生成稳定的假数据（REST 字段格式）"""
+    seed = zlib.crc32(f"{owner}/{repo}".encode())
+    return {
+        "full_name": f"{owner}/{repo}",
+        "stargazers_count": seed % 50000,
+        "forks_count": seed % 5000,
+        "open_issues_count": seed % 300,
+        "subscribers_count": seed % 800,
+        "license": {"name": "MIT License"} if seed % 3 else None,
+        "created_at": "2020-01-01T00:00:00Z",
+        "updated_at": "2025-05-18T00:00:00Z",
+        "pushed_at": "2025-05-18T00:00:00Z",
+        "topics": ["python", f"topic-{seed % 10}"],
+        "homepage": f"https://{owner}.github.io/{repo}" if seed % 2 else None,
+    }
+
+
+def fake_graphql_node(owner: str, repo: str) -> dict:
+    """与 fake_repo 数据一致的 GraphQL Repository 节点"""
+    data = fake_repo(owner, repo)
+    return {
+        "stargazerCount": data["stargazers_count"],
+        "forkCount": data["forks_count"],
+        "issues": {"totalCount": data["open_issues_count"]},
+        "pullRequests": {"totalCount": 0},
+        "watchers": {"totalCount": data["subscribers_count"]},
+        "licenseInfo": data["license"],
+        "createdAt": data["created_at"],
+        "updatedAt": data["updated_at"],
+        "pushedAt": data["pushed_at"],
+        "repositoryTopics": {"nodes": [{"topic": {"name": t}} for t in data["topics"]]},
+        "homepageUrl": data["homepage"],
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """按路径分发请求；名字以 missing 开头的仓库视为不存在"""
+    server: "StandInServer"
+
+    def log_message(self, fmt, *args):
+        # 静默，避免刷屏
+        pass
+
+    def _send_json(self, status: int, body, headers=None):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_html(self, status: int, body: str, headers=None):
+        raw = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _dispatch(self, method: str):
+        start = time.perf_counter()
+        path = urlsplit(self.path).path
+        self.server.record(method, path)
+        for route_method, pattern, handler, github in self.server.routes:
+            m = pattern.fullmatch(path)
+            if route_method == method and m:
+                # 延迟对所有接口生效；错误与 403 只注入 GitHub 类接口，Clash 和 webhook 的故障由各自的参数控制
+                if self.server.inject(self, github):
+                    break
+                handler(self, *m.groups())
+                break
+        else:
+            self._send_json(404, {"message": "Not Found"})
+        self.server.record_timing(path, time.perf_counter() - start)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+
+def _rate_limit(handler: StandInHandler, resource: str) -> bool:
+    """
+    按 Authorization 分别计数，模拟 GitHub 主限流。
+    超出额度时直接回 403 并返回 True；未开启（rate_limit 为 None）时只附带额度头。
+    """
+    server = handler.server
+    token = handler.headers.get("Authorization", "anonymous")
+    with server._lock:
+        key = (token, resource)
+        reset, used = server.rate_windows.get(key, (time.time() + server.rate_reset, 0))
+        if time.time() >= reset:
+            reset, used = time.time() + server.rate_reset, 0
+        limit = server.rate_limit or 5000
+        exceeded = server.rate_limit is not None and used >= limit
+        if not exceeded:
+            used += 1
+        server.rate_windows[key] = (reset, used)
+    handler.rate_headers = {
+        "X-RateLimit-Limit": limit,
+        "X-RateLimit-Remaining": max(0, limit - used),
+        "X-RateLimit-Reset": int(reset) + 1,
+        "X-RateLimit-Resource": resource,
+    }
+    if exceeded:
+        server.record("LIMITED", resource)
+        handler._send_json(403, {"message": "API rate limit exceeded"}, handler.rate_headers)
+    return exceeded
+
+
+def _rest_repo(handler: StandInHandler, owner: str, repo: str):
+    if _rate_limit(handler, "core"):
+        return
+    if repo.startswith("missing"):
+        return handler._send_json(404, {"message": "Not Found"})
+    body = fake_repo(owner, repo)
+    etag = f'"{zlib.crc32(json.dumps(body).encode()):08x}"'
+    # 与 GitHub 一致：条件请求命中返回 304，不计额度
+    if handler.headers.get("If-None-Match") == etag:
+        handler.send_response(304)
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        return
+    handler.server.charge(1)
+    handler._send_json(200, body, {"ETag": etag, "Cache-Control": "private, max-age=0", **handler.rate_headers})
+
+
+def _graphql(handler: StandInHandler):
+    if _rate_limit(handler, "graphql"):
+        return
+    query = handler._read_json().get("query", "")
+    data, errors = {}, []
+    for alias, owner, repo in ALIAS_PATTERN.findall(query):
+        owner, repo = json.loads(owner), json.loads(repo)
+        if repo.startswith("missing"):
+            data[alias] = None
+            errors.append({"type": "NOT_FOUND", "path": [alias]})
+        else:
+            data[alias] = fake_graphql_node(owner, repo)
+    # 小查询按 GitHub 规则最少计 1 点
+    handler.server.charge(1)
+    data["rateLimit"] = {"cost": 1, "remaining": 5000 - handler.server.rate_cost}
+    body = {"data": data}
+    if errors:
+        body["errors"] = errors
+    handler._send_json(200, body, handler.rate_headers)
+
+
+def _trending(handler: StandInHandler, language: str = ""):
+    """趋势页：回放 fixtures 中录制的页面，找不到对应榜单时用任意一个录制页面"""
+    since = parse_qs(urlsplit(handler.path).query).get("since", ["daily"])[0]
+    page = handler.server.trending_page(unquote(language or "all"), since)
+    if page is None:
+        return handler._send_json(404, {"message": "no recorded trending page"})
+    handler._send_html(200, page)
+
+
+def _github_root(handler: StandInHandler):
+    """github.com 首页：网络连通性探测只看状态码"""
+    handler._send_html(200, "<html><title>GitHub</title></html>")
+
+
+def _ip_api(handler: StandInHandler):
+    handler._send_json(200, {"status": "success", "query": "203.0.113.7", "country": "Stand-in"})
+
+
+def _clash_proxies(handler: StandInHandler):
+    server = handler.server
+    proxies = {
+        "GLOBAL": {"type": "Selector", "now": server.clash_selected, "all": list(server.clash_nodes)},
+    }
+    for name, (history_delay, _) in server.clash_nodes.items():
+        proxies[name] = {"type": "Shadowsocks", "history": [{"delay": history_delay}]}
+    handler._send_json(200, {"proxies": proxies})
+
+
+def _clash_delay(handler: StandInHandler, name: str):
+    name = unquote(name)
+    if name not in handler.server.clash_nodes:
+        return handler._send_json(404, {"message": "resource not found"})
+    _, live_delay = handler.server.clash_nodes[name]
+    timeout = int(parse_qs(urlsplit(handler.path).query).get("timeout", ["5000"])[0])
+    # 与 Clash 一致：测速在控制器内部完成，超时或失败返回 503/504
+    if live_delay is None or live_delay > timeout:
+        time.sleep(timeout / 1000)
+        return handler._send_json(504, {"message": "Timeout"})
+    time.sleep(live_delay / 1000)
+    handler._send_json(200, {"delay": live_delay})
+
+
+def _clash_select(handler: StandInHandler, group: str):
+    name = handler._read_json().get("name")
+    if name not in handler.server.clash_nodes:
+        return handler._send_json(400, {"message": "Selector update error: proxy not exist"})
+    handler.server.clash_selected = name
+    handler.send_response(204)
+    handler.end_headers()
+
+
+def _webhook(handler: StandInHandler):
+    """企业微信机器人：markdown 超过 4096 字节返回 40058，每分钟超过限额返回 45009"""
+    server = handler.server
+    key = parse_qs(urlsplit(handler.path).query).get("key", [""])[0]
+    content = handler._read_json().get("markdown", {}).get("content", "")
+    if key in server.webhook_down:
+        return handler._send_json(502, {"errcode": -1, "errmsg": "bad gateway"})
+    if len(content.encode("utf-8")) > 4096:
+        return handler._send_json(200, {"errcode": 40058, "errmsg": "markdown.content exceed max length 4096"})
+    with server._lock:
+        now = time.time()
+        sent = [t for t in server.webhook_sent.get(key, []) if now - t < 60]
+        if len(sent) >= server.webhook_rate_limit:
+            server.requests["LIMITED webhook"] += 1
+            server.webhook_sent[key] = sent
+            return handler._send_json(200, {"errcode": 45009, "errmsg": "api freq out of limit"})
+        server.webhook_sent[key] = sent + [now]
+        server.webhook_messages.append((key, content))
+    handler._send_json(200, {"errcode": 0, "errmsg": "ok"})
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    在后台线程运行的本地 HTTP 服务，可作为上下文管理器使用：
+
+        with StandInServer(latency=0.05) as server:
+            server.point_config(config)  # 或只设置 config.github_api_base = server.url
+
+    可注入：
+    - latency ± jitter 秒的延迟（所有接口），其中 slow_rate 比例的请求改为 slow_latency 秒（长尾）
+    - GitHub 类接口（趋势页、首页、REST、GraphQL）error_rate 比例的 502
+    - forbidden_rate 比例的 403（与 GitHub 限流响应一致，带 X-RateLimit-Remaining: 0 与 Retry-After）
+    注入用固定种子的随机数，同样的请求序列结果可复现。
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, forbidden_rate: float = 0.0, fixtures_dir: Path = None,
+                 seed: int = 0, slow_rate: float = 0.0, slow_latency: float = 0.0):
+        super().__init__((host, port), StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.forbidden_rate = forbidden_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._rng = random.Random(seed)
+        self.requests = Counter()
+        self.timings = []  # (path, 服务端耗时秒)，含注入的延迟
+        self.rate_cost = 0
+        self._lock = threading.Lock()
+
+        # 录制的趋势页：{language}_{since}.html
+        self.fixtures_dir = Path(fixtures_dir or Path(__file__).parent / "fixtures" / "trending")
+        self._pages = {}
+
+        # 模拟主限流：每个 token 每 rate_reset 秒最多 rate_limit 次（None 为不限）
+        self.rate_limit = None
+        self.rate_reset = 3600
+        self.rate_windows = {}
+        self._thread = None
+
+        # Clash 节点：名称 -> (历史延迟 ms, 实时测速延迟 ms，None 表示不可用)
+        self.clash_nodes = {}
+        self.clash_selected = None
+
+        # 企业微信 webhook：收到的 (key, content)、每个 key 每分钟限额、不可用的 key
+        self.webhook_messages = []
+        self.webhook_sent = {}
+        self.webhook_rate_limit = 20
+        self.webhook_down = set()
+
+        # (method, 路径, 处理函数, 是否为 GitHub 类接口（参与故障注入）)
+        self.routes = [
+            ("GET", re.compile(r"/"), _github_root, True),
+            ("GET", re.compile(r"/trending(?:/([^/]*))?"), _trending, True),
+            ("GET", re.compile(r"/repos/([^/]+)/([^/]+)"), _rest_repo, True),
+            ("POST", re.compile(r"/graphql"), _graphql, True),
+            ("GET", re.compile(r"/json"), _ip_api, False),
+            ("GET", re.compile(r"/proxies"), _clash_proxies, False),
+            ("GET", re.compile(r"/proxies/([^/]+)/delay"), _clash_delay, False),
+            ("PUT", re.compile(r"/proxies/([^/]+)"), _clash_select, False),
+            ("POST", re.compile(r"/cgi-bin/webhook/send"), _webhook, False),
+        ]
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def point_config(self, config):
+        """把 config 中所有外部地址指向本服务：GitHub 网页 / API、ip-api、Clash 控制器与一个 webhook"""
+        config.github_web_url = self.url
+        config.github_api_base = self.url
+        config.ip_api_url = f"{self.url}/json"
+        config.clash_api_url = self.url
+        config.qiwx_webhook_urls = [f"{self.url}/cgi-bin/webhook/send?key=replay"]
+
+    def trending_page(self, language: str, since: str):
+        key = (language, since)
+        if key not in self._pages:
+            path = self.fixtures_dir / f"{language}_{since}.html"
+            if not path.exists():
+                path = next(iter(sorted(self.fixtures_dir.glob("*.html"))), None)
+            self._pages[key] = path.read_text(encoding="utf-8") if path else None
+        return self._pages[key]
+
+    def inject(self, handler: StandInHandler, failures: bool = True) -> bool:
+        """按配置注入延迟与故障，已直接回复时返回 True"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)) if self.latency else 0.0
+            if self.slow_rate and self._rng.random() < self.slow_rate:
+                delay = self.slow_latency
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if not failures:
+            return False
+        if roll < self.forbidden_rate:
+            self.record("INJECTED", "403")
+            handler._send_json(403, {"message": "API rate limit exceeded"},
+                               {"X-RateLimit-Remaining": 0, "X-RateLimit-Reset": int(time.time()) + 1,
+                                "Retry-After": 1})
+            return True
+        if roll < self.forbidden_rate + self.error_rate:
+            self.record("INJECTED", "502")
+            handler._send_json(502, {"message": "Bad Gateway"})
+            return True
+        return False
+
+    def record(self, method: str, path: str):
+        with self._lock:
+            self.requests[f"{method} {path}"] += 1
+
+    def record_timing(self, path: str, seconds: float):
+        with self._lock:
+            self.timings.append((path, seconds))
+
+    def charge(self, cost: int):
+        with self._lock:
+            self.rate_cost += cost
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.timings.clear()
+            self.rate_cost = 0
+            self.rate_windows.clear()
+            self.webhook_messages.clear()
+            self.webhook_sent.clear()
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="本地替身服务：在配置 [endpoints] / [github] api_base / "
+                                                     "[clash] api_url / [notify] 中填入打印出的地址即可离线运行")
+    arg_parser.add_argument("--port", type=int, default=0)
+    arg_parser.add_argument("--latency", type=float, default=0.0)
+    arg_parser.add_argument("--jitter", type=float, default=0.0)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--forbidden-rate", type=float, default=0.0)
+    args = arg_parser.parse_args()
+    with StandInServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                       error_rate=args.error_rate, forbidden_rate=args.forbidden_rate) as srv:
+        srv.clash_nodes = {f"node-{i}": (100 + i * 50, 100 + i * 50) for i in range(5)}
+        srv.clash_selected = "node-0"
+        print(f"stand-in server running at {srv.url}, Ctrl+C 退出")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
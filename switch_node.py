@@ -9,8 +9,13 @@ Description : Add your script's purpose here.
 import time
 import random
 import requests
+import threading
 import urllib.parse
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from config_set import config
 from log_utils import init_logger
+from metrics import metrics
 
 
 class ClashManager:
@@ -25,6 +30,12 @@ class ClashManager:
             max_delay=1000,
             min_limit=5,
             exclude_nodes=None,
+            probe_url="https://github.com",
+            ip_api_url="http://ip-api.com/json",
+            probe_timeout=2000,
+            probe_workers=16,
+            ewma_alpha=0.3,
+            top_n=3,
     ):
         # 使用类名创建 logger，输出时会带上类名作为日志源
         self.logger = init_logger('github', self.__class__.__name__)
@@ -59,6 +70,18 @@ class ClashManager:
         # 当前已切换到的节点名称，初始时为空
         self.cur_node = None
 
+        # 测速配置：通过 Clash 的 /proxies/{name}/delay 接口并发测速
+        self.probe_url = probe_url
+        # 出口 IP 查询地址（ip_test 使用）
+        self.ip_api_url = ip_api_url
+        self.probe_timeout = probe_timeout
+        self.probe_workers = probe_workers
+        # 评分缓存：节点 -> {ewma 延迟, 累计失败, 连续失败, 更新时间}
+        self.ewma_alpha = ewma_alpha
+        self.top_n = top_n
+        self.scores: Dict[str, Dict] = {}
+        self._scores_lock = threading.Lock()
+
     # 显示所有策略组及其所有节点和状态
     def show_group(self):
         res = requests.get(f"{self.api}/proxies", headers=self.headers)
@@ -91,18 +114,12 @@ class ClashManager:
         self.logger.info("有效节点列表: %s", valid)
         return valid
 
-    # 随机切换到另一个节点
-    def change_random_node(self):
-        candidates = self.get_all_nodes()
-        if len(candidates) < self.min_limit:
-            self.logger.error("有效节点不足(%d)，无法切换。", len(candidates))
-            return False
-
-        sel = random.choice(candidates)
+    # 切换策略组到指定节点
+    def _switch_to(self, sel):
         payload = {"name": sel}
         group = urllib.parse.quote(self.group_map[self.selector])
         res = requests.put(f"{self.api}/proxies/{group}",
-                           headers=self.headers, json=payload)
+                           headers=self.headers, json=payload, timeout=5)
         if res.status_code == 204:
             self.cur_node = sel
             self.logger.info("切换到节点: %s", sel)
@@ -111,12 +128,110 @@ class ClashManager:
             self.logger.error("切换节点失败: %s", res.text)
             return False
 
+    # 随机切换到另一个节点
+    def change_random_node(self):
+        candidates = self.get_all_nodes()
+        if len(candidates) < self.min_limit:
+            self.logger.error("有效节点不足(%d)，无法切换。", len(candidates))
+            return False
+
+        sel = random.choice(candidates)
+        return self._switch_to(sel)
+
+    # 记录一次测速/使用结果，更新 EWMA 延迟与失败计数
+    def _record(self, node, delay: Optional[int]):
+        with self._scores_lock:
+            score = self.scores.setdefault(node, {"ewma": None, "failures": 0, "streak": 0, "updated": 0.0})
+            # 失败按超时值计入 EWMA，使不稳定的节点排名逐渐靠后
+            value = delay if delay else self.probe_timeout
+            score["ewma"] = value if score["ewma"] is None else (
+                    self.ewma_alpha * value + (1 - self.ewma_alpha) * score["ewma"])
+            if delay:
+                score["streak"] = 0
+            else:
+                score["failures"] += 1
+                score["streak"] += 1
+            score["updated"] = time.time()
+
+    def mark_failed(self, node=None):
+        """外部请求经某节点失败时调用（默认当前节点）"""
+        node = node or self.cur_node
+        if node:
+            self._record(node, None)
+
+    def _score(self, node) -> float:
+        """分数越低越好：EWMA 延迟，连续失败每次加罚一个超时值"""
+        s = self.scores.get(node)
+        if not s or s["ewma"] is None:
+            return float("inf")
+        return s["ewma"] + s["streak"] * self.probe_timeout
+
+    # 通过 Clash 接口测单个节点延迟，失败返回 None
+    def probe_delay(self, node) -> Optional[int]:
+        name = urllib.parse.quote(node, safe="")
+        try:
+            res = requests.get(f"{self.api}/proxies/{name}/delay", headers=self.headers,
+                               params={"url": self.probe_url, "timeout": self.probe_timeout},
+                               timeout=self.probe_timeout / 1000 + 2)
+            delay = res.json().get("delay") if res.status_code == 200 else None
+        except Exception as e:
+            self.logger.warning("节点 %s 测速出错: %s", node, e)
+            delay = None
+        self._record(node, delay)
+        return delay
+
+    # 并发测速所有候选节点
+    def probe_nodes(self, nodes: List[str]) -> Dict[str, Optional[int]]:
+        if not nodes:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.probe_workers, len(nodes))) as pool:
+            return dict(zip(nodes, pool.map(self.probe_delay, nodes)))
+
+    def ranked_nodes(self, nodes: List[str]) -> List[str]:
+        return sorted(nodes, key=self._score)
+
+    # 测速后切换到最优节点（mode='best'）或在前 top_n 中按延迟加权随机（mode='weighted'）
+    def change_best_node(self, mode="best"):
+        start = time.perf_counter()
+        if self.cur_node:
+            # 需要切换说明当前节点出了问题
+            self.mark_failed(self.cur_node)
+
+        candidates = self.get_all_nodes()
+        if len(candidates) < self.min_limit:
+            self.logger.error("有效节点不足(%d)，无法切换。", len(candidates))
+            return False
+
+        delays = self.probe_nodes(candidates)
+        alive = [n for n in self.ranked_nodes(candidates) if delays.get(n)]
+        if not alive:
+            self.logger.error("所有候选节点测速均失败，无法切换。")
+            return False
+
+        top = alive[:self.top_n]
+        if mode == "weighted" and len(top) > 1:
+            sel = random.choices(top, weights=[1 / max(self._score(n), 1) for n in top])[0]
+        else:
+            sel = top[0]
+        cost = time.perf_counter() - start
+        self.logger.info("节点测速 %d 个，可用 %d 个，选中 %s（EWMA %.0fms），选择耗时 %.2fs",
+                         len(candidates), len(alive), sel, self.scores[sel]["ewma"], cost)
+        return self._switch_to(sel)
+
+    # 按配置的方式切换节点：random / best / weighted
+    @metrics.timed("node_switch")
+    def change_node(self, mode="best"):
+        metrics.inc("node_switches_total", mode=mode)
+        if mode == "random":
+            return self.change_random_node()
+        return self.change_best_node(mode)
+
     # 测试当前 IP
     def ip_test(self):
         self.logger.info("正在测试当前 IP...")
         time.sleep(1)
         try:
-            r = requests.get("http://ip-api.com/json", proxies=self.proxies, timeout=5)
+            r = requests.get(self.ip_api_url, proxies=self.proxies, timeout=5)
             data = r.json()
             self.logger.info("IP=%s, Country=%s", data.get("query"), data.get("country"))
         except Exception as e:
@@ -124,14 +239,14 @@ class ClashManager:
 
 
 if __name__ == '__main__':
-    # 创建 ClashManager 实例
-    group_map = {
-        # "GLOBAL": "FlyintPro",
-        # "GLOBAL": "蛋挞云",
-        "GLOBAL": "两元店",
-        # "GLOBAL": "🌀 手动选择",
-    }
-    node_manager = ClashManager(group_map=group_map)
+    # 创建 ClashManager 实例：控制器地址、策略组与出口 IP 查询地址均取配置
+    node_manager = ClashManager(
+        clash_api_url=config.clash_api_url,
+        group_map={"GLOBAL": config.group_name},
+        secret=config.clash_secret,
+        probe_url=config.github_web_url,
+        ip_api_url=config.ip_api_url,
+    )
     node_manager.show_group()
     node_manager.change_random_node()
     node_manager.ip_test()
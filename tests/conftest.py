@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config_set import config  # noqa: E402
+
+FIXTURES = ROOT / "fixtures"
+
+
+@pytest.fixture(autouse=True)
+def base_dir(tmp_path, monkeypatch):
+    """所有数据文件（历史、缓存、索引）写到每个用例独立的临时目录"""
+    monkeypatch.setattr(config, "base_dir", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """启动本地替身服务，并把 config 中的外部地址都指向它；共享的 HTTP 缓存每个用例重新创建"""
+    import http_cache
+    from stand_in_server import StandInServer
+
+    monkeypatch.setattr(http_cache, "_shared_cache", None)
+    for name in ("github_web_url", "github_api_base", "ip_api_url", "clash_api_url", "qiwx_webhook_urls"):
+        monkeypatch.setattr(config, name, getattr(config, name))
+    with StandInServer() as server:
+        server.point_config(config)
+        yield server
@@ -0,0 +1,18 @@
+import warnings
+
+from analyzer import TrendMatrix
+
+
+def _entry(repo, date, stars, rank=1):
+    return date, rank, "o", repo, "python", "daily", stars
+
+
+def test_window_summary_has_no_empty_slice_warning():
+    matrix = TrendMatrix.from_entries([_entry("a", "2025-05-01", 10), _entry("a", "2025-05-02", 20),
+                                       _entry("b", "2025-05-01", 5)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        summary = matrix.window("2025-05-02").summary()
+    by_repo = {row["repo"]: row for row in summary}
+    assert by_repo["o/a"]["mean_velocity"] == 20.0
+    assert by_repo["o/b"]["mean_velocity"] == 0.0
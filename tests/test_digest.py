@@ -0,0 +1,17 @@
+from history_store import SqliteHistoryStore
+from output_generator import OutputGenerator
+
+
+def _record(date, language, stars_today):
+    return {"date": date, "type": "daily",
+            "repos": [{"owner": "o", "repo": "r", "url": "u", "desc": "", "language": language,
+                       "since": "daily", "stars_today": stars_today}]}
+
+
+def test_repo_on_all_and_language_lists_counts_once_per_day(tmp_path):
+    with SqliteHistoryStore(tmp_path / "h.sqlite3") as store:
+        for date in ("2025-04-01", "2025-04-02"):
+            store.save_record(_record(date, "", 10))
+            store.save_record(_record(date, "python", 12))
+        digest = OutputGenerator.build_digest(store)
+    assert [(r["repo"], r["stars"], r["days"]) for r in digest] == [("r", 24, 2)]
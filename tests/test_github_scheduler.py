@@ -0,0 +1,75 @@
+import time
+
+import pytest
+import requests
+
+from github_scheduler import GitHubScheduler
+
+
+class _Session:
+    """按顺序回放 (状态码, 响应头[, 响应体]) ；超出后重复最后一个"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def mount(self, *args):
+        pass
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.calls.append(headers.get("Authorization"))
+        status, resp_headers, *body = self.responses[min(len(self.calls), len(self.responses)) - 1]
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers.update({k: str(v) for k, v in resp_headers.items()})
+        if body:
+            resp._content = body[0]
+        else:
+            resp._content = b'{"message": "API rate limit exceeded"}' if status != 200 else b"{}"
+        return resp
+
+
+def _scheduler(session, tokens=("t1",), max_wait=0.5):
+    scheduler = GitHubScheduler(list(tokens), rate_per_sec=1000, burst=1000, max_wait=max_wait, session=session)
+    scheduler.MIN_BACKOFF = 0.05
+    return scheduler
+
+
+def test_stale_reset_403_backs_off_and_gives_up():
+    # 重置时间已过去的主限流响应：不能原地空转
+    session = _Session((403, {"X-RateLimit-Remaining": 0, "X-RateLimit-Reset": int(time.time()) - 10}))
+    scheduler = _scheduler(session)
+    start = time.time()
+    with pytest.raises(RuntimeError):
+        scheduler.get("https://api.example/repos/o/r")
+    assert len(session.calls) <= 6
+    assert time.time() - start < 2
+
+
+def test_stale_reset_403_retries_after_min_backoff():
+    stale = {"X-RateLimit-Remaining": 0, "X-RateLimit-Reset": int(time.time()) - 10}
+    session = _Session((403, stale), (200, {}))
+    scheduler = _scheduler(session, max_wait=5)
+    start = time.time()
+    assert scheduler.get("https://api.example/repos/o/r").status_code == 200
+    assert len(session.calls) == 2
+    assert time.time() - start >= scheduler.MIN_BACKOFF
+
+
+def test_limited_token_rotates_to_next():
+    session = _Session((403, {"Retry-After": 30}), (200, {}))
+    scheduler = _scheduler(session, tokens=("aaaa", "bbbb"))
+    assert scheduler.get("https://api.example/repos/o/r").status_code == 200
+    assert session.calls == ["Bearer aaaa", "Bearer bbbb"]
+    assert scheduler.tokens[0].limited == 1 and scheduler.tokens[1].streak == 0
+
+
+def test_plain_403_is_returned_without_parking_token():
+    session = _Session((403, {}, b'{"message": "Repository access blocked"}'), (200, {}))
+    scheduler = _scheduler(session)
+    assert scheduler.get("https://api.example/repos/o/blocked").status_code == 403
+    state = scheduler.tokens[0]
+    assert state.limited == 0 and state.streak == 0 and state.parked_until <= time.time()
+    start = time.time()
+    assert scheduler.get("https://api.example/repos/o/r").status_code == 200
+    assert time.time() - start < 1
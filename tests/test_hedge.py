@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+import requests
+
+from trending_scraper import TrendingScraper
+
+
+class _Raw:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self, status):
+        self.status = status
+        self.raws = []
+
+    def get(self, url, **kwargs):
+        resp = requests.Response()
+        resp.status_code, resp.url = self.status, url
+        resp.raw = _Raw()
+        self.raws.append(resp.raw)
+        return resp
+
+
+def _attempt(status, cancelled=False):
+    scraper = TrendingScraper()
+    scraper._session = _Session(status)
+    event = threading.Event()
+    if cancelled:
+        event.set()
+    try:
+        return scraper._attempt("https://example/trending", {}, "direct", None, event)
+    finally:
+        assert all(raw.closed for raw in scraper._session.raws)
+
+
+def test_rejected_response_is_closed():
+    with pytest.raises(requests.HTTPError):
+        _attempt(404)
+
+
+def test_losing_response_is_closed():
+    assert _attempt(200, cancelled=True) is None
+
+
+def test_spoken_languages_merge_in_code_order(monkeypatch):
+    import time
+    from config_set import config
+    from models import BaseRepo
+
+    monkeypatch.setattr(config, "scrape_hedge", "delayed")
+    scraper = TrendingScraper(max_workers=2)
+    # 第一个 code 的页面最慢返回，合并结果仍以它在前
+    delays = {"zh": 0.2, "en": 0.0}
+    names = {"zh": ["shared", "zh-only"], "en": ["en-only", "shared"]}
+    scraper._hedged_fetch = lambda language, params: (time.sleep(delays[params["spoken_language_code"]]),
+                                                      params["spoken_language_code"])[1]
+    scraper._parse = lambda code, language, since: [
+        BaseRepo(owner="o", repo=n, url="u", desc="", stars_today=0, language=language, since=since)
+        for n in names[code]]
+    result = scraper.get_repos_many(["python"], ["daily"], ["zh", "en"])
+    assert [r.repo for r in result[("python", "daily")]] == ["shared", "zh-only", "en-only"]
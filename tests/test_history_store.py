@@ -0,0 +1,105 @@
+import gzip
+import sqlite3
+
+import pytest
+
+from history_store import HistoryStore, JsonHistoryStore, SqliteHistoryStore, _record_list, import_json_tree
+
+
+def _record(day, language="python", since="daily", names=("a", "b")):
+    return {"date": f"2025-04-{day:02d}", "type": since,
+            "repos": [{"owner": "o", "repo": n, "language": language, "since": since, "stars_today": 1}
+                      for n in names]}
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        HistoryStore()
+
+
+def test_sqlite_store_closes_as_context_manager(tmp_path):
+    with SqliteHistoryStore(tmp_path / "h.sqlite3") as store:
+        store.save_record(_record(1))
+        assert store.first_seen("o", "a") == "2025-04-01"
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.first_seen("o", "a")
+    store.close()  # 重复关闭无害
+
+
+def test_import_json_tree(tmp_path):
+    json_store = JsonHistoryStore(tmp_path / "json", "jsonl.gz")
+    for day in (1, 2):
+        json_store.save_record(_record(day))
+    with SqliteHistoryStore(tmp_path / "h.sqlite3") as store:
+        assert import_json_tree(tmp_path / "json", store) == 2
+        assert [r["date"] for r in store.iter_snapshots()] == ["2025-04-01", "2025-04-02"]
+
+
+def test_compaction_switches_archive_versions(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    first = store.compact_month("2025-04")
+    store.save_record(_record(2, language="go"))
+    second = store.compact_month("2025-04")
+
+    assert first != second and not first.exists()
+    assert sorted(p.name for p in second.parent.iterdir()) == ["2025-04.archive.idx", second.name]
+    assert [r["date"] for r in store.iter_snapshots()] == ["2025-04-01", "2025-04-02"]
+    assert [r["date"] for r in store.iter_snapshots(language="go")] == ["2025-04-02"]
+
+
+def test_corrupt_archive_is_skipped(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    store.compact_month("2025-04").write_bytes(gzip.compress(b"not json\n"))
+    store.save_record({**_record(1), "date": "2025-05-01"})
+    assert [r["date"] for r in store.iter_snapshots()] == ["2025-05-01"]
+
+
+def test_compaction_aborts_on_unreadable_index(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    archive = store.compact_month("2025-04")
+    index = archive.with_name("2025-04.archive.idx")
+    good_index = index.read_text(encoding="utf-8")
+    index.write_text("{broken", encoding="utf-8")
+    store.save_record(_record(2))
+
+    assert store.compact_month("2025-04") is None
+    assert archive.exists()
+    # 索引恢复后再压缩，两天的数据都在
+    index.write_text(good_index, encoding="utf-8")
+    store.compact_month("2025-04")
+    assert [r["date"] for r in store.iter_snapshots()] == ["2025-04-01", "2025-04-02"]
+
+
+def test_compaction_aborts_on_corrupt_archive(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    archive = store.compact_month("2025-04")
+    archive.write_bytes(b"not gzip")
+    store.save_record(_record(2))
+    assert store.compact_month("2025-04") is None
+    assert archive.exists()
+
+
+def test_compaction_keeps_unindexed_archives(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    orphan = store.compact_month("2025-04")
+    orphan.with_name("2025-04.archive.idx").unlink()
+    store.save_record(_record(2))
+    rebuilt = store.compact_month("2025-04")
+    assert rebuilt.name == "2025-04.v2.archive.gz" and orphan.exists()
+
+
+def test_kept_sources_are_not_yielded_twice(tmp_path):
+    store = JsonHistoryStore(tmp_path, "jsonl.gz")
+    store.save_record(_record(1))
+    store.save_record(_record(1, language="go"))
+    store.compact_month("2025-04", remove_sources=False)
+    store.save_record(_record(1, names=("c",)))
+    records = list(store.iter_snapshots())
+    assert sorted(_record_list(r) for r in records) == [("go", "daily"), ("python", "daily")]
+    python = next(r for r in records if _record_list(r)[0] == "python")
+    assert [repo["repo"] for repo in python["repos"]] == ["c"]
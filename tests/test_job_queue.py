@@ -0,0 +1,98 @@
+import time
+
+from config_set import config
+from history_store import JsonHistoryStore
+from job_queue import JobQueue, Worker
+
+
+def _queue(tmp_path, **kwargs):
+    queue = JobQueue(tmp_path / "queue.sqlite3", **kwargs)
+    queue.enqueue(["python"], ["daily"], ["zh", "en"], date_str="2025-05-18")
+    return queue
+
+
+def _repos(spoken):
+    return [{"owner": "o", "repo": "shared", "url": "u", "desc": "", "stars_today": 5,
+             "language": "python", "since": "daily"},
+            {"owner": "o", "repo": f"only-{spoken}", "url": "u", "desc": "", "stars_today": 1,
+             "language": "python", "since": "daily"}]
+
+
+def test_lease_hands_out_each_job_once(tmp_path):
+    queue = _queue(tmp_path)
+    first, second = queue.lease("a"), queue.lease("b")
+    assert {first["spoken"], second["spoken"]} == {"zh", "en"}
+    assert queue.lease("c") is None
+    assert queue.counts()["leased"] == 2
+
+
+def test_expired_lease_is_reassigned(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=0.05, max_attempts=2)
+    job = queue.lease("crashed")
+    queue.lease("crashed")
+    time.sleep(0.1)
+    again = queue.lease("healthy")
+    assert again["id"] == job["id"]
+    assert queue.counts()["leased"] == 2
+
+    # 第二次租约也过期，达到重试上限：记为失败、不再分配，榜单可以合并
+    other = queue.lease("healthy")
+    queue.complete(other["id"], _repos(other["spoken"]))
+    time.sleep(0.1)
+    assert queue.lease("next") is None
+    assert queue.counts()["failed"] == 1
+    assert queue.claim_merge("next") is not None
+
+
+def test_late_result_from_expired_lease_is_accepted(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=0.05)
+    job = queue.lease("slow")
+    time.sleep(0.1)
+    queue.lease("other")
+    queue.complete(job["id"], _repos("zh"))
+    assert queue.counts()["done"] == 1
+
+
+def test_failures_retry_until_max_attempts(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", max_attempts=2)
+    queue.enqueue(["python"], ["daily"], ["zh"], date_str="2025-05-18")
+    queue.fail(queue.lease("w")["id"], "boom")
+    assert queue.counts()["pending"] == 1
+    queue.fail(queue.lease("w")["id"], "boom")
+    assert queue.counts()["failed"] == 1
+    assert queue.claim_merge("w") is None  # 没有成功的任务，不合并
+
+
+def test_group_merges_once_after_all_jobs_finish(tmp_path):
+    queue = _queue(tmp_path)
+    a, b = queue.lease("a"), queue.lease("b")
+    assert not queue.complete(a["id"], _repos(a["spoken"]))
+    assert queue.claim_merge("a") is None
+    assert queue.complete(b["id"], _repos(b["spoken"]))
+    group = queue.claim_merge("b")
+    assert (group["language"], group["since"]) == ("python", "daily")
+    assert queue.claim_merge("c") is None
+    assert [r["repo"] for r in queue.results("2025-05-18", "python", "daily")] == \
+           ["shared", f"only-{a['spoken']}", f"only-{b['spoken']}"]
+
+
+def test_worker_retries_empty_fetch(tmp_path):
+    calls = []
+
+    def fetch(language, since, spoken):
+        calls.append(spoken)
+        return [] if len(calls) == 1 else _repos(spoken)
+
+    queue = JobQueue(tmp_path / "queue.sqlite3", max_attempts=3)
+    queue.enqueue(["python"], ["daily"], ["zh"], date_str="2025-05-18")
+    Worker(queue, "w", fetch=fetch).run(poll=0.01)
+    assert calls == ["zh", "zh"]
+    assert queue.counts()["merged"] == 1
+
+
+def test_worker_scrapes_stand_in_and_saves_history(stand_in, tmp_path):
+    queue = _queue(tmp_path)
+    assert Worker(queue, "w").run(poll=0.01) == 2
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 2, "failed": 0, "merged": 1}
+    records = list(JsonHistoryStore(config.base_dir).iter_snapshots())
+    assert len(records) == 1 and len(records[0]["repos"]) == 25
@@ -0,0 +1,6 @@
+from metrics import _fmt_labels, _labels
+
+
+def test_label_values_are_escaped():
+    labels = _labels({"error": 'bad "quote"\\path\nnext'})
+    assert _fmt_labels(labels) == '{error="bad \\"quote\\"\\\\path\\nnext"}'
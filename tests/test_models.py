@@ -0,0 +1,33 @@
+from models import BaseRepo, RichRepo
+
+
+class TaggedBase(BaseRepo):
+    pass
+
+
+class TaggedRepo(RichRepo):
+    pass
+
+
+def _repo():
+    return BaseRepo("o", "r", "https://github.com/o/r", "d", 5, "python", "daily", stars=9, built_by=["a"])
+
+
+def test_round_trip():
+    base = _repo()
+    assert BaseRepo.from_dict(base.to_dict()) == base
+    rich = RichRepo.from_base(base)
+    rich.topics = ["cli"]
+    assert RichRepo.from_dict(rich.to_dict()) == rich
+
+
+def test_old_records_get_defaults():
+    repo = BaseRepo.from_dict({"owner": "o", "repo": "r"})
+    assert (repo.stars, repo.built_by, repo.repo_language) == (0, [], "")
+
+
+def test_constructors_return_subclass():
+    base = _repo()
+    assert type(TaggedRepo.from_base(base)) is TaggedRepo
+    assert type(TaggedRepo.from_dict(base.to_dict())) is TaggedRepo
+    assert type(TaggedBase.from_dict(base.to_dict())) is TaggedBase
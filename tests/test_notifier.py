@@ -0,0 +1,42 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import notifier
+from notifier import Notifier, split_markdown
+
+
+def test_split_markdown_respects_byte_limit():
+    text = "".join(f"{i}. 仓库描述 🚀 {'长' * (i % 7)}\n" for i in range(200)) + "超长单行" * 300
+    chunks = split_markdown(text, 100)
+    assert all(len(c.encode("utf-8")) <= 100 for c in chunks)
+    assert "".join(chunks) == text
+
+
+@pytest.mark.parametrize("limit", [0, 1, 3])
+def test_split_markdown_rejects_limit_below_one_character(limit):
+    with pytest.raises(ValueError):
+        split_markdown("🚀🚀", limit)
+
+
+@pytest.fixture
+def webhook(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(notifier, "time", SimpleNamespace(sleep=lambda s: None, time=time.time))
+    url = f"{stand_in.url}/cgi-bin/webhook/send?key=k"
+    return stand_in, Notifier([url], outbox_dir=tmp_path / "outbox", retries=0)
+
+
+def test_new_messages_queue_behind_pending_outbox(webhook):
+    server, sender = webhook
+    server.webhook_down.add("k")
+    assert not sender.send_markdown("first")
+    assert not sender.send_markdown("second")
+    # 第二次只补发积压的第一条，新消息不再单独请求不可用的 webhook
+    assert server.requests["POST /cgi-bin/webhook/send"] == 2
+    assert sender.pending() == 2
+
+    server.webhook_down.clear()
+    assert sender.send_markdown("third")
+    assert [content for _, content in server.webhook_messages] == ["first", "second", "third"]
+    assert sender.pending() == 0
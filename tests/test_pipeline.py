@@ -0,0 +1,54 @@
+import threading
+
+from models import BaseRepo
+from pipeline import Pipeline
+
+
+class _Scraper:
+    DEFAULT_PARAMS = {"spoken_language_code": ""}
+    max_workers = 4
+
+    def iter_repos(self, language, since, code):
+        if language == "broken":
+            raise RuntimeError("趋势页抓取失败")
+        for i in range(3):
+            yield BaseRepo(owner="o", repo=f"{language}-{i}", url="u", desc="", stars_today=i,
+                           language=language, since=since)
+
+
+class _Recorder:
+    def save(self, repos):
+        return f"{repos[0].language}/{repos[0].since}"
+
+
+def test_failed_pages_are_counted():
+    pipe = Pipeline(_Scraper(), _Recorder(), enrich=False)
+    results = pipe.run(["python", "broken"], ["daily", "weekly"])
+    assert pipe.failed_pages == 2
+    assert set(results) == {("python", "daily"), ("python", "weekly")}
+
+
+def test_slow_report_does_not_block_saving():
+    release, reported, saved = threading.Event(), [], []
+
+    class Recorder(_Recorder):
+        def save(self, repos):
+            saved.append(repos[0].language)
+            return super().save(repos)
+
+    def on_complete(key, path, repos):
+        # 报告卡住时保存段仍应把所有榜单存完
+        release.wait(5)
+        reported.append(key)
+
+    pipe = Pipeline(_Scraper(), Recorder(), enrich=False, queue_size=1, on_complete=on_complete)
+    t = threading.Thread(target=pipe.run, args=(["a", "b", "c", "d"], ["daily"]))
+    t.start()
+    for _ in range(200):
+        if len(saved) == 4:
+            break
+        t.join(0.01)
+    assert len(saved) == 4 and not reported
+    release.set()
+    t.join(5)
+    assert len(reported) == 4
@@ -0,0 +1,77 @@
+import requests
+
+from http_cache import HttpCache
+from models import BaseRepo, RichRepo
+from repo_enricher import enrich_repo_info, enrich_repos_batch
+from stand_in_server import fake_repo
+
+
+def _bases(names):
+    return [BaseRepo("owner", name, f"https://github.com/owner/{name}", "", 1, "python", "daily") for name in names]
+
+
+def _expected(base):
+    data = fake_repo(base.owner, base.repo)
+    return data["stargazers_count"], data["forks_count"], data["topics"]
+
+
+def test_graphql_batches_repos_with_aliases(stand_in):
+    bases = _bases([f"repo{i}" for i in range(45)])
+    results = enrich_repos_batch(bases, "token", batch_size=20, session=requests.Session())
+
+    assert stand_in.requests["POST /graphql"] == 3
+    assert not any(key.startswith("GET /repos/") for key in stand_in.requests)
+    assert [(r.owner, r.repo) for r in results] == [(b.owner, b.repo) for b in bases]
+    for base, rich in zip(bases, results):
+        assert (rich.stargazers_count, rich.forks_count, rich.topics) == _expected(base)
+
+
+def test_missing_alias_falls_back_to_rest(stand_in):
+    bases = _bases(["repo0", "missing-repo", "repo2"])
+    results = enrich_repos_batch(bases, "token", batch_size=20, session=requests.Session())
+
+    assert stand_in.requests["POST /graphql"] == 1
+    assert stand_in.requests["GET /repos/owner/missing-repo"] == 1
+    # REST 也是 404：保留趋势页信息
+    assert type(results[1]) is RichRepo and results[1].stargazers_count == 0
+    assert results[2].stargazers_count == _expected(bases[2])[0]
+
+
+def test_graphql_failure_falls_back_to_rest(stand_in):
+    stand_in.routes = [r for r in stand_in.routes if r[0] != "POST"]  # /graphql 返回 404
+    bases = _bases(["repo0", "repo1"])
+    results = enrich_repos_batch(bases, "token", batch_size=20, session=requests.Session())
+
+    assert stand_in.requests["GET /repos/owner/repo0"] == 1
+    assert stand_in.requests["GET /repos/owner/repo1"] == 1
+    assert [r.stargazers_count for r in results] == [_expected(b)[0] for b in bases]
+
+
+def test_no_token_uses_rest_only(stand_in):
+    results = enrich_repos_batch(_bases(["repo0"]), "", session=requests.Session())
+    assert stand_in.requests["POST /graphql"] == 0
+    assert results[0].forks_count == _expected(results[0])[1]
+
+
+def test_etag_revalidation_returns_cached_body(stand_in, tmp_path):
+    cache = HttpCache(tmp_path / "cache.sqlite3")
+    url = f"{stand_in.url}/repos/owner/repo0"
+    first = cache.get(url)
+    second = cache.get(url)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == fake_repo("owner", "repo0")
+    assert cache.stats == {"hits": 0, "misses": 1, "not_modified": 1}
+    assert stand_in.requests["GET /repos/owner/repo0"] == 2
+    assert stand_in.rate_cost == 1  # 304 不计额度
+    cache.close()
+
+
+def test_enrich_repo_info_revalidates_through_shared_cache(stand_in):
+    base = _bases(["repo3"])[0]
+    session = requests.Session()
+    first = enrich_repo_info(base, "token", session)
+    second = enrich_repo_info(base, "token", session)
+
+    assert first.stargazers_count == second.stargazers_count == _expected(base)[0]
+    assert stand_in.rate_cost == 1
@@ -0,0 +1,31 @@
+from rolling_aggregates import RollingAggregates
+
+
+def _repos(*names, stars=10):
+    return [{"owner": "o", "repo": n, "language": "python", "since": "daily", "stars_today": stars} for n in names]
+
+
+def test_resave_same_day_retracts_previous_snapshot(tmp_path):
+    agg = RollingAggregates(tmp_path / "agg.sqlite3", windows=[7], top_k=5)
+    agg.update("2025-05-01", _repos("a", "b"))
+    agg.update("2025-05-02", _repos("a", "c"))
+    agg.update("2025-05-02", _repos("a", "d", stars=3))
+
+    assert agg.totals("o", "c") == []
+    assert agg.totals("o", "a")[0]["cum_stars"] == 13
+    assert agg.totals("o", "d")[0]["appearances"] == 1
+    assert [r["repo"] for r in agg.leaderboard("python", "daily", 7)] == ["a", "b", "d"]
+    assert agg.verify() == []
+    agg.close()
+
+
+def test_window_expires_old_days(tmp_path):
+    agg = RollingAggregates(tmp_path / "agg.sqlite3", windows=[2], top_k=5)
+    agg.update("2025-05-01", _repos("old"))
+    agg.update("2025-05-02", _repos("mid"))
+    agg.update("2025-05-04", _repos("new"))
+
+    assert [r["repo"] for r in agg.leaderboard("python", "daily", 2)] == ["new"]
+    assert agg.totals("o", "old")[0]["appearances"] == 1
+    assert agg.verify() == []
+    agg.close()
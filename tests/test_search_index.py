@@ -0,0 +1,19 @@
+import pytest
+
+import search_index
+from config_set import config
+from search_index import SearchIndex
+
+
+def test_old_sqlite_is_rejected_up_front(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index.sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(RuntimeError):
+        SearchIndex(tmp_path / "search.sqlite3")
+
+
+def test_recorder_disables_search_on_old_sqlite(monkeypatch):
+    from history_recorder import HistoryRecorder
+
+    monkeypatch.setattr(search_index.sqlite3, "sqlite_version_info", (3, 31, 1))
+    monkeypatch.setattr(config, "search_enabled", True)
+    assert HistoryRecorder(backends=["json"]).search is None
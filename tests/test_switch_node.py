@@ -0,0 +1,53 @@
+import pytest
+
+from switch_node import ClashManager
+
+
+@pytest.fixture
+def clash(stand_in):
+    # 名称 -> (历史延迟, 实时测速延迟；None 为不可用)
+    stand_in.clash_nodes = {
+        "node-slow": (100, 400),
+        "node-down": (100, None),
+        "node-fast": (100, 30),
+        "node-mid": (100, 120),
+        "node-stale": (5000, 10),  # 历史延迟超过 max_delay，不参与选择
+    }
+    stand_in.clash_selected = "node-slow"
+    manager = ClashManager(clash_api_url=stand_in.url, group_map={"GLOBAL": "GLOBAL"},
+                           probe_url=stand_in.url, probe_timeout=500, min_limit=3)
+    return stand_in, manager
+
+
+def test_valid_nodes_respect_history_delay(clash):
+    _, manager = clash
+    assert sorted(manager.get_all_nodes()) == ["node-down", "node-fast", "node-mid", "node-slow"]
+
+
+def test_best_mode_switches_to_fastest_live_node(clash):
+    server, manager = clash
+    assert manager.change_node("best")
+    assert server.clash_selected == manager.cur_node == "node-fast"
+    assert manager.scores["node-down"]["failures"] == 1
+
+
+def test_failed_node_is_ranked_after_healthy_ones(clash):
+    server, manager = clash
+    manager.change_node("best")
+    # 当前节点出问题后再次切换：node-fast 被罚分，换到次优节点
+    server.clash_nodes["node-fast"] = (100, None)
+    assert manager.change_node("best")
+    assert server.clash_selected == "node-mid"
+
+
+def test_random_mode_picks_a_valid_node(clash):
+    server, manager = clash
+    assert manager.change_node("random")
+    assert server.clash_selected in {"node-slow", "node-down", "node-fast", "node-mid"}
+
+
+def test_too_few_nodes_does_not_switch(clash):
+    server, manager = clash
+    manager.min_limit = 10
+    assert not manager.change_node("best")
+    assert server.clash_selected == "node-slow"
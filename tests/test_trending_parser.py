@@ -0,0 +1,40 @@
+import pytest
+
+from trending_scraper import TrendingScraper
+from conftest import FIXTURES
+
+PAGES = sorted((FIXTURES / "trending").glob("*.html"))
+
+
+@pytest.fixture(params=PAGES, ids=[p.stem for p in PAGES])
+def page(request):
+    return request.param.read_text(encoding="utf-8")
+
+
+def test_parse_extracts_all_rows(page):
+    repos = TrendingScraper._parse(page, "python", "daily")
+    assert len(repos) == 25
+    assert len({(r.owner, r.repo) for r in repos}) == 25
+    for r in repos:
+        assert r.url == f"https://github.com/{r.owner}/{r.repo}"
+        assert r.stars_today > 0 and r.stars >= r.stars_today
+        assert (r.language, r.since) == ("python", "daily")
+
+
+def test_parse_fields():
+    html = (FIXTURES / "trending" / "python_daily.html").read_text(encoding="utf-8")
+    first = TrendingScraper._parse(html, "python", "daily")[0]
+    assert (first.owner, first.repo) == ("microsoft", "markitdown")
+    assert first.desc == "Python tool for converting files and office documents to Markdown."
+    assert (first.stars_today, first.stars, first.forks) == (1627, 85090, 9896)
+    assert first.built_by[0] == "octocat"
+    assert first.repo_language == "Python"
+
+
+def test_iter_parse_matches_parse(page):
+    assert list(TrendingScraper._iter_parse(page, "go", "weekly")) == TrendingScraper._parse(page, "go", "weekly")
+
+
+def test_parse_empty_page():
+    assert TrendingScraper._parse("", "python", "daily") == []
+    assert TrendingScraper._parse("<html><body>no rows</body></html>", "python", "daily") == []
@@ -8,88 +8,368 @@ Description : 爬 GitHub Trending 页面的基础信息
 """
 import os
 import time
+import random
+import threading
 import requests
 from lxml import etree
+from itertools import product
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from models import BaseRepo
 from config_set import config
-from small_utils import ip_test
+from small_utils import get_circuit_breaker, get_network_state
 from log_utils import init_logger
-from fake_useragent import UserAgent
-from switch_node import ClashManager
+from metrics import metrics
+
+if TYPE_CHECKING:
+    from switch_node import ClashManager
 
 module_name = os.path.splitext(os.path.basename(__file__))[0]
 logger = init_logger('github', module_name)
 
 
+@lru_cache(maxsize=1)
+def _user_agent() -> str:
+    """fake_useragent 导入并加载数据集需要几十毫秒，首次发请求时才做，且只做一次"""
+    from fake_useragent import UserAgent
+
+    return UserAgent().random
+
+
+def _is_route_error(e: Exception) -> bool:
+    """
+    是否是线路本身的问题：连接失败、超时、5xx 与 429 算；其余 4xx（如不存在的语言 404）
+    换哪条线路结果都一样，不应计入熔断，也不应让网络结论失效
+    """
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+
 # 爬虫类
 class TrendingScraper:
-    BASE_URL_TEMPLATE = "https://github.com/trending/{language}"
+    # 趋势页地址，{base} 取 config.github_web_url（运行时读取，回放测试可改指本地替身服务）
+    BASE_URL_TEMPLATE = "{base}/trending/{language}"
     DEFAULT_PARAMS = {"since": "daily", "spoken_language_code": "zh"}
+    # 类级常量，与 config.proxies 是同一个 dict，运行中修改其内容也能看到；实例内部用 proxies 属性
     PROXIES = config.proxies
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": UserAgent().random,
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "Accept": "text/html,application/xhtml+xml"
-        })
+    def __init__(self, max_workers: Optional[int] = None):
+        # 并发上限：同时也是连接池大小，保证每个 worker 都能复用连接
+        self.max_workers = max(1, max_workers or config.scrape_workers)
+
+        self._clash_manager = None
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        # 对冲请求的线程池：每页最多同时两条线路
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._switch_lock = threading.Lock()
+
+    @property
+    def proxies(self) -> Dict[str, str]:
+        """当前代理配置：每次读取 config.proxies，运行中整体替换配置也能生效"""
+        return config.proxies
+
+    @property
+    def session(self) -> requests.Session:
+        """首次请求时才创建会话（连同 User-Agent），构造爬虫对象本身不做任何 I/O"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_workers)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({
+                        "User-Agent": _user_agent(),
+                        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+                        "Accept": "text/html,application/xhtml+xml"
+                    })
+                    self._session = session
+        return self._session
+
+    @property
+    def clash_manager(self) -> "ClashManager":
+        """首次需要切换节点时才创建，之后复用（节点评分缓存随之保留）"""
+        if self._clash_manager is None:
+            from switch_node import ClashManager
 
+            self._clash_manager = ClashManager(
+                clash_api_url=config.clash_api_url,
+                group_map={"GLOBAL": config.group_name},
+                secret=config.clash_secret,
+                probe_url=config.github_web_url,
+                ip_api_url=config.ip_api_url,
+            )
+        return self._clash_manager
+
+    @metrics.timed("network_probe")
     def _network_test(self):
-        clash_manager = ClashManager(config.group_name)
+        """取共享的网络结论（带缓存），不可用时切换节点并强制重新探测"""
+        state = get_network_state(self.proxies)
         for i in range(3):
-            ip_res, mode = ip_test(self.PROXIES)
+            ip_res, mode = state.verdict(force=i > 0)
             if not ip_res:
                 logger.warning(f'网络测试失败，更换代理进行第 {i+1} 测试')
-                clash_manager.change_random_node()
+                self.clash_manager.change_node(config.clash_select_mode)
             else:
                 if mode == 'DIRECT':
                     proxies = None
                 else:
-                    proxies = self.PROXIES
+                    proxies = self.proxies
                 return proxies
         else:
             logger.error(f'网络测试失败，停止请求')
             return ''
 
+    @metrics.timed("request")
     def _request(self, language, params) -> str:
+        """
+        对冲模式下不做网络探测：各线路的熔断器代替探测结论，代理线路熔断时照常切换节点；
+        hedge=off 时先取网络结论（必要时切换节点），再在选定的线路上抓取
+        """
+        if config.scrape_hedge != "off":
+            return self._hedged_fetch(language, params)
         proxies = self._network_test()
         if proxies == '':
             return ""
+        return self._fetch(language, params, proxies)
+
+    # —— 对冲抓取 ——
+    def _routes(self) -> List[Tuple[str, Optional[Dict[str, str]]]]:
+        """可用线路：直连，以及配置了代理时的代理线路"""
+        routes = [("direct", None)]
+        if any(self.proxies.values()):
+            routes.append(("proxy", self.proxies))
+        return routes
+
+    def _attempt(self, url, params, route, proxies, cancelled: threading.Event) -> Optional[str]:
+        """在一条线路上请求一次；结果计入该线路的熔断器。已被对手抢先时丢弃响应，返回 None"""
+        breaker = get_circuit_breaker(route)
+        start = time.perf_counter()
+        resp, html = None, None
+        try:
+            resp = self.session.get(url, params=params, proxies=proxies, timeout=10, stream=True)
+            if cancelled.is_set():
+                breaker.release()
+                return None
+            resp.raise_for_status()
+            html = resp.text
+        except Exception as e:
+            if cancelled.is_set():
+                breaker.release()
+                return None
+            if not _is_route_error(e):
+                breaker.release()
+                metrics.inc("route_requests_total", route=route, result="client_error")
+                raise
+            metrics.inc("route_requests_total", route=route, result="error")
+            logger.warning(f"[{route}] 请求失败：{e}")
+            if breaker.failure() and route == "proxy":
+                # 代理线路熔断：换一个节点，熔断到期后的试探请求就走新节点
+                with self._switch_lock:
+                    try:
+                        self.clash_manager.change_node(config.clash_select_mode)
+                    except Exception as switch_error:
+                        logger.error(f"切换节点失败：{switch_error}")
+            raise
+        finally:
+            # stream=True 的响应只有读完才归还连接：被抢先或出错时显式关闭，避免占着连接池
+            if resp is not None and html is None:
+                resp.close()
+        breaker.success(time.perf_counter() - start)
+        metrics.inc("route_requests_total", route=route, result="ok")
+        return html
+
+    def _race(self, url, params, routes, language) -> Optional[str]:
+        """
+        先在较快的线路上发请求；race 模式立即、delayed 模式在其 p95 耗时后仍未返回时，
+        或它提前失败时，再在另一条线路上发。取第一个成功的结果，其余的作废。
+        收到 4xx（429 除外）时直接抛出 requests.HTTPError。
+        """
+        if self._hedge_pool is None:
+            with self._session_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self.max_workers * 2,
+                                                          thread_name_prefix="hedge")
+        routes = sorted(routes, key=lambda r: get_circuit_breaker(r[0]).p95() or float("inf"))
+        cancelled = threading.Event()
+        waiting = list(routes)
+        running = {}
+
+        def launch() -> bool:
+            # 真正发出请求时才占用熔断器（half_open 时是唯一的试探名额），没发出的线路不占
+            while waiting:
+                route, proxies = waiting.pop(0)
+                if get_circuit_breaker(route).allow():
+                    running[self._hedge_pool.submit(self._attempt, url, params, route, proxies, cancelled)] = route
+                    return True
+            return False
+
+        if not launch():
+            return None
+        p95 = get_circuit_breaker(next(iter(running.values()))).p95()
+        delay = 0.0 if config.scrape_hedge == "race" else \
+            max(config.hedge_min_delay, p95 if p95 is not None else config.hedge_default_delay)
+        while running:
+            done, _ = wait(running, timeout=delay if waiting else None, return_when=FIRST_COMPLETED)
+            if not done:
+                # 第一条线路超过预期耗时：对冲
+                metrics.inc("hedges_total", language=language)
+                logger.debug(f"[{language}] {running[next(iter(running))]} 超过 {delay:.2f}s 未返回，同时请求另一条线路")
+                launch()
+                continue
+            for future in done:
+                route = running.pop(future)
+                try:
+                    html = future.result()
+                except Exception as e:
+                    if not _is_route_error(e):
+                        # 4xx：另一条线路也会得到同样的结果，不再对冲，交给调用方放弃本页
+                        cancelled.set()
+                        raise
+                    html = None
+                if html is not None:
+                    cancelled.set()
+                    if running:
+                        metrics.inc("hedge_wins_total", route=route)
+                    return html
+            if waiting:
+                launch()  # 先发的线路已失败，不必再等
+        return None
+
+    @metrics.timed("fetch")
+    def _hedged_fetch(self, language, params) -> str:
+        """对冲抓取：跳过已熔断的线路；两条线路都失败时短暂抖动退避后重试，最多三轮"""
+        url = self.BASE_URL_TEMPLATE.format(base=config.github_web_url, language=language)
+        for attempt in range(3):
+            routes = [r for r in self._routes() if get_circuit_breaker(r[0]).available()]
+            if not routes:
+                wait_s = min(get_circuit_breaker(name).retry_in() for name, _ in self._routes())
+                if wait_s > config.hedge_max_wait:
+                    logger.error(f"[{language}] 所有线路均已熔断，{wait_s:.0f}s 后才恢复，放弃")
+                    return ""
+                logger.warning(f"[{language}] 所有线路均已熔断，等待 {wait_s:.1f}s")
+                time.sleep(wait_s)
+                continue
+            try:
+                html = self._race(url, params, routes, language)
+            except requests.HTTPError as e:
+                logger.error(f"[{language}] 请求被拒绝，放弃：{e}")
+                return ""
+            if html is not None:
+                logger.debug("[%s] 页面下载完成", language, extra={"stage": "fetch", "language": language})
+                return html
+            metrics.inc("fetch_retries_total", language=language)
+            time.sleep(random.uniform(0.5, 1.5) * (attempt + 1) * 0.5)
+        logger.error(f"[{language}] 三轮请求均失败，放弃")
+        return ""
 
-        url = self.BASE_URL_TEMPLATE.format(language=language)
+    @metrics.timed("fetch")
+    def _fetch(self, language, params, proxies) -> str:
+        """在已确定的线路上抓取页面，失败按 1/4/9s 退避重试"""
+        url = self.BASE_URL_TEMPLATE.format(base=config.github_web_url, language=language)
         for i in range(3):
             try:
                 resp = self.session.get(url, params=params, proxies=proxies, timeout=10)
                 resp.raise_for_status()
+                logger.debug("[%s] 页面下载完成", language,
+                             extra={"stage": "fetch", "language": language,
+                                    "duration": round(resp.elapsed.total_seconds(), 4)})
                 return resp.text
             except Exception as e:
+                if not _is_route_error(e):
+                    logger.error(f"[{language}] 请求被拒绝，放弃：{e}")
+                    return ""
+                # 连接失败或超时才说明线路有问题，让网络结论失效，下一次 _network_test 会重新探测
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    get_network_state(self.proxies).invalidate()
+                metrics.inc("fetch_retries_total", language=language)
                 wait = (i + 1) ** 2
                 logger.warning(f"[{language}] 请求失败({e})，{wait}s 后重试…")
                 time.sleep(wait)
         logger.error(f"[{language}] 三次请求均失败，放弃")
         return ""
 
+    # 预编译的 XPath，模块加载时编译一次，解析时直接复用
+    _XP_ITEMS = etree.XPath("//article[@class='Box-row']")
+    _XP_HREF = etree.XPath("./h2/a/@href")
+    _XP_STARS_TODAY = etree.XPath("./div[last()]/span[last()]/text()")
+    _XP_DESC = etree.XPath("normalize-space(./p/text())")
+    _XP_STARS = etree.XPath("./div[last()]/a[contains(@href, '/stargazers')]/text()")
+    _XP_FORKS = etree.XPath("./div[last()]/a[contains(@href, '/forks')]/text()")
+    _XP_BUILT_BY = etree.XPath("./div[last()]/span/a[@data-hovercard-type='user']/img/@alt")
+    _XP_REPO_LANGUAGE = etree.XPath("normalize-space(./div[last()]//span[@itemprop='programmingLanguage'])")
+
+    _parser_local = threading.local()
+
+    @classmethod
+    def _html_parser(cls) -> etree.HTMLParser:
+        """lxml 解析器不能跨线程共享，每个线程各建一个并复用"""
+        parser = getattr(cls._parser_local, "parser", None)
+        if parser is None:
+            parser = etree.HTMLParser(encoding='utf-8', collect_ids=False, default_doctype=False)
+            cls._parser_local.parser = parser
+        return parser
+
     @staticmethod
-    def _parse(html: str, language: str, since: str) -> list[BaseRepo]:
+    def _to_int(texts) -> int:
+        """取最后一段非空文本的首个数字，如 '1,234 stars today' -> 1234"""
+        for text in reversed(texts):
+            text = text.strip()
+            if text:
+                return int(text.split()[0].replace(',', ''))
+        return 0
+
+    @classmethod
+    def _iter_parse(cls, html: str, language: str, since: str) -> Iterator[BaseRepo]:
+        """逐条产出 BaseRepo，供流式处理使用"""
         if not html:
-            return []
+            return
+
+        # 只解析列表所在片段，跳过页头/脚本等与结果无关的大段 HTML
+        first = html.find('<article class="Box-row"')
+        last = html.rfind('</article>')
+        if first != -1 and last > first:
+            html = html[first:last + len('</article>')]
 
-        tree = etree.HTML(html)
-        items = tree.xpath("//article[@class='Box-row']")
-        repos = []
-        for item in items:
+        # 以 UTF-8 字节交给 libxml2 解析，编码由解析器的 encoding 参数确定
+        tree = etree.fromstring(html.encode('utf-8'), cls._html_parser())
+        if tree is None:
+            return
+        for item in cls._XP_ITEMS(tree):
             try:
-                href = item.xpath("./h2/a/@href")[0].strip()
+                href = cls._XP_HREF(item)[0].strip()
                 _, owner, repo = href.split('/')
                 url = f"https://github.com{href}"
-                raw = item.xpath("./div[last()]/span[last()]/text()")
-                stars = int(raw[-1].split()[0].replace(',', '')) if raw else 0
-                desc = item.xpath("normalize-space(./p/text())")
-                repos.append(BaseRepo(owner, repo, url, desc, stars, language, since))
-                logger.info(f"解析：{owner}/{repo} +{stars}s")
+                raw = cls._XP_STARS_TODAY(item)
+                stars_today = int(raw[-1].split()[0].replace(',', '')) if raw else 0
+                desc = cls._XP_DESC(item)
+                yield BaseRepo(
+                    owner, repo, url, desc, stars_today, language, since,
+                    stars=cls._to_int(cls._XP_STARS(item)),
+                    forks=cls._to_int(cls._XP_FORKS(item)),
+                    built_by=[alt.lstrip('@') for alt in cls._XP_BUILT_BY(item)],
+                    repo_language=cls._XP_REPO_LANGUAGE(item),
+                )
+                logger.debug("解析：%s/%s +%ss", owner, repo, stars_today,
+                             extra={"stage": "parse", "language": language, "repo": f"{owner}/{repo}",
+                                    "chatty": True})
             except Exception as e:
                 logger.error(f"解析单条失败：{e}")
+
+    @classmethod
+    @metrics.timed("parse")
+    def _parse(cls, html: str, language: str, since: str) -> list[BaseRepo]:
+        start = time.perf_counter()
+        repos = list(cls._iter_parse(html, language, since))
+        duration = round(time.perf_counter() - start, 4)
+        metrics.inc("repos_parsed_total", len(repos), language=language, since=since)
+        logger.info(f"[{language}/{since}] 解析得到 {len(repos)} 个仓库",
+                    extra={"stage": "parse", "language": language, "duration": duration})
         return repos
 
     # 主函数
@@ -101,6 +381,71 @@ class TrendingScraper:
         html = self._request(language, params)
         return self._parse(html, language, params["since"])
 
+    def iter_repos(self, language="python", since=None, spoken_language_code=None) -> Iterator[BaseRepo]:
+        """与 get_repos 相同，但边解析边产出，流水线模式下下游不必等整页解析完；抓取失败时抛出 RuntimeError"""
+        params = self.DEFAULT_PARAMS.copy()
+        if since: params["since"] = since
+        if spoken_language_code: params["spoken_language_code"] = spoken_language_code
+
+        html = self._request(language, params)
+        if not html:
+            # _request 失败时返回空字符串，这里转成异常，调用方才能把这一页记为抓取失败而不是空榜单
+            raise RuntimeError("趋势页抓取失败")
+        count = 0
+        for repo in self._iter_parse(html, language, params["since"]):
+            count += 1
+            yield repo
+        metrics.inc("repos_parsed_total", count, language=language, since=params["since"])
+
+    def get_repos_many(
+            self,
+            languages: Iterable[str],
+            sinces: Iterable[str],
+            spoken_language_codes: Optional[Iterable[str]] = None,
+    ) -> Dict[Tuple[str, str], List[BaseRepo]]:
+        """
+        并发抓取 languages × sinces 的整个矩阵，结果以 (language, since) 为键。
+        网络测试只做一次（对冲模式下不探测，由各线路的熔断器决定走哪条），
+        所有请求共用同一个连接池，并发数受 max_workers 限制。
+        传入多个 spoken_language_code 时，同一 (language, since) 下的结果按 codes 顺序合并、按 owner/repo 去重。
+        """
+        languages, sinces = list(languages), list(sinces)
+        codes = list(spoken_language_codes or [self.DEFAULT_PARAMS["spoken_language_code"]])
+        results: Dict[Tuple[str, str], List[BaseRepo]] = {
+            (language, since): [] for language, since in product(languages, sinces)
+        }
+        if not results:
+            return results
+
+        hedged = config.scrape_hedge != "off"
+        proxies = None if hedged else self._network_test()
+        if proxies == '':
+            return results
+
+        def _job(language, since, code):
+            params = {**self.DEFAULT_PARAMS, "since": since, "spoken_language_code": code}
+            html = self._hedged_fetch(language, params) if hedged else self._fetch(language, params, proxies)
+            return self._parse(html, language, since)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(_job, language, since, code): (language, since)
+                for language, since, code in product(languages, sinces, codes)
+            }
+            # 按提交顺序（同一榜单内即 codes 顺序）合并，去重后的名次不随完成先后变化
+            for future, key in futures.items():
+                try:
+                    repos = future.result()
+                except Exception as e:
+                    logger.error(f"[{key[0]}/{key[1]}] 抓取失败：{e}")
+                    continue
+                seen = {(r.owner, r.repo) for r in results[key]}
+                results[key].extend(r for r in repos if (r.owner, r.repo) not in seen)
+
+        logger.info(f"并发抓取完成：{len(futures)} 个页面，耗时 {time.perf_counter() - start:.1f}s")
+        return results
+
 
 # 脚本入口
 if __name__ == "__main__":